@@ -0,0 +1,343 @@
+"""
+Local stand-in for publishers' file servers.
+
+Serves synthetic EPUB, FB2 and PDF books of configurable size and latency,
+so ingestion can be tested and benchmarked without the internet.
+
+GET /books/{name}.{format}?size=<bytes>&latency_ms=<ms>&status=<code>
+    &failures=<n>&fail_after=<bytes>&ranges=<0|1>&cover=<0|1>&compress=<0|1>
+
+The first `failures` requests of a path fail like a flaky link: with a 503,
+or by dropping the connection after `fail_after` bytes of the body. Single
+byte ranges are supported unless `ranges=0`. EPUB and FB2 books embed a
+cover image with `cover=1`. With `compress=1` the book is sent gzipped to
+clients that accept it, with the length and ranges of the gzipped body, as
+web servers serving pre-compressed files do.
+
+Usage: python -m benchmarks.file_server [--port 8081]
+"""
+
+import argparse
+import asyncio
+import base64
+import collections
+import functools
+import gzip
+import io
+import re
+import struct
+import zipfile
+import zlib
+
+from aiohttp import hdrs, web
+
+from literaflow.utils import http_statuses
+
+DEFAULT_BOOK_SIZE = 64 * 1024
+MAX_BOOK_SIZE = 512 * 1024 * 1024
+
+BOOK_TITLE = "The Synthetic Book"
+BOOK_AUTHOR = "Ada Benchmark"
+BOOK_LANGUAGE = "en"
+
+CONTENT_TYPES = {
+    "epub": "application/epub+zip",
+    "fb2": "application/x-fictionbook+xml",
+    "pdf": "application/pdf",
+}
+
+FILE_SERVER_CONFIG = web.AppKey("file_server_config", dict)
+# Number of requests served per path, to fail only the first ones
+FILE_SERVER_REQUEST_COUNTS = web.AppKey(
+    "file_server_request_counts", collections.Counter[str]
+)
+
+_RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)")
+
+_PARAGRAPH = (
+    "It was a bright cold day in April, and the clocks were striking thirteen. "
+    "The hallway smelt of boiled cabbage and old rag mats. "
+)
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">I", zlib.crc32(chunk_type + data))
+    )
+
+
+def build_cover(width: int = 600, height: int = 900) -> bytes:
+    """Build a solid-colored PNG image to embed as a book cover."""
+    row = b"\x00" + b"\xc8\x1e\x1e" * width
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + _png_chunk(b"IDAT", zlib.compress(row * height))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _chapter_text(chapter_number: int, size: int) -> str:
+    text = f"Chapter {chapter_number}. "
+    return text + _PARAGRAPH * max(1, (size - len(text)) // len(_PARAGRAPH))
+
+
+def build_fb2(
+    size: int, chapter_size: int = 16 * 1024, cover: bytes | None = None
+) -> bytes:
+    """Build an FB2 book of roughly the given size, with an optional PNG cover."""
+    coverpage = '<coverpage><image l:href="#cover.png"/></coverpage>' if cover else ""
+    header = (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0" '
+        'xmlns:l="http://www.w3.org/1999/xlink">'
+        "<description><title-info>"
+        f"<author><first-name>{BOOK_AUTHOR.split()[0]}</first-name>"
+        f"<last-name>{BOOK_AUTHOR.split()[1]}</last-name></author>"
+        f"<book-title>{BOOK_TITLE}</book-title>{coverpage}"
+        f"<lang>{BOOK_LANGUAGE}</lang></title-info></description><body>"
+    )
+    footer = "</body>"
+    if cover:
+        footer += (
+            '<binary id="cover.png" content-type="image/png">'
+            f"{base64.b64encode(cover).decode()}</binary>"
+        )
+    footer += "</FictionBook>\n"
+    sections = []
+    written = len(header) + len(footer)
+    chapter_number = 1
+    while written < size or chapter_number == 1:
+        text = _chapter_text(chapter_number, min(chapter_size, max(size - written, 1)))
+        section = (
+            f"<section><title><p>Chapter {chapter_number}</p></title>"
+            f"<p>{text}</p></section>"
+        )
+        sections.append(section)
+        written += len(section)
+        chapter_number += 1
+    return (header + "".join(sections) + footer).encode()
+
+
+def build_epub(
+    size: int, chapter_size: int = 16 * 1024, cover: bytes | None = None
+) -> bytes:
+    """Build an EPUB book of roughly the given size, with an optional PNG cover."""
+    chapter_count = max(1, size // chapter_size)
+    manifest = (
+        '<item id="cover" href="cover.png" media-type="image/png" '
+        'properties="cover-image"/>'
+        if cover
+        else ""
+    )
+    manifest += "".join(
+        f'<item id="chapter{number}" href="chapter{number}.xhtml" '
+        'media-type="application/xhtml+xml"/>'
+        for number in range(1, chapter_count + 1)
+    )
+    spine = "".join(
+        f'<itemref idref="chapter{number}"/>' for number in range(1, chapter_count + 1)
+    )
+    package = (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" '
+        'unique-identifier="book-id">'
+        '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+        f'<dc:identifier id="book-id">synthetic</dc:identifier>'
+        f"<dc:title>{BOOK_TITLE}</dc:title><dc:creator>{BOOK_AUTHOR}</dc:creator>"
+        f"<dc:language>{BOOK_LANGUAGE}</dc:language></metadata>"
+        f"<manifest>{manifest}</manifest><spine>{spine}</spine></package>"
+    )
+    container = (
+        '<?xml version="1.0"?>'
+        '<container version="1.0" '
+        'xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+        '<rootfile full-path="OEBPS/content.opf" '
+        'media-type="application/oebps-package+xml"/></rootfiles></container>'
+    )
+
+    buffer = io.BytesIO()
+    # Chapters are stored uncompressed so the file size follows `size`.
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as epub:
+        epub.writestr("mimetype", "application/epub+zip")
+        epub.writestr("META-INF/container.xml", container)
+        epub.writestr("OEBPS/content.opf", package)
+        if cover:
+            epub.writestr("OEBPS/cover.png", cover)
+        for number in range(1, chapter_count + 1):
+            epub.writestr(
+                f"OEBPS/chapter{number}.xhtml",
+                '<?xml version="1.0" encoding="utf-8"?>'
+                '<html xmlns="http://www.w3.org/1999/xhtml"><body>'
+                f"<h1>Chapter {number}</h1><p>{_chapter_text(number, chapter_size)}</p>"
+                "</body></html>",
+            )
+    return buffer.getvalue()
+
+
+def build_pdf(size: int, page_size: int = 4 * 1024) -> bytes:
+    """Build a PDF book of roughly the given size, one text block per page."""
+    page_count = max(1, size // page_size)
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        4: f"<< /Title ({BOOK_TITLE}) /Author ({BOOK_AUTHOR}) >>",
+    }
+    page_ids = []
+    for number in range(page_count):
+        page_id, content_id = 5 + number * 2, 6 + number * 2
+        page_ids.append(page_id)
+        text = (
+            _chapter_text(number + 1, page_size - 64).replace("(", "").replace(")", "")
+        )
+        stream = f"BT /F1 10 Tf 72 720 Td ({text}) Tj ET"
+        objects[page_id] = (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        objects[content_id] = (
+            f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+        )
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>"
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(pdf)
+        pdf += f"{object_id} 0 obj\n{objects[object_id]}\nendobj\n".encode()
+    xref_offset = len(pdf)
+    object_count = max(objects) + 1
+    pdf += f"xref\n0 {object_count}\n0000000000 65535 f \n".encode()
+    for object_id in range(1, object_count):
+        pdf += f"{offsets[object_id]:010d} 00000 n \n".encode()
+    pdf += (
+        f"trailer\n<< /Size {object_count} /Root 1 0 R /Info 4 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+    return bytes(pdf)
+
+
+@functools.lru_cache(maxsize=32)
+def build_book(book_format: str, size: int, *, cover: bool = False) -> bytes:
+    """Build a synthetic book; unknown formats get filler bytes."""
+    if book_format in {"epub", "fb2"}:
+        builder = build_epub if book_format == "epub" else build_fb2
+        return builder(size, cover=build_cover() if cover else None)
+    if book_format == "pdf":
+        return build_pdf(size)
+    return (_PARAGRAPH.encode() * (size // len(_PARAGRAPH) + 1))[:size]
+
+
+def _get_int_query(request: web.Request, name: str, default: int) -> int:
+    raw_value = request.query.get(name, "")
+    return int(raw_value) if raw_value.isdigit() else default
+
+
+def _get_byte_range(request: web.Request, etag: str, length: int) -> range | None:
+    """Get the requested byte range, or None to send the whole body."""
+    match = _RANGE_PATTERN.fullmatch(request.headers.get(hdrs.RANGE, ""))
+    if match is None or request.headers.get(hdrs.IF_RANGE, etag) != etag:
+        return None
+    end = int(match[2]) + 1 if match[2] else length
+    return range(int(match[1]), min(end, length))
+
+
+async def serve_book(request: web.Request) -> web.StreamResponse:
+    """Serve a synthetic book after the requested latency."""
+    app_config = request.app[FILE_SERVER_CONFIG]
+    latency_ms = _get_int_query(request, "latency_ms", app_config["latency_ms"])
+    if latency_ms:
+        await asyncio.sleep(latency_ms / 1000)
+
+    status = _get_int_query(request, "status", http_statuses.HTTP_200_OK)
+    if status != http_statuses.HTTP_200_OK:
+        return web.Response(status=status)
+
+    request_counts = request.app[FILE_SERVER_REQUEST_COUNTS]
+    request_counts[request.path] += 1
+    failing = request_counts[request.path] <= _get_int_query(request, "failures", 0)
+    fail_after = _get_int_query(request, "fail_after", -1)
+    if failing and fail_after < 0:
+        return web.Response(status=http_statuses.HTTP_503_SERVICE_UNAVAILABLE)
+
+    book_format = request.match_info["format"].lower()
+    size = min(_get_int_query(request, "size", app_config["size"]), MAX_BOOK_SIZE)
+    cover = bool(_get_int_query(request, "cover", 0))
+    body = build_book(book_format, size, cover=cover)
+    etag = f'"{book_format}-{size}-{int(cover)}"'
+    headers = {hdrs.ETAG: etag}
+    if _get_int_query(request, "compress", 0) and "gzip" in request.headers.get(
+        hdrs.ACCEPT_ENCODING, ""
+    ):
+        body = gzip.compress(body, mtime=0)
+        etag = headers[hdrs.ETAG] = f'"{book_format}-{size}-{int(cover)}-gzip"'
+        headers[hdrs.CONTENT_ENCODING] = "gzip"
+    if _get_int_query(request, "ranges", 1):
+        headers[hdrs.ACCEPT_RANGES] = "bytes"
+        byte_range = _get_byte_range(request, etag, len(body))
+    else:
+        byte_range = None
+
+    if byte_range is None:
+        status = http_statuses.HTTP_200_OK
+    elif not byte_range:
+        return web.Response(
+            status=http_statuses.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={hdrs.CONTENT_RANGE: f"bytes */{len(body)}"},
+        )
+    else:
+        status = http_statuses.HTTP_206_PARTIAL_CONTENT
+        headers[hdrs.CONTENT_RANGE] = (
+            f"bytes {byte_range.start}-{byte_range.stop - 1}/{len(body)}"
+        )
+        body = body[byte_range.start : byte_range.stop]
+
+    response = web.StreamResponse(status=status, headers=headers)
+    response.content_type = CONTENT_TYPES.get(book_format, "application/octet-stream")
+    response.content_length = len(body)
+    await response.prepare(request)
+    if failing:
+        # Drop the connection mid-body, as a flaky link would
+        await response.write(body[:fail_after])
+        # Hand the partial body to the socket before dropping the connection
+        await request.writer.drain()
+        request.transport.close()
+        return response
+    await response.write(body)
+    await response.write_eof()
+    return response
+
+
+def create_file_server_app(
+    size: int = DEFAULT_BOOK_SIZE, latency_ms: int = 0
+) -> web.Application:
+    """Create the file server application with default size and latency."""
+    app = web.Application()
+    app[FILE_SERVER_CONFIG] = {"size": size, "latency_ms": latency_ms}
+    app[FILE_SERVER_REQUEST_COUNTS] = collections.Counter()
+    app.router.add_get("/books/{name}.{format}", serve_book)
+    return app
+
+
+def main() -> None:
+    """Run the file server."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--size", type=int, default=DEFAULT_BOOK_SIZE)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    args = parser.parse_args()
+
+    web.run_app(
+        create_file_server_app(size=args.size, latency_ms=args.latency_ms),
+        host=args.host,
+        port=args.port,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""
+Hermetic load test of the API.
+
+Starts the application and a local file server in-process, seeds a throwaway
+Postgres database with synthetic books and drives every endpoint at the
+given concurrency. The database, the downloaded books and the catalog
+snapshot are dropped after the run, so the configured catalog is untouched.
+Reports throughput, latency percentiles and RSS per scenario, and compares
+them with stored baselines: a regression beyond the tolerance fails the run.
+
+Usage: python -m benchmarks.load [--books 1000] [--requests 200]
+    [--concurrency 20] [--file-size 65536] [--file-latency-ms 0]
+    [--baseline benchmarks/baselines.json] [--save-baseline] [--tolerance 0.25]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import dataclasses
+import io
+import itertools
+import json
+import pathlib
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import typing
+import uuid
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+import aiohttp
+import pandas as pd
+import pydantic
+import sqlalchemy as sa
+import sqlalchemy.ext.asyncio as sa_asyncio_ext
+from aiohttp import web
+
+from benchmarks.file_server import create_file_server_app
+from literaflow import utils
+from literaflow.core import config, db
+from literaflow.core.db import async_session_maker
+from literaflow.models import book as book_models
+from literaflow.services.book_facets import BookFacetService
+
+DEFAULT_BASELINE_PATH = pathlib.Path(__file__).resolve().parent / "baselines.json"
+
+GENRES = ("Novel", "Poetry", "Drama", "Essay", "Fantasy", "Mystery")
+BOOK_FORMATS = ("epub", "fb2", "pdf")
+
+RequestFactory = Callable[[aiohttp.ClientSession, int], Awaitable[int]]
+
+
+@typing.final
+@dataclasses.dataclass(frozen=True, slots=True)
+class ScenarioResult:
+    """Measurements of a scenario."""
+
+    name: str
+    requests: int
+    errors: int
+    throughput_rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    rss_mb: float
+
+
+@typing.final
+@dataclasses.dataclass(slots=True)
+class Catalog:
+    """Books seeded for a run, used to build the requests."""
+
+    run_id: str
+    names: list[str]
+    authors: list[str]
+    dates: list[str]
+    book_ids: list[int] = dataclasses.field(default_factory=list)
+    downloadable_ids: list[int] = dataclasses.field(default_factory=list)
+
+
+def get_rss_mb() -> float:
+    """Get the peak resident set size of the process in MiB."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+@contextlib.asynccontextmanager
+async def throwaway_catalog() -> AsyncIterator[None]:
+    """Point the application at a new database and books directory, dropped after."""
+    connection_settings = config.postgresql_connection_settings
+    app_settings = config.app_settings
+    database_name = f"literaflow_load_{uuid.uuid4().hex[:8]}"
+    admin_engine = sa_asyncio_ext.create_async_engine(
+        connection_settings.async_url, isolation_level="AUTOCOMMIT"
+    )
+    configured = (
+        connection_settings.DB_NAME,
+        app_settings.BOOKS_DIR,
+        app_settings.CATALOG_SNAPSHOT_PATH,
+    )
+    try:
+        async with admin_engine.connect() as connection:
+            await connection.execute(sa.text(f'CREATE DATABASE "{database_name}"'))
+        with tempfile.TemporaryDirectory(prefix="literaflow-load-") as temp_dir:
+            connection_settings.DB_NAME = pydantic.SecretStr(database_name)
+            app_settings.BOOKS_DIR = str(pathlib.Path(temp_dir) / "books")
+            app_settings.CATALOG_SNAPSHOT_PATH = str(
+                pathlib.Path(temp_dir) / "catalog.snapshot"
+            )
+            try:
+                yield
+            finally:
+                await db.get_async_engine().dispose()
+                db.get_async_engine.cache_clear()
+                db.get_async_session_maker.cache_clear()
+                (
+                    connection_settings.DB_NAME,
+                    app_settings.BOOKS_DIR,
+                    app_settings.CATALOG_SNAPSHOT_PATH,
+                ) = configured
+                async with admin_engine.connect() as connection:
+                    await connection.execute(
+                        sa.text(
+                            f'DROP DATABASE IF EXISTS "{database_name}" WITH (FORCE)'
+                        )
+                    )
+    finally:
+        await admin_engine.dispose()
+
+
+async def seed_books(count: int) -> Catalog:
+    """Insert synthetic books with a single multi-row insert."""
+    run_id = uuid.uuid4().hex[:8]
+    catalog = Catalog(
+        run_id=run_id,
+        names=[f"Seeded book {run_id}-{number}" for number in range(count)],
+        authors=[
+            f"Seeded author {run_id}-{number}" for number in range(count // 10 + 1)
+        ],
+        dates=[f"{1900 + number % 120}-01-01" for number in range(count)],
+    )
+    rows = [
+        {
+            "name": name,
+            "author": catalog.authors[number % len(catalog.authors)],
+            "date_published": pd.Timestamp(catalog.dates[number]).date(),
+            "genre": GENRES[number % len(GENRES)],
+        }
+        for number, name in enumerate(catalog.names)
+    ]
+    async with async_session_maker() as session:
+        result = await session.execute(
+            sa.insert(book_models.Book).returning(book_models.Book.id), rows
+        )
+        catalog.book_ids = list(result.scalars())
+        await BookFacetService.add_books(
+            session,
+            (
+                (row["genre"], row["author"], row["date_published"], False)
+                for row in rows
+            ),
+        )
+        await session.commit()
+    return catalog
+
+
+def build_denied_list(names: list[str]) -> bytes:
+    """Build a denied list XLSX file."""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        pd.DataFrame({"name": names}).to_excel(writer, sheet_name="name", index=False)
+        pd.DataFrame({"author": []}).to_excel(writer, sheet_name="author", index=False)
+    return buffer.getvalue()
+
+
+def get_percentiles_ms(latencies: list[float]) -> tuple[float, float, float]:
+    """Get the p50, p95 and p99 of latencies in seconds, in milliseconds."""
+    latencies_ms = [latency * 1000 for latency in latencies]
+    if len(latencies_ms) < 2:  # noqa: PLR2004
+        # Quantiles need two samples, a single one is every percentile
+        latency_ms = latencies_ms[0] if latencies_ms else 0.0
+        return latency_ms, latency_ms, latency_ms
+    percentiles = statistics.quantiles(latencies_ms, n=100, method="inclusive")
+    return percentiles[49], percentiles[94], percentiles[98]
+
+
+async def run_scenario(
+    name: str,
+    session: aiohttp.ClientSession,
+    send_request: RequestFactory,
+    requests: int,
+    concurrency: int,
+) -> ScenarioResult:
+    """Send the scenario's requests at the given concurrency."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def timed_request(number: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start_time = time.perf_counter()
+            try:
+                status = await send_request(session, number)
+            except aiohttp.ClientError:
+                status = 0
+            latencies.append(time.perf_counter() - start_time)
+            if not 200 <= status < 300:  # noqa: PLR2004
+                errors += 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(timed_request(number) for number in range(requests)))
+    elapsed = time.perf_counter() - start_time
+
+    p50_ms, p95_ms, p99_ms = get_percentiles_ms(latencies)
+    return ScenarioResult(
+        name=name,
+        requests=requests,
+        errors=errors,
+        throughput_rps=requests / elapsed,
+        p50_ms=p50_ms,
+        p95_ms=p95_ms,
+        p99_ms=p99_ms,
+        rss_mb=get_rss_mb(),
+    )
+
+
+def build_scenarios(
+    app_url: str, file_server_url: str, catalog: Catalog
+) -> dict[str, RequestFactory]:
+    """Build the request factory of each scenario."""
+    create_counter = itertools.count()
+
+    async def create(session: aiohttp.ClientSession, number: int) -> int:
+        book_format = BOOK_FORMATS[number % len(BOOK_FORMATS)]
+        payload = {
+            "name": f"Created book {catalog.run_id}-{next(create_counter)}",
+            "author": catalog.authors[number % len(catalog.authors)],
+            "date_published": catalog.dates[number % len(catalog.dates)],
+            "genre": GENRES[number % len(GENRES)],
+            "url": f"{file_server_url}/books/book-{number}.{book_format}",
+        }
+        async with session.post(f"{app_url}/v1/books", json=payload) as response:
+            if response.status == 201:  # noqa: PLR2004
+                catalog.downloadable_ids.append((await response.json())["id"])
+            return response.status
+
+    def list_books(
+        params_factory: Callable[[int], dict], path: str = "/v1/books"
+    ) -> RequestFactory:
+        async def send(session: aiohttp.ClientSession, number: int) -> int:
+            async with session.get(
+                f"{app_url}{path}", params=params_factory(number)
+            ) as response:
+                await response.read()
+                return response.status
+
+        return send
+
+    async def get_by_id(session: aiohttp.ClientSession, number: int) -> int:
+        book_id = catalog.book_ids[number % len(catalog.book_ids)]
+        async with session.get(f"{app_url}/v1/books/{book_id}") as response:
+            await response.read()
+            return response.status
+
+    async def download(session: aiohttp.ClientSession, number: int) -> int:
+        book_id = catalog.downloadable_ids[number % len(catalog.downloadable_ids)]
+        async with session.get(f"{app_url}/v1/books/{book_id}/download") as response:
+            await response.read()
+            return response.status
+
+    async def deny(session: aiohttp.ClientSession, number: int) -> int:
+        form = aiohttp.FormData()
+        form.add_field(
+            "file",
+            build_denied_list([catalog.names[number % len(catalog.names)]]),
+            filename="denied_books.xlsx",
+        )
+        async with session.post(f"{app_url}/v1/books/deny", data=form) as response:
+            await response.read()
+            return response.status
+
+    return {
+        "create": create,
+        "list_all": list_books(lambda _: {}),
+        "list_by_name": list_books(
+            lambda number: {"name": catalog.names[number % len(catalog.names)]}
+        ),
+        "list_by_author": list_books(
+            lambda number: {"author": catalog.authors[number % len(catalog.authors)]}
+        ),
+        "list_by_date_published": list_books(
+            lambda number: {
+                "date_published": catalog.dates[number % len(catalog.dates)]
+            }
+        ),
+        "list_by_genre": list_books(
+            lambda number: {"genre": GENRES[number % len(GENRES)]}
+        ),
+        "list_names": list_books(lambda _: {"fields": "id,name"}),
+        "list_names_by_genre": list_books(
+            lambda number: {"genre": GENRES[number % len(GENRES)], "fields": "id,name"}
+        ),
+        "list_names_with_total": list_books(
+            lambda number: {
+                "genre": GENRES[number % len(GENRES)],
+                "fields": "id,name",
+                "total": "estimated",
+            }
+        ),
+        "suggest": list_books(
+            lambda number: {"prefix": catalog.names[number % len(catalog.names)][:3]},
+            path="/v1/books/suggest",
+        ),
+        "facets": list_books(lambda _: {}, path="/v1/books/facets"),
+        "facets_by_genre": list_books(
+            lambda number: {"genre": GENRES[number % len(GENRES)]},
+            path="/v1/books/facets",
+        ),
+        "popular": list_books(lambda _: {}, path="/v1/books/popular"),
+        "get_by_id": get_by_id,
+        "download": download,
+        "deny": deny,
+    }
+
+
+async def start_site(app: web.Application) -> tuple[web.AppRunner, str]:
+    """Start an application on a free local port."""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+async def run_load_test(args: argparse.Namespace) -> list[ScenarioResult]:
+    """Run every scenario against in-process servers and a throwaway catalog."""
+    async with throwaway_catalog():
+        return await _run_scenarios(args)
+
+
+async def _run_scenarios(args: argparse.Namespace) -> list[ScenarioResult]:
+    file_server_runner, file_server_url = await start_site(
+        create_file_server_app(size=args.file_size, latency_ms=args.file_latency_ms)
+    )
+    app_runner, app_url = await start_site(utils.create_app())
+    try:
+        catalog = await seed_books(args.books)
+        scenarios = build_scenarios(app_url, file_server_url, catalog)
+        results = []
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for name, send_request in scenarios.items():
+                if args.scenario and name not in args.scenario:
+                    continue
+                if name == "download" and not catalog.downloadable_ids:
+                    continue
+                requests = (
+                    max(1, args.requests // 10) if name == "deny" else args.requests
+                )
+                results.append(
+                    await run_scenario(
+                        name, session, send_request, requests, args.concurrency
+                    )
+                )
+        return results
+    finally:
+        await app_runner.cleanup()
+        await file_server_runner.cleanup()
+
+
+def find_regressions(
+    results: list[ScenarioResult], baselines: dict, tolerance: float
+) -> list[str]:
+    """Compare the results with the baselines."""
+    regressions = []
+    for result in results:
+        baseline = baselines.get(result.name)
+        if baseline is None:
+            print(f"WARNING {result.name}: no baseline to compare with")  # noqa: T201
+            continue
+        if result.throughput_rps < baseline["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{result.name}: throughput {result.throughput_rps:.1f} rps is below "
+                f"the baseline {baseline["throughput_rps"]:.1f} rps"
+            )
+        if result.p95_ms > baseline["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{result.name}: p95 {result.p95_ms:.1f} ms is above "
+                f"the baseline {baseline["p95_ms"]:.1f} ms"
+            )
+        if result.errors > baseline.get("errors", 0):
+            regressions.append(f"{result.name}: {result.errors} failed requests")
+    return regressions
+
+
+def print_results(results: list[ScenarioResult]) -> None:
+    """Print the results as a table."""
+    print(  # noqa: T201
+        f"{"scenario":<24}{"requests":>9}{"errors":>8}{"rps":>10}"
+        f"{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"RSS MiB":>10}"
+    )
+    for result in results:
+        print(  # noqa: T201
+            f"{result.name:<24}{result.requests:>9}{result.errors:>8}"
+            f"{result.throughput_rps:>10.1f}{result.p50_ms:>10.2f}"
+            f"{result.p95_ms:>10.2f}{result.p99_ms:>10.2f}{result.rss_mb:>10.1f}"
+        )
+
+
+def main() -> None:
+    """Run the load test and fail on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--file-size", type=int, default=64 * 1024)
+    parser.add_argument("--file-latency-ms", type=int, default=0)
+    parser.add_argument("--scenario", action="append", help="Run only these")
+    parser.add_argument("--baseline", type=pathlib.Path, default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = asyncio.run(run_load_test(args))
+    print_results(results)
+
+    if args.save_baseline:
+        args.baseline.write_text(
+            json.dumps(
+                {result.name: dataclasses.asdict(result) for result in results},
+                indent=2,
+            )
+            + "\n"
+        )
+        print(f"Saved the baseline to {args.baseline}")  # noqa: T201
+        return
+
+    if not args.baseline.exists():
+        sys.exit(
+            f"No baselines at {args.baseline}, record them on this machine with "
+            "--save-baseline (make bench-load-baseline)"
+        )
+    regressions = find_regressions(
+        results, json.loads(args.baseline.read_text()), args.tolerance
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")  # noqa: T201
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Serialization benchmark.
+
+Compares encoding a large book listing with the stdlib `json.dumps` of
+`Book.to_dict()` against the configured backend, with and without the
+pre-encoded fragment cache.
+
+Usage: python -m benchmarks.serialization [--books 10000] [--rounds 20]
+"""
+
+import argparse
+import datetime
+import json
+import timeit
+
+from literaflow.models import book as book_models
+from literaflow.utils import serialization
+
+
+def build_books(count: int) -> list[book_models.Book]:
+    """Build transient book models that look like a real listing."""
+    created_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+    return [
+        book_models.Book(
+            id=book_id,
+            created_at=created_at,
+            updated_at=created_at,
+            name=f"Book number {book_id}",
+            author=f"Author {book_id % 100}",
+            date_published=datetime.date(1900 + book_id % 120, 1, 1),
+            genre="Novel",
+            is_denied=book_id % 10 == 0,
+            file_path=f"/app/books/{book_id}.epub",
+        )
+        for book_id in range(1, count + 1)
+    ]
+
+
+def main() -> None:
+    """Print the time it takes to encode a listing with each strategy."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    books = build_books(args.books)
+    fragments = serialization.FragmentCache(maxsize=args.books)
+
+    strategies = {
+        "stdlib json.dumps": lambda: json.dumps([book.to_dict() for book in books]),
+        "backend dumps": lambda: serialization.dumps([
+            book.to_dict() for book in books
+        ]),
+        "cached fragments": lambda: serialization.encode_array(
+            fragments.get_or_encode(key=(book.id, book.updated_at), build=book.to_dict)
+            for book in books
+        ),
+    }
+    for name, strategy in strategies.items():
+        seconds = min(timeit.repeat(strategy, number=1, repeat=args.rounds))
+        print(f"{name:>20}: {seconds * 1000:8.2f} ms per listing")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
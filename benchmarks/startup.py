@@ -0,0 +1,95 @@
+"""
+Startup benchmark.
+
+Reports the import time of every module loaded by the application's startup
+path, the same way `python -X importtime` does, sorted by cumulative time.
+
+Usage: python -m benchmarks.startup [--module literaflow.utils] [--top 25]
+"""
+
+import argparse
+import dataclasses
+import os
+import subprocess  # noqa: S404
+import sys
+import typing
+
+STARTUP_MODULE = "literaflow.utils"
+
+_IMPORTTIME_PREFIX = "import time:"
+
+
+@typing.final
+@dataclasses.dataclass(frozen=True, slots=True)
+class ImportTiming:
+    """Import time of a single module, in microseconds."""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def parse_importtime(output: str) -> list[ImportTiming]:
+    """Parse the stderr output of `python -X importtime`."""
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith(_IMPORTTIME_PREFIX):
+            continue
+        raw_self, raw_cumulative, raw_module = line.removeprefix(
+            _IMPORTTIME_PREFIX
+        ).split("|")
+        if not raw_self.strip().isdigit():
+            # Header line: "self [us] | cumulative | imported package"
+            continue
+        timings.append(
+            ImportTiming(
+                module=raw_module.strip(),
+                self_us=int(raw_self),
+                cumulative_us=int(raw_cumulative),
+            )
+        )
+    return timings
+
+
+def measure_import_times(module: str = STARTUP_MODULE) -> list[ImportTiming]:
+    """Import a module in a fresh interpreter and collect per-module timings."""
+    completed = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=os.environ.copy(),
+    )
+    return parse_importtime(completed.stderr)
+
+
+def total_import_time_us(timings: list[ImportTiming], module: str) -> int:
+    """Get the cumulative import time of a module."""
+    for timing in timings:
+        if timing.module == module:
+            return timing.cumulative_us
+    raise ValueError(f"Module {module} was not imported")
+
+
+def main() -> None:
+    """Print the slowest imports of the startup path."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default=STARTUP_MODULE)
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    timings = measure_import_times(args.module)
+    slowest = sorted(timings, key=lambda timing: timing.cumulative_us, reverse=True)
+
+    print(f"{"cumulative [us]":>16} {"self [us]":>10}  module")  # noqa: T201
+    for timing in slowest[: args.top]:
+        print(  # noqa: T201
+            f"{timing.cumulative_us:>16} {timing.self_us:>10}  {timing.module}"
+        )
+    print(  # noqa: T201
+        f"Total: {total_import_time_us(timings, args.module) / 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
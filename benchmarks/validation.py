@@ -0,0 +1,89 @@
+"""
+Request validation benchmark.
+
+Compares validations per second of each DTO on the decode-then-construct
+path (JSON decoded by the serialization backend or the query copied into a
+dict, then `create_dto_safely(**data)`) against the direct path
+(`validate_dto_json` on the raw body, `validate_dto` on the query mapping).
+
+Usage: python -m benchmarks.validation [--rounds 5] [--number 20000]
+"""
+
+import argparse
+import timeit
+from collections.abc import Callable
+
+from multidict import MultiDict, MultiDictProxy
+
+from literaflow.core import dto
+from literaflow.utils import serialization
+
+BOOK_BODY = serialization.dumps({
+    "name": "War and Peace",
+    "author": "Leo Tolstoy",
+    "date_published": "1869-01-01",
+    "genre": "Novel",
+    "url": "https://books.example.com/war-and-peace.epub",
+})
+BOOK_IDS_BODY = serialization.dumps({"ids": list(range(1, 101))})
+FILTERS_QUERY = MultiDictProxy(
+    MultiDict({"author": "Leo Tolstoy", "date_published": "1869-01-01"})
+)
+FACETS_QUERY = MultiDictProxy(MultiDict({"genre": "Novel", "limit": "50"}))
+PAGE_QUERY = MultiDictProxy(MultiDict({"page": "12"}))
+
+
+def build_cases() -> dict[str, tuple[Callable[[], object], Callable[[], object]]]:
+    """Build the decode-then-construct and the direct validation of each DTO."""
+    return {
+        "Book (JSON body)": (
+            lambda: dto.create_dto_safely(dto.Book, **serialization.loads(BOOK_BODY)),
+            lambda: dto.validate_dto_json(dto.Book, BOOK_BODY),
+        ),
+        "BookIDs (JSON body)": (
+            lambda: dto.create_dto_safely(
+                dto.BookIDs, **serialization.loads(BOOK_IDS_BODY)
+            ),
+            lambda: dto.validate_dto_json(dto.BookIDs, BOOK_IDS_BODY),
+        ),
+        "BookFilters (query)": (
+            lambda: dto.create_dto_safely(dto.BookFilters, **dict(FILTERS_QUERY)),
+            lambda: dto.validate_dto(dto.BookFilters, FILTERS_QUERY),
+        ),
+        "BookFacetsQuery (query)": (
+            lambda: dto.create_dto_safely(dto.BookFacetsQuery, **dict(FACETS_QUERY)),
+            lambda: dto.validate_dto(dto.BookFacetsQuery, FACETS_QUERY),
+        ),
+        "BookPageQuery (query)": (
+            lambda: dto.create_dto_safely(dto.BookPageQuery, **dict(PAGE_QUERY)),
+            lambda: dto.validate_dto(dto.BookPageQuery, PAGE_QUERY),
+        ),
+    }
+
+
+def measure(validate: Callable[[], object], rounds: int, number: int) -> float:
+    """Get the best validations per second over the rounds."""
+    return number / min(timeit.repeat(validate, number=number, repeat=rounds))
+
+
+def main() -> None:
+    """Print the validations per second of each DTO on both paths."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--number", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print(  # noqa: T201
+        f"{"DTO":<26}{"construct/s":>14}{"direct/s":>14}{"speedup":>10}"
+    )
+    for name, (construct, validate) in build_cases().items():
+        construct_rate = measure(construct, args.rounds, args.number)
+        validate_rate = measure(validate, args.rounds, args.number)
+        print(  # noqa: T201
+            f"{name:<26}{construct_rate:>14,.0f}{validate_rate:>14,.0f}"
+            f"{validate_rate / construct_rate:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
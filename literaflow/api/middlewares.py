@@ -0,0 +1,170 @@
+import re
+import time
+import uuid
+
+from aiohttp import hdrs, web
+from aiohttp.typedefs import Handler
+
+from literaflow.core import config, metrics, profiling
+from literaflow.core.logger import request_id_var
+from literaflow.utils import admission, compression, http_statuses, serialization
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+# Route label of requests that matched no route, to keep label cardinality low
+UNMATCHED_ROUTE = "unmatched"
+
+# Admission controllers of the limited routes, keyed by "METHOD /route"
+ADMISSION_CONTROLLERS = web.AppKey(
+    "admission_controllers", dict[str, admission.AdmissionController]
+)
+
+
+def get_route_name(request: web.Request) -> str:
+    """Get the route template of a request, e.g. `/v1/books/{book_id}`."""
+    match_info = request.match_info
+    if match_info.http_exception is not None or match_info.route.resource is None:
+        return UNMATCHED_ROUTE
+    return match_info.route.resource.canonical
+
+
+@web.middleware
+async def request_id_middleware(
+    request: web.Request, handler: Handler
+) -> web.StreamResponse:
+    """Attach a correlation ID to the request's log lines and response."""
+    request_id = request.headers.get(REQUEST_ID_HEADER, "")
+    if not _VALID_REQUEST_ID.fullmatch(request_id):
+        request_id = uuid.uuid4().hex
+
+    token = request_id_var.set(request_id)
+    try:
+        response = await handler(request)
+    except web.HTTPException as exc:
+        exc.headers[REQUEST_ID_HEADER] = request_id
+        raise
+    finally:
+        request_id_var.reset(token)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
+@web.middleware
+async def metrics_middleware(
+    request: web.Request, handler: Handler
+) -> web.StreamResponse:
+    """Record request counts, statuses and latencies per route."""
+    route = get_route_name(request)
+    status = http_statuses.HTTP_500_INTERNAL_SERVER_ERROR
+    metrics.http_requests_in_progress.inc(method=request.method, route=route)
+    start_time = time.perf_counter()
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as exc:
+        status = exc.status
+        raise
+    finally:
+        metrics.http_request_duration_seconds.observe(
+            time.perf_counter() - start_time, method=request.method, route=route
+        )
+        metrics.http_requests_total.inc(
+            method=request.method, route=route, status=str(status)
+        )
+        metrics.http_requests_in_progress.dec(method=request.method, route=route)
+
+
+@web.middleware
+async def admission_middleware(
+    request: web.Request, handler: Handler
+) -> web.StreamResponse:
+    """Reject requests to saturated routes instead of queueing them unboundedly."""
+    route = get_route_name(request)
+    controller = request.app[ADMISSION_CONTROLLERS].get(f"{request.method} {route}")
+    if controller is None:
+        return await handler(request)
+
+    try:
+        async with controller.admit() as admitted:
+            _update_admission_metrics(request.method, route, controller)
+            response = await handler(request)
+            admitted.status = response.status
+            return response
+    except admission.AdmissionRejectedError as exc:
+        metrics.http_requests_rejected_total.inc(
+            method=request.method, route=route, reason=exc.reason
+        )
+        response = serialization.json_response(
+            {"error": "Service is overloaded, retry later"},
+            status=http_statuses.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+        response.headers[hdrs.RETRY_AFTER] = str(exc.retry_after)
+        return response
+    finally:
+        _update_admission_metrics(request.method, route, controller)
+
+
+def _update_admission_metrics(
+    method: str, route: str, controller: admission.AdmissionController
+) -> None:
+    metrics.admission_concurrency_limit.set(
+        controller.adaptive_limit.limit, method=method, route=route
+    )
+    metrics.admission_queue_size.set(controller.queue_size, method=method, route=route)
+
+
+@web.middleware
+async def compression_middleware(
+    request: web.Request, handler: Handler
+) -> web.StreamResponse:
+    """Compress large JSON responses according to the request's Accept-Encoding."""
+    response = await handler(request)
+
+    if (
+        not isinstance(response, web.Response)
+        or response.content_type != "application/json"
+        or hdrs.CONTENT_ENCODING in response.headers
+        or not isinstance(response.body, bytes)
+        or len(response.body) < config.app_settings.COMPRESSION_MIN_SIZE
+    ):
+        return response
+
+    response.headers.add(hdrs.VARY, hdrs.ACCEPT_ENCODING)
+    encoding = compression.negotiate_encoding(
+        request.headers.get(hdrs.ACCEPT_ENCODING, ""),
+        compression.SUPPORTED_ENCODINGS,
+    )
+    if encoding is not None:
+        response.body = await compression.compress_async(response.body, encoding)
+        response.headers[hdrs.CONTENT_ENCODING] = encoding
+    return response
+
+
+@web.middleware
+async def slow_request_middleware(
+    request: web.Request, handler: Handler
+) -> web.StreamResponse:
+    """Log requests slower than the threshold with a per-phase breakdown."""
+    threshold_ms = config.app_settings.SLOW_REQUEST_THRESHOLD_MS
+    if threshold_ms <= 0:
+        return await handler(request)
+
+    status = http_statuses.HTTP_500_INTERNAL_SERVER_ERROR
+    token = profiling.start_request_profile()
+    start_time = time.perf_counter()
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as exc:
+        status = exc.status
+        raise
+    finally:
+        duration = time.perf_counter() - start_time
+        phases = profiling.finish_request_profile(token)
+        if duration * 1000 >= threshold_ms:
+            profiling.log_slow_request(
+                request.method, get_route_name(request), status, duration, phases
+            )
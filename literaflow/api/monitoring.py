@@ -0,0 +1,65 @@
+import asyncio
+import hmac
+import threading
+
+from aiohttp import hdrs, web
+from aiohttp.web_request import Request
+
+from literaflow.core import config, metrics, profiling
+from literaflow.utils import http_statuses, serialization
+
+routes = web.RouteTableDef()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _check_admin_token(request: Request) -> None:
+    """Allow the request only with the configured admin bearer token."""
+    admin_token = config.app_settings.ADMIN_TOKEN
+    if admin_token is None:
+        # Admin endpoints do not exist unless a token is configured
+        raise web.HTTPNotFound
+
+    scheme, _, token = request.headers.get(hdrs.AUTHORIZATION, "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(
+        token.encode(), admin_token.get_secret_value().encode()
+    ):
+        raise web.HTTPUnauthorized(headers={hdrs.WWW_AUTHENTICATE: "Bearer"})
+
+
+@routes.get("/metrics")
+async def get_metrics(_: Request) -> web.Response:  # noqa: RUF029
+    """Endpoint to expose the metrics in the Prometheus text format."""
+    return web.Response(
+        body=metrics.REGISTRY.render().encode(),
+        headers={hdrs.CONTENT_TYPE: PROMETHEUS_CONTENT_TYPE},
+    )
+
+
+@routes.get("/admin/profile")
+async def profile_worker(request: Request) -> web.Response:
+    """Endpoint to sample the worker's stacks for N seconds as folded stacks."""
+    _check_admin_token(request)
+
+    raw_seconds = request.query.get("seconds", "10")
+    max_seconds = config.app_settings.PROFILER_MAX_SECONDS
+    seconds = float(raw_seconds) if raw_seconds.replace(".", "", 1).isdigit() else 0
+    if not 0 < seconds <= max_seconds:
+        return serialization.json_response(
+            {"error": f"seconds must be between 0 and {max_seconds}"},
+            status=http_statuses.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        folded_stacks = await asyncio.to_thread(
+            profiling.sampling_profiler.profile,
+            thread_id=threading.get_ident(),
+            duration=seconds,
+            interval=config.app_settings.PROFILER_SAMPLING_INTERVAL_MS / 1000,
+        )
+    except RuntimeError:
+        return serialization.json_response(
+            {"error": "A profile is already being captured"},
+            status=http_statuses.HTTP_409_CONFLICT,
+        )
+    return web.Response(text=folded_stacks, content_type="text/plain")
@@ -1,8 +1,10 @@
 from aiohttp import web
 
+from literaflow.api import monitoring
 from literaflow.api.v1 import books
 
 
 def setup_routes(app: web.Application) -> None:
     """Set up application routes."""
     app.add_routes(books.routes)
+    app.add_routes(monitoring.routes)
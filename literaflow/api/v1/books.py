@@ -2,10 +2,13 @@ from aiohttp import web
 from aiohttp.web_request import Request
 
 import literaflow.services.exceptions as s_exceptions
-from literaflow.core import dto, logger
+from literaflow.core import config, dto, logger, metrics
+from literaflow.models import book as book_models
 from literaflow.services.book import BookService
+from literaflow.services.book_stats import BookStatsService
+from literaflow.services.book_suggestions import BookSuggestionService
 from literaflow.services.denied_list import DeniedListService
-from literaflow.utils import http_statuses
+from literaflow.utils import file_serving, http_statuses, serialization
 from literaflow.utils.denied_books_parser import (
     parse_denied_books,
 )
@@ -13,22 +16,33 @@ from literaflow.utils.denied_books_parser import (
 routes = web.RouteTableDef()
 
 
+def _encode_book(book: book_models.Book) -> bytes:
+    """Encode a book to JSON, reusing the cached fragment while it is unchanged."""
+    return serialization.get_fragment_cache().get_or_encode(
+        key=(book.id, book.updated_at), build=book.to_dict
+    )
+
+
+def _get_book_id(request: Request) -> dto.BookID | None:
+    """Get the book ID of the path, or None when it is not a number."""
+    raw_book_id = request.match_info["book_id"]
+    return int(raw_book_id) if raw_book_id.isdigit() else None
+
+
 @routes.post("/v1/books")
 async def create_book(request: Request) -> web.Response:
     """Endpoint to create a new book."""
     if not request.body_exists:
         raise web.HTTPBadRequest(reason="No request body provided")
 
+    book_dto: dto.Book
     try:
-        body = await request.json()
-    except Exception as exc:
+        book_dto, errors = dto.validate_dto_json(dto.Book, await request.read())
+    except ValueError as exc:
         raise web.HTTPBadRequest(reason="Invalid JSON body") from exc
 
-    book_dto: dto.Book
-    book_dto, errors = dto.create_dto_safely(dto.Book, **body)
-
     if errors:
-        return web.json_response(
+        return serialization.json_response(
             {"errors": errors}, status=http_statuses.HTTP_400_BAD_REQUEST
         )
 
@@ -37,80 +51,297 @@ async def create_book(request: Request) -> web.Response:
     try:
         book_model = await book_service.create_book(book_dto=book_dto)
     except s_exceptions.BookDownloadError:
-        return web.json_response(
+        return serialization.json_response(
             {"error": "Failed to download book file"},
             status=http_statuses.HTTP_500_INTERNAL_SERVER_ERROR,
         )
     except s_exceptions.BookAlreadyExistsError:
-        return web.json_response(
+        return serialization.json_response(
             {"error": "Book already exists"},
             status=http_statuses.HTTP_409_CONFLICT,
         )
 
-    return web.json_response(
-        book_model.to_dict(), status=http_statuses.HTTP_201_CREATED
+    return serialization.json_response(
+        body=_encode_book(book_model), status=http_statuses.HTTP_201_CREATED
     )
 
 
 @routes.get("/v1/books")
 async def get_books(request: Request) -> web.Response:
     """Endpoint to retrieve books based on query parameters."""
-    query_params = dict(request.query)
-
     boot_filters_dto: dto.BookFilters
-    boot_filters_dto, errors = dto.create_dto_safely(dto.BookFilters, **query_params)
+    boot_filters_dto, errors = dto.validate_dto(dto.BookFilters, request.query)
+    fields_query_dto: dto.BookFieldsQuery
+    fields_query_dto, fields_query_errors = dto.validate_dto(
+        dto.BookFieldsQuery, request.query
+    )
+    total_query_dto: dto.BookTotalQuery
+    total_query_dto, total_query_errors = dto.validate_dto(
+        dto.BookTotalQuery, request.query
+    )
+    errors = (errors or []) + (fields_query_errors or []) + (total_query_errors or [])
 
     if errors:
-        return web.json_response(
+        return serialization.json_response(
             {"errors": errors}, status=http_statuses.HTTP_400_BAD_REQUEST
         )
 
     book_service = BookService()
-    books = await book_service.get_books(filters_dto=boot_filters_dto)
-    return web.json_response([book.to_dict() for book in books])
+    if fields_query_dto.fields:
+        books_fields = await book_service.get_book_fields(
+            filters_dto=boot_filters_dto, fields=fields_query_dto.fields
+        )
+        response = serialization.json_response(books_fields)
+    else:
+        books = await book_service.get_books(filters_dto=boot_filters_dto)
+        response = serialization.json_response(
+            body=serialization.encode_array(_encode_book(book) for book in books)
+        )
+
+    if total_query_dto.total:
+        count = await book_service.count_books(
+            filters_dto=boot_filters_dto, exact=total_query_dto.total == "exact"
+        )
+        response.headers["X-Total-Count"] = str(count.value)
+        response.headers["X-Total-Count-Exact"] = "true" if count.is_exact else "false"
+    return response
+
+
+@routes.get("/v1/books/facets")
+async def get_book_facets(request: Request) -> web.Response:
+    """Endpoint to count the books per genre, author, year and denied status."""
+    filters_dto: dto.BookFilters
+    filters_dto, errors = dto.validate_dto(dto.BookFilters, request.query)
+    facets_query_dto: dto.BookFacetsQuery
+    facets_query_dto, facets_query_errors = dto.validate_dto(
+        dto.BookFacetsQuery, request.query
+    )
+    errors = (errors or []) + (facets_query_errors or [])
+
+    if errors:
+        return serialization.json_response(
+            {"errors": errors}, status=http_statuses.HTTP_400_BAD_REQUEST
+        )
+
+    book_service = BookService()
+    facets = await book_service.get_book_facets(
+        filters_dto=filters_dto, limit=facets_query_dto.limit
+    )
+    return serialization.json_response(facets)
+
+
+@routes.get("/v1/books/popular")
+async def get_popular_books(request: Request) -> web.Response:
+    """Endpoint to retrieve the most downloaded or viewed books."""
+    filters_dto: dto.BookFilters
+    filters_dto, errors = dto.validate_dto(dto.BookFilters, request.query)
+    popular_query_dto: dto.PopularBooksQuery
+    popular_query_dto, popular_query_errors = dto.validate_dto(
+        dto.PopularBooksQuery, request.query
+    )
+    errors = (errors or []) + (popular_query_errors or [])
+
+    if errors:
+        return serialization.json_response(
+            {"errors": errors}, status=http_statuses.HTTP_400_BAD_REQUEST
+        )
+
+    book_service = BookService()
+    popular_books = await book_service.get_popular_books(
+        filters_dto=filters_dto,
+        by=popular_query_dto.by,
+        limit=popular_query_dto.limit,
+    )
+    return serialization.json_response(
+        body=serialization.encode_array(
+            b'{"book":'
+            + _encode_book(book)
+            + b',"download_count":'
+            + serialization.dumps(stats.download_count)
+            + b',"view_count":'
+            + serialization.dumps(stats.view_count)
+            + b"}"
+            for book, stats in popular_books
+        )
+    )
+
+
+@routes.get("/v1/books/suggest")
+async def suggest_books(request: Request) -> web.Response:  # noqa: RUF029
+    """Endpoint to suggest book names and authors starting with a prefix."""
+    if not config.app_settings.BOOK_SUGGESTIONS_ENABLED:
+        raise web.HTTPNotFound
+
+    suggest_query_dto: dto.BookSuggestQuery
+    suggest_query_dto, errors = dto.validate_dto(dto.BookSuggestQuery, request.query)
+    if errors:
+        return serialization.json_response(
+            {"errors": errors}, status=http_statuses.HTTP_400_BAD_REQUEST
+        )
+
+    suggestions = BookSuggestionService.suggest(
+        suggest_query_dto.prefix, suggest_query_dto.limit
+    )
+    return serialization.json_response(suggestions)
+
+
+@routes.post("/v1/books/batch")
+async def get_books_batch(request: Request) -> web.Response:
+    """Endpoint to retrieve many books by their IDs in one request."""
+    book_ids_dto: dto.BookIDs
+    try:
+        book_ids_dto, errors = dto.validate_dto_json(dto.BookIDs, await request.read())
+    except ValueError as exc:
+        raise web.HTTPBadRequest(reason="Invalid JSON body") from exc
+
+    if errors:
+        return serialization.json_response(
+            {"errors": errors}, status=http_statuses.HTTP_400_BAD_REQUEST
+        )
+
+    book_service = BookService()
+    books_by_id = await book_service.get_books_by_ids(book_ids_dto.ids)
+
+    found_books = [
+        _encode_book(books_by_id[book_id])
+        for book_id in book_ids_dto.ids
+        if book_id in books_by_id
+    ]
+    missing_ids = [
+        book_id for book_id in book_ids_dto.ids if book_id not in books_by_id
+    ]
+    return serialization.json_response(
+        body=b'{"books":'
+        + serialization.encode_array(found_books)
+        + b',"missing":'
+        + serialization.dumps(missing_ids)
+        + b"}"
+    )
 
 
 @routes.get("/v1/books/{book_id}")
 async def get_book(request: Request) -> web.Response:
     """Endpoint to retrieve a book by ID."""
-    raw_book_id = request.match_info["book_id"]
-    book_id = int(raw_book_id) if raw_book_id.isdigit() else None
-
+    book_id = _get_book_id(request)
     if book_id is None:
-        return web.json_response(
+        return serialization.json_response(
             {"error": "Invalid book ID"}, status=http_statuses.HTTP_400_BAD_REQUEST
         )
+    fields_query_dto: dto.BookFieldsQuery
+    fields_query_dto, errors = dto.validate_dto(dto.BookFieldsQuery, request.query)
+    if errors:
+        return serialization.json_response(
+            {"errors": errors}, status=http_statuses.HTTP_400_BAD_REQUEST
+        )
 
     book_service = BookService()
     book = await book_service.get_book_by_id(book_id)
     if book is None:
-        return web.json_response(
+        return serialization.json_response(
             {"error": "Book not found"}, status=http_statuses.HTTP_404_NOT_FOUND
         )
 
-    return web.json_response(book.to_dict())
+    BookStatsService.record_view(book.id)
+    if fields_query_dto.fields:
+        # A single book is looked up by its primary key either way, so its
+        # fields are picked from the whole book, which lookups share
+        book_dict = book.to_dict()
+        return serialization.json_response({
+            field: book_dict[field] for field in fields_query_dto.fields
+        })
+    return serialization.json_response(body=_encode_book(book))
 
 
 @routes.get("/v1/books/{book_id}/download")
-async def download_book(request: Request) -> web.FileResponse | web.Response:
+async def download_book(request: Request) -> web.StreamResponse:
     """Endpoint to download a book file."""
-    book_id = int(request.match_info["book_id"])
+    book_id = _get_book_id(request)
+    if book_id is None:
+        return serialization.json_response(
+            {"error": "Invalid book ID"}, status=http_statuses.HTTP_400_BAD_REQUEST
+        )
     book_service = BookService()
     book = await book_service.get_book_by_id(book_id)
     if book is None:
-        return web.json_response(
+        return serialization.json_response(
             {"error": "Book not found"}, status=http_statuses.HTTP_404_NOT_FOUND
         )
     if book.is_denied:
-        return web.json_response(
+        return serialization.json_response(
             {"error": "Book is denied for download"},
             status=http_statuses.HTTP_403_FORBIDDEN,
         )
     if not book.file_path:
-        return web.json_response(
+        return serialization.json_response(
             {"error": "Book file not found"}, status=http_statuses.HTTP_404_NOT_FOUND
         )
-    return web.FileResponse(path=book.file_path)
+    BookStatsService.record_download(book.id)
+    return file_serving.create_file_response(book.file_path)
+
+
+@routes.get("/v1/books/{book_id}/cover")
+async def get_book_cover(request: Request) -> web.FileResponse | web.Response:
+    """Endpoint to retrieve the cover thumbnail extracted from a book file."""
+    book_id = _get_book_id(request)
+    if book_id is None:
+        return serialization.json_response(
+            {"error": "Invalid book ID"}, status=http_statuses.HTTP_400_BAD_REQUEST
+        )
+    book_service = BookService()
+    book = await book_service.get_book_by_id(book_id)
+    if book is None:
+        return serialization.json_response(
+            {"error": "Book not found"}, status=http_statuses.HTTP_404_NOT_FOUND
+        )
+    if not book.cover_path:
+        return serialization.json_response(
+            {"error": "Book cover not found"}, status=http_statuses.HTTP_404_NOT_FOUND
+        )
+    return web.FileResponse(path=book.cover_path)
+
+
+@routes.get("/v1/books/{book_id}/read")
+async def read_book(request: Request) -> web.Response:
+    """Endpoint to read a book online one page at a time, denied books included."""
+    book_id = _get_book_id(request)
+    if book_id is None:
+        return serialization.json_response(
+            {"error": "Invalid book ID"}, status=http_statuses.HTTP_400_BAD_REQUEST
+        )
+
+    page_query_dto: dto.BookPageQuery
+    page_query_dto, errors = dto.validate_dto(dto.BookPageQuery, request.query)
+    if errors:
+        return serialization.json_response(
+            {"errors": errors}, status=http_statuses.HTTP_400_BAD_REQUEST
+        )
+
+    book_service = BookService()
+    book = await book_service.get_book_by_id(book_id)
+    if book is None:
+        return serialization.json_response(
+            {"error": "Book not found"}, status=http_statuses.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        page = await book_service.get_book_page(book, page_query_dto.page)
+    except s_exceptions.BookNotReadableError:
+        return serialization.json_response(
+            {"error": "Book cannot be read online"},
+            status=http_statuses.HTTP_404_NOT_FOUND,
+        )
+    if page is None:
+        return serialization.json_response(
+            {"error": "Page not found"}, status=http_statuses.HTTP_404_NOT_FOUND
+        )
+
+    return serialization.json_response({
+        "book_id": book.id,
+        "page": page.number,
+        "page_count": page.page_count,
+        "title": page.title,
+        "text": page.text,
+    })
 
 
 @routes.post("/v1/books/deny")
@@ -120,21 +351,22 @@ async def upload_denied_books(request: Request) -> web.Response:
     field = await reader.next()
 
     if field.name != "file":
-        return web.json_response(
+        return serialization.json_response(
             {"error": "Expected a file upload"},
             status=http_statuses.HTTP_400_BAD_REQUEST,
         )
     data = await field.read()
 
     try:
-        denied_books = parse_denied_books(data)
+        with metrics.denied_list_parse_duration_seconds.time():
+            denied_books = parse_denied_books(data)
     except Exception as exc:  # noqa: BLE001
         logger.error(f"Failed to parse the denied books file: {exc}")
-        return web.json_response(
+        return serialization.json_response(
             {"error": "Failed to parse the denied books file"},
             status=http_statuses.HTTP_400_BAD_REQUEST,
         )
 
     denied_list_service = DeniedListService()
     await denied_list_service.update_denied_books(denied_books)
-    return web.json_response({"message": "Denied books updated"})
+    return serialization.json_response({"message": "Denied books updated"})
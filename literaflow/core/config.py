@@ -1,7 +1,11 @@
+import functools
 import pathlib
+import typing
+from collections.abc import Callable
 
 import sqlalchemy.engine.url as sa_url
-from pydantic import SecretStr
+import typing_extensions
+from pydantic import model_validator, SecretStr
 from pydantic_settings import BaseSettings
 
 
@@ -13,10 +17,156 @@ class AppSettings(BaseSettings):
 
     BOOKS_DIR: str = "books"
 
-    def get_books_dir_path(self) -> str:
-        """Get the path to the books' directory."""
+    LOG_LEVEL: str = "DEBUG"
+    # Write log lines from a background thread instead of the event loop
+    LOG_ENQUEUE: bool = True
+    # Share of records below WARNING that are logged, from 0.0 to 1.0
+    LOG_SAMPLE_RATE: float = 1.0
+
+    # Queries and requests slower than these are logged, 0 disables the logs
+    SLOW_QUERY_THRESHOLD_MS: float = 0
+    SLOW_REQUEST_THRESHOLD_MS: float = 0
+    # Bearer token for the admin endpoints, which are disabled when it is unset
+    ADMIN_TOKEN: SecretStr | None = None
+    PROFILER_MAX_SECONDS: int = 60
+    PROFILER_SAMPLING_INTERVAL_MS: float = 5
+
+    JSON_BACKEND: typing.Literal["orjson", "json"] = "orjson"
+    # Number of pre-encoded book JSON fragments kept per worker, 0 disables
+    JSON_FRAGMENT_CACHE_SIZE: int = 10_000
+
+    # Share one database query between concurrent identical book lookups
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # JSON responses smaller than this are sent uncompressed
+    COMPRESSION_MIN_SIZE: int = 1024
+    # Store gzip/brotli variants of compressible book files next to them
+    PRECOMPRESS_BOOK_FILES: bool = True
+    # Build the page index for online reading at ingestion instead of on the
+    # first read of a book
+    INDEX_BOOK_PAGES: bool = True
+    # Extract the title, author, language, page count and cover embedded in
+    # EPUB, FB2 and PDF files at ingestion, in a pool of processes per worker;
+    # with 0 processes the extraction runs in a thread
+    EXTRACT_BOOK_METADATA: bool = True
+    METADATA_WORKERS: int = 2
+
+    # How GET /v1/books/{id}/download sends the file: streamed by the worker
+    # ("direct"), by the reverse proxy after an internal redirect
+    # ("x-accel-redirect" for nginx, "x-sendfile" for Apache/lighttpd), or
+    # by a static file tier the client is redirected to ("signed-url")
+    FILE_SERVING_MODE: typing.Literal[
+        "direct", "x-accel-redirect", "x-sendfile", "signed-url"
+    ] = "direct"
+    # nginx `internal` location mapped to the books directory
+    FILE_SERVING_INTERNAL_PREFIX: str = "/protected-books/"
+    # Static file tier serving the books directory, and the HMAC key and
+    # lifetime of the signed URLs it accepts
+    FILE_SERVING_SIGNED_URL_BASE: str | None = None
+    FILE_SERVING_SIGNING_KEY: SecretStr | None = None
+    FILE_SERVING_URL_TTL_S: int = 300
+
+    # Totals of GET /v1/books?total=...: planner estimates below the
+    # threshold are replaced by exact counts, and totals are cached per
+    # filter combination for the time to live, 0 disables the cache
+    BOOK_COUNT_EXACT_THRESHOLD: int = 1000
+    BOOK_COUNT_CACHE_TTL_S: float = 10
+    BOOK_COUNT_CACHE_SIZE: int = 1024
+
+    # Autocomplete of GET /v1/books/suggest from an index of the book names
+    # and authors in each worker's memory, built at startup and caught up
+    # with the books created by the other workers every interval
+    BOOK_SUGGESTIONS_ENABLED: bool = True
+    BOOK_SUGGESTIONS_REFRESH_INTERVAL_S: float = 10
+
+    # Catalog snapshot: one worker per host writes the hot book JSON fragments
+    # and the suggestions index to the file every interval, and new workers
+    # load it at startup, then catch up with the changes since
+    CATALOG_SNAPSHOT_ENABLED: bool = True
+    CATALOG_SNAPSHOT_PATH: str = "catalog.snapshot"
+    CATALOG_SNAPSHOT_INTERVAL_S: float = 300
+
+    # Download and view counts of the books are buffered in each worker and
+    # added to the database every interval, which bounds what a crash loses
+    BOOK_STATS_ENABLED: bool = True
+    BOOK_STATS_FLUSH_INTERVAL_S: float = 5
+
+    # Storage scrub: deletes the files in the books directory no book refers
+    # to and flags the books whose file is missing, truncated or (when
+    # checksums are verified) corrupt. Runs every interval in one worker at a
+    # time, or only from `scrub_storage.py` with an interval of 0
+    STORAGE_SCRUB_INTERVAL_S: float = 0
+    STORAGE_SCRUB_BATCH_SIZE: int = 500
+    # Younger files may belong to a book that is still being created
+    STORAGE_SCRUB_MIN_AGE_S: float = 3600
+    STORAGE_SCRUB_DELETE_ORPHANS: bool = True
+    # Orphans are only reported once a batch has more than this share of them
+    STORAGE_SCRUB_MAX_ORPHAN_RATIO: float = 0.5
+    STORAGE_SCRUB_VERIFY_CHECKSUMS: bool = False
+    # Pacing of the scrub's disk access, 0 is unlimited
+    STORAGE_SCRUB_FILES_PER_S: float = 200
+    STORAGE_SCRUB_READ_BYTES_PER_S: int = 16 * 1024 * 1024
+
+    # Book file downloads: the whole download, retries included, must finish
+    # within the timeout; an attempt fails when no data arrives for the read timeout
+    DOWNLOAD_TIMEOUT_S: float = 120
+    DOWNLOAD_READ_TIMEOUT_S: float = 30
+    DOWNLOAD_MAX_ATTEMPTS: int = 5
+    # Backoff before attempt N is random up to min(BASE * 2^(N-1), MAX)
+    DOWNLOAD_BACKOFF_BASE_MS: float = 500
+    DOWNLOAD_BACKOFF_MAX_MS: float = 10_000
+    # Downloads per origin (scheme, host and port) and in total; waiting
+    # downloads are started round-robin across origins
+    DOWNLOAD_MAX_CONCURRENT_TRANSFERS: int = 32
+    DOWNLOAD_MAX_CONCURRENT_PER_ORIGIN: int = 4
+    # Token bucket byte rates per origin and in total, 0 is unlimited
+    DOWNLOAD_ORIGIN_RATE_BYTES_PER_S: int = 8 * 1024 * 1024
+    DOWNLOAD_ORIGIN_BURST_BYTES: int = 1024 * 1024
+    DOWNLOAD_TOTAL_RATE_BYTES_PER_S: int = 0
+    DOWNLOAD_TOTAL_BURST_BYTES: int = 4 * 1024 * 1024
+
+    # Admission control: maximum concurrent requests per "METHOD /route",
+    # adapted down when latency rises; other routes are not limited
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_ROUTE_LIMITS: dict[str, int] = {
+        "POST /v1/books": 16,
+        "GET /v1/books": 8,
+        "POST /v1/books/batch": 8,
+        "POST /v1/books/deny": 2,
+    }
+    ADMISSION_MIN_LIMIT: int = 1
+    # Requests waiting for a slot per route, beyond which they are rejected
+    ADMISSION_QUEUE_SIZE: int = 64
+    ADMISSION_QUEUE_TIMEOUT_MS: float = 2000
+    # The limit decreases when latency exceeds the route's lowest latency by this
+    ADMISSION_LATENCY_TOLERANCE: float = 3.0
+    # Routes whose latency is mostly other servers', such as book creation
+    # downloading the file from its origin: their limit only decreases on failures
+    ADMISSION_LATENCY_EXEMPT_ROUTES: set[str] = {"POST /v1/books"}
+
+    @model_validator(mode="after")
+    def validate_file_serving(self) -> typing_extensions.Self:
+        """Validate that signed URLs can be built in the signed-url mode."""
+        if self.FILE_SERVING_MODE == "signed-url" and not (
+            self.FILE_SERVING_SIGNED_URL_BASE and self.FILE_SERVING_SIGNING_KEY
+        ):
+            raise ValueError(
+                "FILE_SERVING_SIGNED_URL_BASE and FILE_SERVING_SIGNING_KEY are "
+                "required with the signed-url FILE_SERVING_MODE"
+            )
+        return self
+
+    def get_catalog_snapshot_path(self) -> pathlib.Path:
+        """Get the path to the catalog snapshot, relative to the project's root."""
         return (
-            f"{pathlib.Path(__file__).resolve().parent.parent.parent}/{self.BOOKS_DIR}"
+            pathlib.Path(__file__).resolve().parent.parent.parent
+            / self.CATALOG_SNAPSHOT_PATH
+        )
+
+    def get_books_dir_path(self) -> str:
+        """Get the path to the books' directory, relative to the project's root."""
+        return str(
+            pathlib.Path(__file__).resolve().parent.parent.parent / self.BOOKS_DIR
         )
 
 
@@ -44,5 +194,28 @@ class PostgreSQLConnectionSettings(BaseSettings):
         )
 
 
-app_settings = AppSettings()
-postgresql_connection_settings = PostgreSQLConnectionSettings()
+@functools.cache
+def get_app_settings() -> AppSettings:
+    """Get the application settings, building them on first use."""
+    return AppSettings()
+
+
+@functools.cache
+def get_postgresql_connection_settings() -> PostgreSQLConnectionSettings:
+    """Get the PostgreSQL connection settings, building them on first use."""
+    return PostgreSQLConnectionSettings()
+
+
+_LAZY_SETTINGS: dict[str, Callable[[], BaseSettings]] = {
+    "app_settings": get_app_settings,
+    "postgresql_connection_settings": get_postgresql_connection_settings,
+}
+
+
+def __getattr__(name: str) -> BaseSettings:
+    """Resolve settings objects lazily instead of at import time."""
+    try:
+        settings_factory = _LAZY_SETTINGS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    return settings_factory()
@@ -1,26 +1,122 @@
+import functools
+import time
+import typing
+
+import sqlalchemy as sa
 import sqlalchemy.ext.asyncio as sa_asyncio_ext
 import sqlalchemy.orm as sa_orm
 
-from literaflow.core.config import postgresql_connection_settings
+from literaflow.core import config, metrics, profiling
+
+CursorExecuteArgs = typing.Any
+
+_MEASURED_STATEMENT_TYPES = frozenset({
+    "SELECT",
+    "INSERT",
+    "UPDATE",
+    "DELETE",
+    "WITH",
+    "CREATE",
+    "ALTER",
+    "BEGIN",
+    "COMMIT",
+    "ROLLBACK",
+})
+
+
+def _get_statement_type(statement: str) -> str:
+    words = statement.split(maxsplit=1)
+    statement_type = words[0].upper() if words else ""
+    return statement_type if statement_type in _MEASURED_STATEMENT_TYPES else "OTHER"
+
+
+def _before_cursor_execute(
+    _conn: sa.Connection,
+    _cursor: CursorExecuteArgs,
+    _statement: str,
+    _parameters: CursorExecuteArgs,
+    context: sa.engine.ExecutionContext,
+    _executemany: bool,  # noqa: FBT001
+) -> None:
+    context.literaflow_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(
+    _conn: sa.Connection,
+    _cursor: CursorExecuteArgs,
+    statement: str,
+    parameters: CursorExecuteArgs,
+    context: sa.engine.ExecutionContext,
+    executemany: bool,  # noqa: FBT001
+) -> None:
+    duration = time.perf_counter() - context.literaflow_start_time
+    metrics.db_statement_duration_seconds.observe(
+        duration, statement=_get_statement_type(statement)
+    )
+    profiling.record_phase(profiling.PHASE_DB, duration)
+    profiling.log_slow_query(statement, parameters, duration, executemany=executemany)
+
+
+@functools.cache
+def get_async_engine() -> sa_asyncio_ext.AsyncEngine:
+    """Get the database engine, creating it on first use."""
+    settings = config.postgresql_connection_settings
+    engine = sa_asyncio_ext.create_async_engine(
+        settings.async_url, echo=settings.IS_ECHO
+    )
+    sa.event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    sa.event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
 
-async_engine: sa_asyncio_ext.AsyncEngine = sa_asyncio_ext.create_async_engine(
-    postgresql_connection_settings.async_url,
-    echo=postgresql_connection_settings.IS_ECHO,
-)
-async_session_maker: sa_asyncio_ext.async_sessionmaker = (
-    sa_asyncio_ext.async_sessionmaker(
-        async_engine,
+
+@functools.cache
+def get_async_session_maker() -> sa_asyncio_ext.async_sessionmaker:
+    """Get the session factory, creating the engine on first use."""
+    return sa_asyncio_ext.async_sessionmaker(
+        get_async_engine(),
         expire_on_commit=False,
         autoflush=False,
     )
-)
+
+
+def async_session_maker() -> sa_asyncio_ext.AsyncSession:
+    """Create a database session."""
+    return get_async_session_maker()()
 
 
 class Base(sa_orm.DeclarativeBase):
     pass
 
 
+def _add_missing_columns(connection: sa.Connection) -> None:
+    """Add the nullable columns that existing tables do not have yet."""
+    inspector = sa.inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {
+            column["name"] for column in inspector.get_columns(table.name)
+        }
+        for column in table.columns:
+            # Required columns cannot be added to filled tables, only created
+            if column.name in existing_columns or not column.nullable:
+                continue
+            column_spec = sa.schema.CreateColumn(column).compile(connection)
+            connection.execute(
+                sa.text(
+                    f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {column_spec}"
+                )
+            )
+
+
+def _add_missing_indexes(connection: sa.Connection) -> None:
+    """Create the indexes that existing tables do not have yet."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
 async def create_tables() -> None:
-    """Create database tables."""
-    async with async_engine.begin() as conn:
+    """Create database tables and add the columns and indexes they miss."""
+    async with get_async_engine().begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_add_missing_indexes)
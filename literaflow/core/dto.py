@@ -1,13 +1,29 @@
 import datetime
 import typing
+from collections.abc import Mapping
 from typing import TypedDict
 
 import pydantic
 import typing_extensions
 
+from literaflow.core import profiling
+
 DTOKwargs = typing.Any
+DTO = typing.TypeVar("DTO", bound=pydantic.BaseModel)
 BookID = int
 
+# Error type of a document that is not JSON at all
+JSON_INVALID_ERROR = "json_invalid"
+
+MAX_BOOK_IDS_BATCH_SIZE = 500
+DEFAULT_FACET_VALUES = 100
+MAX_FACET_VALUES = 1000
+DEFAULT_POPULAR_BOOKS = 10
+MAX_POPULAR_BOOKS = 100
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+MAX_SUGGESTION_PREFIX_LENGTH = 200
+
 
 @typing.final
 class PydanticErrorDict(TypedDict):
@@ -18,22 +34,56 @@ class PydanticErrorDict(TypedDict):
     type: str
 
 
+def _get_error_dicts(exc: pydantic.ValidationError) -> list[PydanticErrorDict]:
+    return [
+        PydanticErrorDict(
+            loc=error["loc"],
+            msg=error["msg"],
+            type=error["type"],
+        )
+        for error in exc.errors()
+    ]
+
+
 def create_dto_safely(
     dto: type[pydantic.BaseModel],
     **dto_kwargs: DTOKwargs,
 ) -> tuple[pydantic.BaseModel | None, list[PydanticErrorDict] | None]:
     """Create a Pydantic DTO safely."""
     try:
-        return dto(**dto_kwargs), None
+        with profiling.phase(profiling.PHASE_VALIDATION):
+            return dto(**dto_kwargs), None
     except pydantic.ValidationError as exc:
-        return None, [
-            PydanticErrorDict(
-                loc=error["loc"],
-                msg=error["msg"],
-                type=error["type"],
-            )
-            for error in exc.errors()
-        ]
+        return None, _get_error_dicts(exc)
+
+
+def validate_dto(
+    dto: type[DTO], data: Mapping[str, typing.Any]
+) -> tuple[DTO | None, list[PydanticErrorDict] | None]:
+    """Validate a mapping, such as a request's query, without copying it."""
+    try:
+        with profiling.phase(profiling.PHASE_VALIDATION):
+            return dto.model_validate(data), None
+    except pydantic.ValidationError as exc:
+        return None, _get_error_dicts(exc)
+
+
+def validate_dto_json(
+    dto: type[DTO], data: bytes
+) -> tuple[DTO | None, list[PydanticErrorDict] | None]:
+    """
+    Validate a raw JSON document, parsed by the DTO's compiled validator.
+
+    Raise ValueError if the data is not valid JSON.
+    """
+    try:
+        with profiling.phase(profiling.PHASE_VALIDATION):
+            return dto.model_validate_json(data), None
+    except pydantic.ValidationError as exc:
+        errors = _get_error_dicts(exc)
+        if errors[0]["type"] == JSON_INVALID_ERROR:
+            raise ValueError(errors[0]["msg"]) from exc
+        return None, errors
 
 
 @typing.final
@@ -55,6 +105,27 @@ class Book(pydantic.BaseModel):
         return self
 
 
+# Fields of a book that can be selected with `fields=`
+BookField = typing.Literal[
+    "id",
+    "name",
+    "author",
+    "date_published",
+    "genre",
+    "is_denied",
+    "file_path",
+    "file_format",
+    "file_size",
+    "file_sha256",
+    "file_status",
+    "page_count",
+    "language",
+    "file_title",
+    "file_author",
+    "cover_path",
+]
+
+
 @typing.final
 class BookFilters(pydantic.BaseModel):
     name: str | None = None
@@ -70,3 +141,59 @@ class BookFilters(pydantic.BaseModel):
             self.date_published is None,
             self.genre is None,
         ))
+
+
+@typing.final
+class BookIDs(pydantic.BaseModel):
+    ids: typing.Annotated[
+        list[pydantic.PositiveInt],
+        pydantic.Field(min_length=1, max_length=MAX_BOOK_IDS_BATCH_SIZE),
+    ]
+
+
+@typing.final
+class BookPageQuery(pydantic.BaseModel):
+    page: pydantic.PositiveInt = 1
+
+
+@typing.final
+class BookFacetsQuery(pydantic.BaseModel):
+    limit: typing.Annotated[
+        pydantic.PositiveInt, pydantic.Field(le=MAX_FACET_VALUES)
+    ] = DEFAULT_FACET_VALUES
+
+
+@typing.final
+class PopularBooksQuery(pydantic.BaseModel):
+    by: typing.Literal["downloads", "views"] = "downloads"
+    limit: typing.Annotated[
+        pydantic.PositiveInt, pydantic.Field(le=MAX_POPULAR_BOOKS)
+    ] = DEFAULT_POPULAR_BOOKS
+
+
+@typing.final
+class BookFieldsQuery(pydantic.BaseModel):
+    fields: tuple[BookField, ...] | None = None
+
+    @pydantic.field_validator("fields", mode="before")
+    @classmethod
+    def split_fields(cls, value: typing.Any) -> typing.Any:  # noqa: ANN401
+        """Split the comma-separated field names, dropping repeated ones."""
+        if isinstance(value, str):
+            return tuple(dict.fromkeys(name.strip() for name in value.split(",")))
+        return value
+
+
+@typing.final
+class BookTotalQuery(pydantic.BaseModel):
+    total: typing.Literal["estimated", "exact"] | None = None
+
+
+@typing.final
+class BookSuggestQuery(pydantic.BaseModel):
+    prefix: typing.Annotated[
+        str, pydantic.Field(min_length=1, max_length=MAX_SUGGESTION_PREFIX_LENGTH)
+    ]
+    limit: typing.Annotated[
+        pydantic.PositiveInt, pydantic.Field(le=MAX_SUGGESTIONS)
+    ] = DEFAULT_SUGGESTIONS
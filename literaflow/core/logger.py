@@ -1,18 +1,53 @@
+import contextvars
+import functools
+import random
 import sys
+import typing
 
 from loguru import logger
 
-logger.remove(0)
+from literaflow.core.config import get_app_settings
 
-config = {
-    "handlers": [
-        {
-            "sink": sys.stdout,
-            "format": "{time} - {message}",
-            "serialize": True,
-            "level": "DEBUG",
-        },
-    ],
-}
+LogRecord = typing.Any
 
-logger.configure(**config)
+# Records at or above this level are never sampled out
+SAMPLING_EXEMPT_LEVEL_NO = logger.level("WARNING").no
+
+# Correlation ID of the request being handled, attached to every log record
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "request_id", default="-"
+)
+
+
+def add_request_id(record: LogRecord) -> None:
+    """Attach the current request's correlation ID to a log record."""
+    record["extra"].setdefault("request_id", request_id_var.get())
+
+
+def sample_record(record: LogRecord) -> bool:
+    """Keep every warning and error, and a sampled share of other records."""
+    if record["level"].no >= SAMPLING_EXEMPT_LEVEL_NO:
+        return True
+    sample_rate = get_app_settings().LOG_SAMPLE_RATE
+    return sample_rate >= 1 or random.random() < sample_rate  # noqa: S311
+
+
+# Records get the correlation ID even before the handlers are set up
+logger.configure(patcher=add_request_id)
+
+
+@functools.cache
+def setup_logger() -> None:
+    """Replace the default handler with the configured JSON handler, once."""
+    settings = get_app_settings()
+    logger.remove(0)
+    logger.add(
+        sys.stdout,
+        format="{time} - {message}",
+        serialize=True,
+        level=settings.LOG_LEVEL,
+        # Writes happen in a background thread, so a slow stdout reader
+        # does not block the event loop.
+        enqueue=settings.LOG_ENQUEUE,
+        filter=sample_record,
+    )
@@ -0,0 +1,335 @@
+"""
+Prometheus-style metrics.
+
+Metrics are kept in memory per worker process and rendered in the text
+exposition format at `/metrics`.
+"""
+
+import abc
+import bisect
+import contextlib
+import math
+import time
+import typing
+from collections.abc import Callable, Iterator, Sequence
+
+LabelValues = tuple[str, ...]
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+DB_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+DOWNLOAD_LATENCY_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape_label_value(value)}"'
+        for name, value in zip(names, values, strict=True)
+    )
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(abc.ABC):
+    """Base class of the metrics."""
+
+    type_name: typing.ClassVar[str]
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: "Registry | None" = None,
+    ) -> None:
+        """Initialize the metric and register it."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.labelnames}, "
+                f"got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def collect(self) -> Iterator[str]:
+        """Yield the exposition lines of the metric's samples."""
+
+    def render(self) -> str:
+        """Render the metric in the text exposition format."""
+        header = (
+            f"# HELP {self.name} {self.documentation}\n"
+            f"# TYPE {self.name} {self.type_name}\n"
+        )
+        return header + "".join(f"{line}\n" for line in self.collect())
+
+
+class _ValueMetric(Metric):
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: "Registry | None" = None,
+        function: Callable[[], float] | None = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames, registry)
+        if function is not None and self.labelnames:
+            raise ValueError("Metrics with a function cannot have labels")
+        self._function = function
+        self._values: dict[LabelValues, float] = {}
+
+    def value(self, **labels: str) -> float:
+        """Get the current value of the metric."""
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def collect(self) -> Iterator[str]:
+        """Yield the exposition lines of the metric's samples."""
+        if self._function is not None:
+            yield f"{self.name} {_format_value(self._function())}"
+            return
+        for label_values, value in self._values.items():
+            labels = _format_labels(self.labelnames, label_values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Counter(_ValueMetric):
+    """A monotonically increasing value."""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase the counter."""
+        if amount < 0:
+            raise ValueError("Counters can only be increased")
+        label_values = self._label_values(labels)
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+
+class Gauge(_ValueMetric):
+    """A value that can go up and down."""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the gauge to a value."""
+        self._values[self._label_values(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase the gauge."""
+        label_values = self._label_values(labels)
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        """Decrease the gauge."""
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Observations counted in cumulative buckets."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: "Registry | None" = None,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        """Initialize the histogram with its upper bucket bounds."""
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: a count per bucket (the last one is +Inf), sum
+        self._bucket_counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record an observation."""
+        label_values = self._label_values(labels)
+        bucket_counts = self._bucket_counts.get(label_values)
+        if bucket_counts is None:
+            bucket_counts = self._bucket_counts[label_values] = [0] * (
+                len(self.buckets) + 1
+            )
+            self._sums[label_values] = 0.0
+        bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[label_values] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        """Get the number of observations."""
+        return sum(self._bucket_counts.get(self._label_values(labels), ()))
+
+    def collect(self) -> Iterator[str]:
+        """Yield the exposition lines of the metric's samples."""
+        bucket_labelnames = (*self.labelnames, "le")
+        for label_values, bucket_counts in self._bucket_counts.items():
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(
+                (*self.buckets, math.inf), bucket_counts, strict=True
+            ):
+                cumulative_count += bucket_count
+                labels = _format_labels(
+                    bucket_labelnames, (*label_values, _format_value(upper_bound))
+                )
+                yield f"{self.name}_bucket{labels} {cumulative_count}"
+            labels = _format_labels(self.labelnames, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(self._sums[label_values])}"
+            yield f"{self.name}_count{labels} {cumulative_count}"
+
+
+class Registry:
+    """A collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        """Add a metric to the registry."""
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Render all metrics in the text exposition format."""
+        return "".join(metric.render() for metric in self._metrics.values())
+
+
+REGISTRY = Registry()
+
+http_requests_total = Counter(
+    "literaflow_http_requests_total",
+    "Number of handled HTTP requests.",
+    ("method", "route", "status"),
+)
+http_request_duration_seconds = Histogram(
+    "literaflow_http_request_duration_seconds",
+    "HTTP request latency in seconds.",
+    ("method", "route"),
+)
+http_requests_in_progress = Gauge(
+    "literaflow_http_requests_in_progress",
+    "Number of HTTP requests being handled.",
+    ("method", "route"),
+)
+http_requests_rejected_total = Counter(
+    "literaflow_http_requests_rejected_total",
+    "Number of requests rejected by admission control, by reason.",
+    ("method", "route", "reason"),
+)
+admission_concurrency_limit = Gauge(
+    "literaflow_admission_concurrency_limit",
+    "Current adaptive concurrency limit of a route.",
+    ("method", "route"),
+)
+admission_queue_size = Gauge(
+    "literaflow_admission_queue_size",
+    "Number of requests waiting for admission to a route.",
+    ("method", "route"),
+)
+db_statement_duration_seconds = Histogram(
+    "literaflow_db_statement_duration_seconds",
+    "SQL statement execution time in seconds, by statement type.",
+    ("statement",),
+    buckets=DB_LATENCY_BUCKETS,
+)
+book_download_bytes_total = Counter(
+    "literaflow_book_download_bytes_total",
+    "Bytes of book files downloaded from remote origins.",
+)
+book_download_retries_total = Counter(
+    "literaflow_book_download_retries_total",
+    "Retried book file download attempts.",
+)
+book_download_duration_seconds = Histogram(
+    "literaflow_book_download_duration_seconds",
+    "Duration of book file downloads in seconds, by outcome.",
+    ("outcome",),
+    buckets=DOWNLOAD_LATENCY_BUCKETS,
+)
+book_download_queue_duration_seconds = Histogram(
+    "literaflow_book_download_queue_duration_seconds",
+    "Time book file downloads waited for a transfer slot in seconds.",
+    buckets=DOWNLOAD_LATENCY_BUCKETS,
+)
+book_metadata_extraction_duration_seconds = Histogram(
+    "literaflow_book_metadata_extraction_duration_seconds",
+    "Time to extract the metadata of a book file in seconds, by outcome.",
+    ("outcome",),
+)
+denied_list_parse_duration_seconds = Histogram(
+    "literaflow_denied_list_parse_duration_seconds",
+    "Time to parse an uploaded denied list in seconds.",
+)
+denied_list_apply_duration_seconds = Histogram(
+    "literaflow_denied_list_apply_duration_seconds",
+    "Time to apply a denied list to the books in seconds.",
+)
+book_stats_flushes_total = Counter(
+    "literaflow_book_stats_flushes_total",
+    "Flushes of the buffered book download and view counts, by outcome.",
+    ("outcome",),
+)
+storage_scrub_deleted_files_total = Counter(
+    "literaflow_storage_scrub_deleted_files_total",
+    "Orphan files deleted from the books directory by the storage scrub.",
+)
+storage_scrub_deleted_bytes_total = Counter(
+    "literaflow_storage_scrub_deleted_bytes_total",
+    "Bytes of orphan files deleted from the books directory by the storage scrub.",
+)
+storage_scrub_flagged_books_total = Counter(
+    "literaflow_storage_scrub_flagged_books_total",
+    "Books flagged by the storage scrub, by file status.",
+    ("status",),
+)
+book_counts_total = Counter(
+    "literaflow_book_counts_total",
+    "Totals of filtered books, by method: estimated, exact or cached.",
+    ("method",),
+)
+catalog_snapshot_writes_total = Counter(
+    "literaflow_catalog_snapshot_writes_total",
+    "Writes of the catalog snapshot, by outcome.",
+    ("outcome",),
+)
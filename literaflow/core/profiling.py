@@ -0,0 +1,187 @@
+"""
+Profiling hooks: slow-query and slow-request logs, on-demand stack sampling.
+
+Everything here is opt-in through settings and costs a context variable
+lookup or a threshold comparison when disabled.
+"""
+
+import collections
+import contextlib
+import contextvars
+import sys
+import threading
+import time
+import typing
+from collections.abc import Iterator, Mapping
+
+from literaflow.core import logger
+from literaflow.core.config import get_app_settings
+
+SQLParameters = typing.Any
+
+PHASE_VALIDATION = "validation"
+PHASE_DB = "db"
+PHASE_SERIALIZATION = "serialization"
+PHASE_FILE_IO = "file_io"
+
+# Slow-query log entries keep at most this much of the SQL text
+_MAX_LOGGED_SQL_LENGTH = 2000
+
+# Per-phase durations of the request being profiled, None when not profiling
+_request_phases: contextvars.ContextVar[dict[str, float] | None] = (
+    contextvars.ContextVar("request_phases", default=None)
+)
+_active_phase: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "active_phase", default=None
+)
+# Blocks outside of a profiled request or nested in their own phase
+_UNMEASURED_PHASE = contextlib.nullcontext()
+
+
+def start_request_profile() -> contextvars.Token:
+    """Start collecting the phase durations of the current request."""
+    return _request_phases.set({})
+
+
+def finish_request_profile(token: contextvars.Token) -> dict[str, float]:
+    """Stop collecting phase durations and return them, in seconds."""
+    phases = _request_phases.get() or {}
+    _request_phases.reset(token)
+    return phases
+
+
+def record_phase(name: str, duration: float) -> None:
+    """Add a duration to a phase of the request being profiled."""
+    phases = _request_phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + duration
+
+
+def phase(name: str) -> contextlib.AbstractContextManager[None]:
+    """Measure a block as a phase of the request being profiled."""
+    # Nested blocks of the same phase are measured once, by the outermost one.
+    # Other blocks get a shared no-op context manager rather than a generator
+    # one: they wrap hot paths, such as validation, of a few microseconds.
+    if _request_phases.get() is None or _active_phase.get() == name:
+        return _UNMEASURED_PHASE
+    return _measure_phase(name)
+
+
+@contextlib.contextmanager
+def _measure_phase(name: str) -> Iterator[None]:
+    token = _active_phase.set(name)
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - start_time)
+        _active_phase.reset(token)
+
+
+def describe_parameters(parameters: SQLParameters) -> SQLParameters:
+    """Describe the shape of SQL parameters without exposing their values."""
+    if isinstance(parameters, Mapping):
+        return {key: describe_parameters(value) for key, value in parameters.items()}
+    if isinstance(parameters, list | tuple):
+        if len(parameters) > 10:  # noqa: PLR2004
+            return f"{type(parameters).__name__}[{len(parameters)}]"
+        return [describe_parameters(value) for value in parameters]
+    return type(parameters).__name__
+
+
+def log_slow_query(
+    statement: str,
+    parameters: SQLParameters,
+    duration: float,
+    *,
+    executemany: bool,
+) -> None:
+    """Log a statement that took longer than the slow-query threshold."""
+    threshold_ms = get_app_settings().SLOW_QUERY_THRESHOLD_MS
+    if threshold_ms <= 0 or duration * 1000 < threshold_ms:
+        return
+
+    if executemany and parameters:
+        parameters_shape = f"{len(parameters)} x {describe_parameters(parameters[0])}"
+    else:
+        parameters_shape = describe_parameters(parameters)
+    logger.bind(
+        duration_ms=round(duration * 1000, 3),
+        sql=statement[:_MAX_LOGGED_SQL_LENGTH],
+        parameters_shape=parameters_shape,
+    ).warning(f"Slow query took {duration * 1000:.1f} ms")
+
+
+def log_slow_request(
+    method: str,
+    route: str,
+    status: int,
+    duration: float,
+    phases: dict[str, float],
+) -> None:
+    """Log a request that took longer than the slow-request threshold."""
+    phases_ms = {name: round(value * 1000, 3) for name, value in phases.items()}
+    phases_ms["other"] = round(max(duration - sum(phases.values()), 0.0) * 1000, 3)
+    logger.bind(
+        method=method,
+        route=route,
+        status=status,
+        duration_ms=round(duration * 1000, 3),
+        phases_ms=phases_ms,
+    ).warning(f"Slow request {method} {route} took {duration * 1000:.1f} ms")
+
+
+def _format_frame(frame: typing.Any) -> str:  # noqa: ANN401
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+
+
+def sample_stacks(
+    thread_id: int,
+    duration: float,
+    interval: float,
+) -> str:
+    """
+    Sample the stack of a thread and return it in the folded format.
+
+    Each output line is a `;`-separated stack, root first, followed by the
+    number of samples, as consumed by flamegraph.pl, speedscope and similar.
+    """
+    stacks: collections.Counter[str] = collections.Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)  # noqa: SLF001
+        if frame is None:
+            break
+        stack = []
+        while frame is not None:
+            stack.append(_format_frame(frame))
+            frame = frame.f_back
+        stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class SamplingProfiler:
+    """Sample a thread's stacks on demand, one profile at a time."""
+
+    def __init__(self) -> None:
+        """Initialize the profiler."""
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        """Check if a profile is being captured."""
+        return self._lock.locked()
+
+    def profile(self, thread_id: int, duration: float, interval: float) -> str:
+        """Capture a profile of a thread, failing if one is already running."""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already being captured")
+        try:
+            return sample_stacks(thread_id, duration, interval)
+        finally:
+            self._lock.release()
+
+
+sampling_profiler = SamplingProfiler()
@@ -1,4 +1,6 @@
 import datetime
+import typing
+from collections.abc import Mapping
 
 import sqlalchemy as sa
 import sqlalchemy.orm as sa_orm
@@ -11,7 +13,21 @@ metadata_obj = sa.MetaData()
 
 class Book(Base):
     __tablename__ = "books"
-    __table_args__ = (sa.UniqueConstraint("name", "author", "date_published"),)
+    __table_args__ = (
+        sa.UniqueConstraint("name", "author", "date_published"),
+        # Cover the narrow listings (`fields=id,name`), unfiltered or filtered
+        # by one column, so they can be answered by index-only scans
+        sa.Index("ix_books_name_id", "name", postgresql_include=["id"]),
+        sa.Index(
+            "ix_books_author_id_name", "author", postgresql_include=["id", "name"]
+        ),
+        sa.Index("ix_books_genre_id_name", "genre", postgresql_include=["id", "name"]),
+        sa.Index(
+            "ix_books_date_published_id_name",
+            "date_published",
+            postgresql_include=["id", "name"],
+        ),
+    )
 
     id: sa_orm.Mapped[m_annotations.int_pk]
     created_at: sa_orm.Mapped[m_annotations.created_at]
@@ -25,6 +41,22 @@ class Book(Base):
     is_denied: sa_orm.Mapped[bool] = sa_orm.mapped_column(server_default="false")
     file_path: sa_orm.Mapped[str | None] = sa_orm.mapped_column(nullable=True)
 
+    # Sniffed from the file when it is downloaded
+    file_format: sa_orm.Mapped[str | None] = sa_orm.mapped_column(nullable=True)
+    file_size: sa_orm.Mapped[int | None] = sa_orm.mapped_column(
+        sa.BigInteger, nullable=True
+    )
+    # Hex SHA-256 of the file, checked by the storage scrub
+    file_sha256: sa_orm.Mapped[str | None] = sa_orm.mapped_column(nullable=True)
+    # Set by the storage scrub when the file is missing, truncated or corrupt
+    file_status: sa_orm.Mapped[str | None] = sa_orm.mapped_column(nullable=True)
+    # Extracted from the file in the background, after the book is created
+    page_count: sa_orm.Mapped[int | None] = sa_orm.mapped_column(nullable=True)
+    language: sa_orm.Mapped[str | None] = sa_orm.mapped_column(nullable=True)
+    file_title: sa_orm.Mapped[str | None] = sa_orm.mapped_column(nullable=True)
+    file_author: sa_orm.Mapped[str | None] = sa_orm.mapped_column(nullable=True)
+    cover_path: sa_orm.Mapped[str | None] = sa_orm.mapped_column(nullable=True)
+
     def to_dict(self) -> dict:
         """Return a dictionary representation of the book."""
         return {
@@ -35,4 +67,95 @@ class Book(Base):
             "genre": self.genre,
             "is_denied": self.is_denied,
             "file_path": self.file_path,
+            "file_format": self.file_format,
+            "file_size": self.file_size,
+            "file_sha256": self.file_sha256,
+            "file_status": self.file_status,
+            "page_count": self.page_count,
+            "language": self.language,
+            "file_title": self.file_title,
+            "file_author": self.file_author,
+            "cover_path": self.cover_path,
         }
+
+    @staticmethod
+    def columns_to_dict(row: Mapping[str, typing.Any]) -> dict:
+        """Return a dictionary representation of selected columns of a book."""
+        book = dict(row)
+        if "date_published" in book:
+            book["date_published"] = book["date_published"].isoformat()
+        return book
+
+
+# Name of a book's file, whatever directory the books were stored in; the
+# pattern is a literal so that queries match the index expression
+book_file_name = sa.func.regexp_replace(
+    Book.file_path, sa.literal_column("'^.*/'"), sa.literal_column("''")
+)
+# Looked up by the storage scrub for each file in the books directory
+sa.Index("ix_books_file_name", book_file_name)
+
+
+class BookFacetCount(Base):
+    """Number of books per combination of the facets, kept up to date on writes."""
+
+    __tablename__ = "book_facet_counts"
+    __table_args__ = (sa.Index("ix_book_facet_counts_author", "author"),)
+
+    genre: sa_orm.Mapped[str] = sa_orm.mapped_column(primary_key=True)
+    author: sa_orm.Mapped[str] = sa_orm.mapped_column(primary_key=True)
+    date_published: sa_orm.Mapped[datetime.date] = sa_orm.mapped_column(
+        primary_key=True
+    )
+    is_denied: sa_orm.Mapped[bool] = sa_orm.mapped_column(primary_key=True)
+
+    book_count: sa_orm.Mapped[int] = sa_orm.mapped_column(nullable=False)
+
+
+class BookFacetValueCount(Base):
+    """
+    Number of books per value of each facet, overall and within single filters.
+
+    Rows of the whole catalog have an empty filter name and value; the others
+    count the books of one genre, author or publication date.
+    """
+
+    __tablename__ = "book_facet_value_counts"
+
+    filter_name: sa_orm.Mapped[str] = sa_orm.mapped_column(primary_key=True)
+    filter_value: sa_orm.Mapped[str] = sa_orm.mapped_column(primary_key=True)
+    facet: sa_orm.Mapped[str] = sa_orm.mapped_column(primary_key=True)
+    value: sa_orm.Mapped[str] = sa_orm.mapped_column(primary_key=True)
+
+    book_count: sa_orm.Mapped[int] = sa_orm.mapped_column(nullable=False)
+
+
+# Reads the most common values of a facet without sorting all of them
+sa.Index(
+    "ix_book_facet_value_counts_top",
+    BookFacetValueCount.filter_name,
+    BookFacetValueCount.filter_value,
+    BookFacetValueCount.facet,
+    BookFacetValueCount.book_count.desc(),
+    BookFacetValueCount.value,
+)
+
+
+class BookStats(Base):
+    """Download and view counts of a book, flushed in batches by the workers."""
+
+    __tablename__ = "book_stats"
+    __table_args__ = (
+        sa.Index("ix_book_stats_download_count", "download_count"),
+        sa.Index("ix_book_stats_view_count", "view_count"),
+    )
+
+    book_id: sa_orm.Mapped[int] = sa_orm.mapped_column(primary_key=True)
+    updated_at: sa_orm.Mapped[m_annotations.updated_at]
+
+    download_count: sa_orm.Mapped[int] = sa_orm.mapped_column(
+        sa.BigInteger, nullable=False, server_default="0"
+    )
+    view_count: sa_orm.Mapped[int] = sa_orm.mapped_column(
+        sa.BigInteger, nullable=False, server_default="0"
+    )
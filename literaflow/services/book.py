@@ -1,17 +1,39 @@
+import asyncio
 import pathlib
 import uuid
-from collections.abc import Iterable
+from collections.abc import Iterable, Sequence
 
 import aiohttp
 import asyncpg
 import pydantic
 import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
 
 import literaflow.services.exceptions as s_exceptions
-from literaflow.core import config, dto, logger
+from literaflow.core import config, dto, logger, metrics, profiling
 from literaflow.core.db import async_session_maker
 from literaflow.models import book as book_models
+from literaflow.services.book_counts import BookCount, BookCountService
+from literaflow.services.book_facets import BookFacetService
+from literaflow.services.book_filters import filter_books
+from literaflow.services.book_stats import BookStatsService
+from literaflow.services.book_suggestions import BookSuggestionService
+from literaflow.utils import background, book_metadata, compression, page_index
 from literaflow.utils import files as files_utils
+from literaflow.utils.single_flight import SingleFlight
+
+# Concurrent identical lookups share one in-flight query
+book_lookups = SingleFlight()
+metrics.Counter(
+    "literaflow_book_lookups_executed_total",
+    "Book lookups that ran a database query.",
+    function=lambda: book_lookups.executed_calls,
+)
+metrics.Counter(
+    "literaflow_book_lookups_coalesced_total",
+    "Book lookups that joined an identical in-flight query.",
+    function=lambda: book_lookups.coalesced_calls,
+)
 
 
 class BookService:
@@ -23,23 +45,24 @@ class BookService:
         if not url:
             return None
 
-        destination_path_str = f"{config.app_settings.get_books_dir_path()}/{
-            uuid.uuid4()
-        }.{url.path.split(".")[-1]}"
-
-        destination_path = pathlib.Path(destination_path_str)
+        # The extension is a guess until the downloaded file is sniffed
+        suffix = pathlib.PurePosixPath(url.path or "").suffix.lower()
+        destination_path = pathlib.Path(
+            config.app_settings.get_books_dir_path(), f"{uuid.uuid4()}{suffix}"
+        )
         destination_path.parent.mkdir(parents=True, exist_ok=True)
-        return destination_path_str
+        return str(destination_path)
 
     @staticmethod
     async def _download_file(
         file_to_download_url: pydantic.HttpUrl, destination_path: str
     ) -> None:
         try:
-            await files_utils.download_file(
-                file_to_download_url=file_to_download_url,
-                destination_path=destination_path,
-            )
+            with profiling.phase(profiling.PHASE_FILE_IO):
+                await files_utils.download_file(
+                    file_to_download_url=file_to_download_url,
+                    destination_path=destination_path,
+                )
         except TimeoutError as exc:
             raise s_exceptions.BookDownloadTimeoutError from exc
         except aiohttp.ClientError as exc:
@@ -62,10 +85,35 @@ class BookService:
             )
             raise s_exceptions.BookDownloadError from exc
 
+    @staticmethod
+    async def _extract_book_metadata(book_id: dto.BookID, book_path: str) -> None:
+        """Store the metadata embedded in the book's file."""
+        try:
+            metadata = await book_metadata.extract_book_metadata(book_path)
+        except book_metadata.MetadataError as exc:
+            logger.warning(f"Failed to extract the metadata of book {book_id}: {exc}")
+            return
+
+        async with async_session_maker() as session:
+            # Bumping `updated_at` also invalidates the book's cached JSON
+            await session.execute(
+                sa.update(book_models.Book)
+                .where(book_models.Book.id == book_id)
+                .values(
+                    page_count=metadata.page_count,
+                    language=metadata.language,
+                    file_title=metadata.title,
+                    file_author=metadata.author,
+                    cover_path=metadata.cover_path,
+                )
+            )
+            await session.commit()
+
     @classmethod
     async def create_book(cls, book_dto: dto.Book) -> book_models.Book:
         """Create a book and download its file if a URL is provided."""
         destination_path = cls._generate_destination_path(url=book_dto.url)
+        file_format = file_size = file_sha256 = None
 
         if book_dto.url is not None:
             file_to_download_url = str(book_dto.url)
@@ -74,6 +122,14 @@ class BookService:
                 file_to_download_url=file_to_download_url,
                 destination_path=destination_path,
             )
+            with profiling.phase(profiling.PHASE_FILE_IO):
+                identified_file = await asyncio.to_thread(
+                    book_metadata.identify_book_file, destination_path
+                )
+                destination_path, file_format, file_size = identified_file
+                file_sha256 = await asyncio.to_thread(
+                    files_utils.get_file_checksum, destination_path
+                )
 
         async with async_session_maker() as session:
             book = book_models.Book(
@@ -83,52 +139,194 @@ class BookService:
                 genre=book_dto.genre,
                 is_denied=book_dto.is_denied,
                 file_path=destination_path,
+                file_format=file_format,
+                file_size=file_size,
+                file_sha256=file_sha256,
             )
             session.add(book)
             try:
+                # The book is inserted first, so a duplicate is not counted
+                await session.flush()
+                await BookFacetService.add_books(
+                    session,
+                    [(book.genre, book.author, book.date_published, book.is_denied)],
+                )
                 await session.commit()
             except (
                 asyncpg.exceptions.UniqueViolationError,
                 sa.exc.IntegrityError,
             ) as exc:
+                if destination_path is not None:
+                    # Nothing refers to the downloaded file
+                    await files_utils.remove_file(destination_path)
                 raise s_exceptions.BookAlreadyExistsError(
                     "The book already exists in the database."
                 ) from exc
 
             await session.refresh(book)
-            return book
+
+        BookSuggestionService.record_book(book.id, book.name, book.author)
+        if (
+            destination_path is not None
+            and config.app_settings.PRECOMPRESS_BOOK_FILES
+            and compression.is_compressible_book(destination_path)
+        ):
+            background.run_in_background(
+                compression.precompress_book_file(destination_path)
+            )
+        if (
+            destination_path is not None
+            and config.app_settings.INDEX_BOOK_PAGES
+            and page_index.is_paginated_book(destination_path)
+        ):
+            background.run_in_background(page_index.index_book_file(destination_path))
+        if (
+            destination_path is not None
+            and config.app_settings.EXTRACT_BOOK_METADATA
+            and file_format in book_metadata.EXTRACTABLE_FORMATS
+        ):
+            background.run_in_background(
+                cls._extract_book_metadata(book.id, destination_path)
+            )
+        return book
 
     @staticmethod
-    async def get_books(
+    async def _query_books(
         filters_dto: dto.BookFilters,
     ) -> Iterable[book_models.Book]:
-        """Retrieve books based on filters."""
         async with async_session_maker() as session:
-            query = sa.select(book_models.Book)
-
-            if not filters_dto.filters_exist():
-                result = await session.execute(query)
-                return result.scalars().all()
-
-            if filters_dto.name:
-                query = query.where(book_models.Book.name == filters_dto.name)
-            if filters_dto.author:
-                query = query.where(book_models.Book.author == filters_dto.author)
-            if filters_dto.date_published:
-                query = query.where(
-                    book_models.Book.date_published == filters_dto.date_published
-                )
-            if filters_dto.genre:
-                query = query.where(book_models.Book.genre == filters_dto.genre)
-
-            result = await session.execute(query)
+            result = await session.execute(
+                filter_books(sa.select(book_models.Book), filters_dto)
+            )
             return result.scalars().all()
 
     @staticmethod
-    async def get_book_by_id(book_id: dto.BookID) -> book_models.Book | None:
-        """Retrieve a book by its ID."""
+    async def _query_book_fields(
+        filters_dto: dto.BookFilters,
+        fields: Sequence[dto.BookField],
+    ) -> list[dict]:
+        # Selecting only the columns lets covering indexes answer the query
+        query = sa.select(*(getattr(book_models.Book, field) for field in fields))
+        async with async_session_maker() as session:
+            result = await session.execute(filter_books(query, filters_dto))
+            return [book_models.Book.columns_to_dict(row) for row in result.mappings()]
+
+    @staticmethod
+    async def _query_book_by_id(book_id: dto.BookID) -> book_models.Book | None:
         async with async_session_maker() as session:
             result = await session.execute(
                 sa.select(book_models.Book).where(book_models.Book.id == book_id)
             )
             return result.scalar_one_or_none()
+
+    @classmethod
+    async def get_books(
+        cls,
+        filters_dto: dto.BookFilters,
+    ) -> Iterable[book_models.Book]:
+        """Retrieve books based on filters."""
+        if not config.app_settings.SINGLE_FLIGHT_ENABLED:
+            return await cls._query_books(filters_dto)
+
+        key = ("books", tuple(filters_dto.model_dump().items()))
+        return await book_lookups.do(key, lambda: cls._query_books(filters_dto))
+
+    @classmethod
+    async def get_book_fields(
+        cls,
+        filters_dto: dto.BookFilters,
+        fields: Sequence[dto.BookField],
+    ) -> list[dict]:
+        """Retrieve only the given fields of the books based on filters."""
+        if not config.app_settings.SINGLE_FLIGHT_ENABLED:
+            return await cls._query_book_fields(filters_dto, fields)
+
+        key = ("book_fields", tuple(filters_dto.model_dump().items()), tuple(fields))
+        return await book_lookups.do(
+            key, lambda: cls._query_book_fields(filters_dto, fields)
+        )
+
+    @classmethod
+    async def count_books(
+        cls, filters_dto: dto.BookFilters, *, exact: bool
+    ) -> BookCount:
+        """Count the filtered books, estimating broad totals unless exact."""
+        if not config.app_settings.SINGLE_FLIGHT_ENABLED:
+            return await BookCountService.count_books(filters_dto, exact=exact)
+
+        key = ("count", tuple(filters_dto.model_dump().items()), exact)
+        return await book_lookups.do(
+            key, lambda: BookCountService.count_books(filters_dto, exact=exact)
+        )
+
+    @classmethod
+    async def get_book_facets(cls, filters_dto: dto.BookFilters, limit: int) -> dict:
+        """Count the filtered books per genre, author, year and denied status."""
+        if not config.app_settings.SINGLE_FLIGHT_ENABLED:
+            return await BookFacetService.query_facets(filters_dto, limit)
+
+        key = ("facets", tuple(filters_dto.model_dump().items()), limit)
+        return await book_lookups.do(
+            key, lambda: BookFacetService.query_facets(filters_dto, limit)
+        )
+
+    @classmethod
+    async def get_popular_books(
+        cls, filters_dto: dto.BookFilters, by: str, limit: int
+    ) -> Sequence[sa.Row[tuple[book_models.Book, book_models.BookStats]]]:
+        """Retrieve the filtered books with the most downloads or views."""
+        if not config.app_settings.SINGLE_FLIGHT_ENABLED:
+            return await BookStatsService.query_popular_books(filters_dto, by, limit)
+
+        key = ("popular", tuple(filters_dto.model_dump().items()), by, limit)
+        return await book_lookups.do(
+            key, lambda: BookStatsService.query_popular_books(filters_dto, by, limit)
+        )
+
+    @classmethod
+    async def get_book_by_id(cls, book_id: dto.BookID) -> book_models.Book | None:
+        """Retrieve a book by its ID."""
+        if not config.app_settings.SINGLE_FLIGHT_ENABLED:
+            return await cls._query_book_by_id(book_id)
+
+        key = ("book", book_id)
+        return await book_lookups.do(key, lambda: cls._query_book_by_id(book_id))
+
+    @staticmethod
+    async def get_books_by_ids(
+        book_ids: Iterable[dto.BookID],
+    ) -> dict[dto.BookID, book_models.Book]:
+        """Retrieve books by their IDs with a single query."""
+        unique_book_ids = list(dict.fromkeys(book_ids))
+        async with async_session_maker() as session:
+            result = await session.execute(
+                sa.select(book_models.Book).where(
+                    book_models.Book.id
+                    == sa.any_(
+                        sa.bindparam(
+                            "book_ids",
+                            unique_book_ids,
+                            type_=postgresql.ARRAY(sa.Integer),
+                        )
+                    )
+                )
+            )
+            return {book.id: book for book in result.scalars()}
+
+    @staticmethod
+    async def get_book_page(
+        book: book_models.Book, page_number: int
+    ) -> page_index.Page | None:
+        """Read a page of the book's file, or None if there is no such page."""
+        if not book.file_path or not page_index.is_paginated_book(book.file_path):
+            raise s_exceptions.BookNotReadableError(
+                "The book has no file that can be read page by page."
+            )
+        try:
+            with profiling.phase(profiling.PHASE_FILE_IO):
+                return await page_index.read_page(book.file_path, page_number)
+        except (page_index.PageIndexError, FileNotFoundError) as exc:
+            logger.warning(
+                f"Failed to read page {page_number} of book {book.id}: {exc}"
+            )
+            raise s_exceptions.BookNotReadableError from exc
@@ -0,0 +1,144 @@
+"""
+Total counts of the filtered books.
+
+`COUNT(*)` under a broad filter reads every matching book, so totals are
+estimated unless an exact one is asked for: the planner's row estimate for
+the filtered listing, from the table statistics, is replaced by an exact
+count only when it is below `BOOK_COUNT_EXACT_THRESHOLD`. Exact counts of
+filters without a name sum `book_facet_counts`, which is kept up to date on
+writes; the unique index on the name narrows the other filters to a handful
+of books, which are counted directly. Totals are cached per filter
+combination for `BOOK_COUNT_CACHE_TTL_S`, so they may lag the writes by that.
+"""
+
+import dataclasses
+import functools
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+
+import sqlalchemy as sa
+import sqlalchemy.ext.asyncio as sa_asyncio_ext
+
+from literaflow.core import config, dto, metrics
+from literaflow.core.db import async_session_maker
+from literaflow.models import book as book_models
+from literaflow.services.book_filters import filter_books
+
+ESTIMATED = "estimated"
+EXACT = "exact"
+
+
+@dataclasses.dataclass(frozen=True)
+class BookCount:
+    """Total of the books matching a filter."""
+
+    value: int
+    is_exact: bool
+
+
+class BookCountCache:
+    """LRU cache of totals that expire after their time to live."""
+
+    def __init__(self, maxsize: int) -> None:
+        """Initialize the cache with the maximum number of totals."""
+        self.maxsize = maxsize
+        self._counts: OrderedDict[Hashable, tuple[float, BookCount]] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Get the number of cached totals, expired ones included."""
+        return len(self._counts)
+
+    def get(self, key: Hashable) -> BookCount | None:
+        """Get a cached total that has not expired."""
+        cached = self._counts.get(key)
+        if cached is None:
+            return None
+        expires_at, count = cached
+        if expires_at <= time.monotonic():
+            del self._counts[key]
+            return None
+        self._counts.move_to_end(key)
+        return count
+
+    def put(self, key: Hashable, count: BookCount, ttl: float) -> None:
+        """Cache a total for the time to live."""
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        self._counts[key] = (time.monotonic() + ttl, count)
+        self._counts.move_to_end(key)
+        if len(self._counts) > self.maxsize:
+            self._counts.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached totals."""
+        self._counts.clear()
+
+
+@functools.cache
+def get_book_count_cache() -> BookCountCache:
+    """Get the process-wide cache of totals."""
+    return BookCountCache(maxsize=config.app_settings.BOOK_COUNT_CACHE_SIZE)
+
+
+class BookCountService:
+    """Service class for the total counts of filtered books."""
+
+    @staticmethod
+    async def _estimate_count(
+        session: sa_asyncio_ext.AsyncSession, filters_dto: dto.BookFilters
+    ) -> int:
+        query = filter_books(
+            sa.select(sa.literal(1)).select_from(book_models.Book), filters_dto
+        )
+        connection = await session.connection()
+        compiled = query.compile(dialect=connection.dialect)
+        result = await connection.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}",
+            tuple(compiled.params[name] for name in compiled.positiontup),
+        )
+        return result.scalar_one()[0]["Plan"]["Plan Rows"]
+
+    @staticmethod
+    async def _count_exactly(
+        session: sa_asyncio_ext.AsyncSession, filters_dto: dto.BookFilters
+    ) -> int:
+        if filters_dto.name:
+            query = filter_books(sa.select(sa.func.count()), filters_dto)
+        else:
+            query = filter_books(
+                sa.select(
+                    sa.func.coalesce(
+                        sa.func.sum(book_models.BookFacetCount.book_count), 0
+                    )
+                ),
+                filters_dto,
+                book_models.BookFacetCount,
+            )
+        return await session.scalar(query)
+
+    @classmethod
+    async def count_books(
+        cls, filters_dto: dto.BookFilters, *, exact: bool
+    ) -> BookCount:
+        """Count the filtered books, estimating broad totals unless exact."""
+        cache = get_book_count_cache()
+        key = (tuple(filters_dto.model_dump().items()), exact)
+        if (count := cache.get(key)) is not None:
+            metrics.book_counts_total.inc(method="cached")
+            return count
+
+        async with async_session_maker() as session:
+            count = None
+            if not exact and not filters_dto.name:
+                estimate = await cls._estimate_count(session, filters_dto)
+                if estimate >= config.app_settings.BOOK_COUNT_EXACT_THRESHOLD:
+                    count = BookCount(estimate, is_exact=False)
+            if count is None:
+                count = BookCount(
+                    await cls._count_exactly(session, filters_dto), is_exact=True
+                )
+
+        metrics.book_counts_total.inc(method=EXACT if count.is_exact else ESTIMATED)
+        cache.put(key, count, config.app_settings.BOOK_COUNT_CACHE_TTL_S)
+        return count
@@ -0,0 +1,348 @@
+"""
+Faceted counts of the catalog.
+
+Counts per genre, author, publication year and denied status are kept up to
+date in the transactions that create or deny books, instead of grouping the
+whole books table on every request:
+
+- `book_facet_value_counts` counts the books per value of each facet, for the
+  whole catalog and within each genre, author and publication date, so the
+  facets of the catalog or of a single filter read the most common values of
+  each facet from an index;
+- `book_facet_counts` counts the books per combination of the facets. Two or
+  more filters group its rows matching all of them, which the author index
+  or the filters narrow to the combinations of their books.
+
+Name filters narrow the books to a handful through the unique index on the
+name, so their facets are counted from the books themselves.
+"""
+
+import collections
+import datetime
+from collections.abc import Callable, Iterable, Mapping
+
+import sqlalchemy as sa
+import sqlalchemy.ext.asyncio as sa_asyncio_ext
+from sqlalchemy.dialects import postgresql
+
+from literaflow.core import dto, logger
+from literaflow.core.db import async_session_maker
+from literaflow.models import book as book_models
+from literaflow.services.book_filters import filter_books
+
+FACETS = ("genre", "author", "year", "is_denied")
+
+# Genre, author, publication date and denied status of a book
+FacetKey = tuple[str, str, datetime.date, bool]
+
+_FACET_KEY_COLUMNS = ("genre", "author", "date_published", "is_denied")
+
+# Filter name, filter value, facet and value of a book facet value count
+ValueKey = tuple[str, str, str, str]
+
+_VALUE_KEY_COLUMNS = ("filter_name", "filter_value", "facet", "value")
+# Filters whose facets are counted on their own
+_COUNTED_FILTERS = ("genre", "author", "date_published")
+# Filter name and value of the counts of the whole catalog
+_NO_FILTER = ("", "")
+
+_VALUE_PARSERS: dict[str, Callable[[str], object]] = {
+    "genre": str,
+    "author": str,
+    "year": int,
+    "is_denied": lambda value: value == "true",
+}
+
+
+def _get_value_keys(facet_key: FacetKey) -> list[ValueKey]:
+    """Get the value counts a book of the facet combination is counted in."""
+    genre, author, date_published, is_denied = facet_key
+    values = {
+        "genre": genre,
+        "author": author,
+        "year": str(date_published.year),
+        "is_denied": "true" if is_denied else "false",
+    }
+    filters = [
+        _NO_FILTER,
+        ("genre", genre),
+        ("author", author),
+        ("date_published", date_published.isoformat()),
+    ]
+    return [
+        (filter_name, filter_value, facet, value)
+        for filter_name, filter_value in filters
+        for facet, value in values.items()
+    ]
+
+
+def _get_counted_filter(filters_dto: dto.BookFilters) -> tuple[str, str] | None:
+    """Get the single filter whose facets are counted, or None for combinations."""
+    if filters_dto.name:
+        return None
+    filters = [
+        (filter_name, str(value))
+        for filter_name in _COUNTED_FILTERS
+        if (value := getattr(filters_dto, filter_name)) is not None
+    ]
+    if not filters:
+        return _NO_FILTER
+    return filters[0] if len(filters) == 1 else None
+
+
+def _sort_facets(facets: dict, limit: int) -> dict:
+    for facet in FACETS:
+        facets[facet].sort(key=lambda item: (-item["count"], item["value"]))
+        del facets[facet][limit:]
+    return facets
+
+
+class BookFacetService:
+    """Service class for the faceted counts of books."""
+
+    @staticmethod
+    async def add_books(
+        session: sa_asyncio_ext.AsyncSession, facet_keys: Iterable[FacetKey]
+    ) -> None:
+        """Count new books, within the transaction that creates them."""
+        await BookFacetService._update_counts(session, collections.Counter(facet_keys))
+
+    @staticmethod
+    async def deny_books(
+        session: sa_asyncio_ext.AsyncSession,
+        books: Iterable[tuple[str, str, datetime.date]],
+    ) -> None:
+        """Move newly denied books to the denied counts, within the same transaction."""
+        deltas: collections.Counter[FacetKey] = collections.Counter()
+        for genre, author, date_published in books:
+            deltas[genre, author, date_published, False] -= 1
+            deltas[genre, author, date_published, True] += 1
+        await BookFacetService._update_counts(session, deltas)
+
+    @staticmethod
+    async def _update_counts(
+        session: sa_asyncio_ext.AsyncSession, deltas: Mapping[FacetKey, int]
+    ) -> None:
+        value_deltas: collections.Counter[ValueKey] = collections.Counter()
+        for facet_key, delta in deltas.items():
+            for value_key in _get_value_keys(facet_key):
+                value_deltas[value_key] += delta
+        await BookFacetService._upsert_counts(
+            session, book_models.BookFacetCount, _FACET_KEY_COLUMNS, deltas
+        )
+        # Denying books only moves them between denied statuses
+        await BookFacetService._upsert_counts(
+            session, book_models.BookFacetValueCount, _VALUE_KEY_COLUMNS, value_deltas
+        )
+
+    @staticmethod
+    async def _upsert_counts(
+        session: sa_asyncio_ext.AsyncSession,
+        model: type[book_models.BookFacetCount | book_models.BookFacetValueCount],
+        key_columns: tuple[str, ...],
+        deltas: Mapping[tuple, int],
+    ) -> None:
+        # Rows are locked in key order, so concurrent updates cannot deadlock
+        keys = sorted(key for key, delta in deltas.items() if delta)
+        if not keys:
+            return
+        insert = postgresql.insert(model)
+        await session.execute(
+            insert.on_conflict_do_update(
+                index_elements=key_columns,
+                set_={"book_count": model.book_count + insert.excluded.book_count},
+            ),
+            [
+                {**dict(zip(key_columns, key, strict=True)), "book_count": deltas[key]}
+                for key in keys
+            ],
+        )
+        emptied_keys = [key for key in keys if deltas[key] < 0]
+        if emptied_keys:
+            await session.execute(
+                sa.delete(model).where(
+                    sa.tuple_(*(getattr(model, column) for column in key_columns)).in_(
+                        emptied_keys
+                    ),
+                    model.book_count <= 0,
+                )
+            )
+
+    @staticmethod
+    async def backfill_counts() -> None:
+        """Count the existing books into the counts tables that are new and empty."""
+        async with async_session_maker() as session:
+            # Workers starting together wait for the first one to fill the tables
+            await session.execute(
+                sa.text(
+                    "LOCK TABLE book_facet_counts, book_facet_value_counts"
+                    " IN EXCLUSIVE MODE"
+                )
+            )
+            combination_count = await BookFacetService._backfill_combinations(session)
+            value_count = 0
+            if not await session.scalar(
+                sa.select(sa.exists().select_from(book_models.BookFacetValueCount))
+            ):
+                value_count = await BookFacetService._fill_value_counts(session)
+            await session.commit()
+        if combination_count or value_count:
+            logger.info(
+                f"Backfilled {combination_count} book facet counts and"
+                f" {value_count} book facet value counts"
+            )
+
+    @staticmethod
+    async def _backfill_combinations(session: sa_asyncio_ext.AsyncSession) -> int:
+        if await session.scalar(
+            sa.select(sa.exists().select_from(book_models.BookFacetCount))
+        ):
+            return 0
+        result = await session.execute(
+            sa.insert(book_models.BookFacetCount).from_select(
+                [*_FACET_KEY_COLUMNS, "book_count"],
+                sa.select(
+                    *(getattr(book_models.Book, c) for c in _FACET_KEY_COLUMNS),
+                    sa.func.count(),
+                ).group_by(*(getattr(book_models.Book, c) for c in _FACET_KEY_COLUMNS)),
+            )
+        )
+        return result.rowcount
+
+    @staticmethod
+    async def _fill_value_counts(session: sa_asyncio_ext.AsyncSession) -> int:
+        """Sum the combinations into the value counts of each facet and filter."""
+        combinations = book_models.BookFacetCount
+        # Formatted like `_get_value_keys` formats them
+        filter_values = {
+            "": None,
+            "genre": combinations.genre,
+            "author": combinations.author,
+            "date_published": sa.func.to_char(
+                combinations.date_published, "YYYY-MM-DD"
+            ),
+        }
+        values = {
+            "genre": combinations.genre,
+            "author": combinations.author,
+            "year": sa.cast(
+                sa.cast(sa.extract("year", combinations.date_published), sa.Integer),
+                sa.String,
+            ),
+            "is_denied": sa.case((combinations.is_denied, "true"), else_="false"),
+        }
+        row_count = 0
+        for filter_name, filter_value in filter_values.items():
+            for facet, value in values.items():
+                grouped_columns = (
+                    [value]
+                    if filter_value is None
+                    else [
+                        filter_value,
+                        value,
+                    ]
+                )
+                result = await session.execute(
+                    sa.insert(book_models.BookFacetValueCount).from_select(
+                        [*_VALUE_KEY_COLUMNS, "book_count"],
+                        sa.select(
+                            sa.literal(filter_name),
+                            sa.literal("") if filter_value is None else filter_value,
+                            sa.literal(facet),
+                            value,
+                            sa.func.sum(combinations.book_count),
+                        ).group_by(*grouped_columns),
+                    )
+                )
+                row_count += result.rowcount
+        return row_count
+
+    @staticmethod
+    async def query_facets(filters_dto: dto.BookFilters, limit: int) -> dict:
+        """Count the filtered books per value of each facet, most common first."""
+        counted_filter = _get_counted_filter(filters_dto)
+        if counted_filter is None:
+            return await BookFacetService._group_facets(filters_dto, limit)
+
+        filter_name, filter_value = counted_filter
+        value_counts = book_models.BookFacetValueCount
+        query = sa.union_all(
+            *(
+                sa.select(
+                    value_counts.facet, value_counts.value, value_counts.book_count
+                )
+                .where(
+                    value_counts.filter_name == filter_name,
+                    value_counts.filter_value == filter_value,
+                    value_counts.facet == facet,
+                    value_counts.book_count > 0,
+                )
+                .order_by(value_counts.book_count.desc(), value_counts.value)
+                # Both denied statuses are read, they add up to the total
+                .limit(None if facet == "is_denied" else limit)
+                for facet in FACETS
+            )
+        )
+        async with async_session_maker() as session:
+            rows = (await session.execute(query)).all()
+
+        facets: dict = {"total": 0, **{facet: [] for facet in FACETS}}
+        for row in rows:
+            if row.facet == "is_denied":
+                facets["total"] += row.book_count
+            facets[row.facet].append({
+                "value": _VALUE_PARSERS[row.facet](row.value),
+                "count": row.book_count,
+            })
+        return _sort_facets(facets, limit)
+
+    @staticmethod
+    async def _group_facets(filters_dto: dto.BookFilters, limit: int) -> dict:
+        """Group the combinations, or the books filtered by name, of several filters."""
+        if filters_dto.name:
+            # Names are not counted: the unique index on the name narrows
+            # the books to a handful, which are counted directly
+            source = book_models.Book
+            book_count = sa.func.count()
+        else:
+            source = book_models.BookFacetCount
+            book_count = sa.func.sum(book_models.BookFacetCount.book_count)
+        columns = {
+            "genre": source.genre,
+            "author": source.author,
+            "year": sa.cast(sa.extract("year", source.date_published), sa.Integer),
+            "is_denied": source.is_denied,
+        }
+        # GROUPING() has a bit set for each column left out of the grouping set
+        all_bits = (1 << len(columns)) - 1
+        facet_by_grouping = {
+            all_bits ^ (1 << (len(columns) - 1 - position)): facet
+            for position, facet in enumerate(columns)
+        }
+
+        query = sa.select(
+            *(column.label(facet) for facet, column in columns.items()),
+            book_count.label("book_count"),
+            sa.func.grouping(*columns.values()).label("grouping"),
+        ).group_by(
+            sa.func.grouping_sets(
+                *(sa.tuple_(column) for column in columns.values()), sa.tuple_()
+            )
+        )
+        query = filter_books(query, filters_dto, source)
+
+        async with async_session_maker() as session:
+            rows = (await session.execute(query)).all()
+
+        facets: dict = {"total": 0, **{facet: [] for facet in FACETS}}
+        for row in rows:
+            if row.grouping == all_bits:
+                # Empty selections still get the total row, with a NULL sum
+                facets["total"] = row.book_count or 0
+                continue
+            facet = facet_by_grouping[row.grouping]
+            facets[facet].append({
+                "value": getattr(row, facet),
+                "count": row.book_count,
+            })
+        return _sort_facets(facets, limit)
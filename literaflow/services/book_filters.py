@@ -0,0 +1,30 @@
+"""Filters of the book listings, shared by the queries of books and of their counts."""
+
+import sqlalchemy as sa
+
+from literaflow.core import dto
+from literaflow.models import book as book_models
+
+FilteredModel = type[book_models.Book | book_models.BookFacetCount]
+
+
+def filter_books(
+    query: sa.Select,
+    filters_dto: dto.BookFilters,
+    model: FilteredModel = book_models.Book,
+) -> sa.Select:
+    """
+    Keep the rows of the model that match the filters.
+
+    Facet counts have no name column, so a name filter always applies to the
+    books, which the query must then select from.
+    """
+    if filters_dto.name:
+        query = query.where(book_models.Book.name == filters_dto.name)
+    if filters_dto.author:
+        query = query.where(model.author == filters_dto.author)
+    if filters_dto.date_published:
+        query = query.where(model.date_published == filters_dto.date_published)
+    if filters_dto.genre:
+        query = query.where(model.genre == filters_dto.genre)
+    return query
@@ -0,0 +1,155 @@
+"""
+Download and view counts of the books.
+
+Requests only count in the worker's memory. Every `BOOK_STATS_FLUSH_INTERVAL_S`
+the pending counts are added to `book_stats` with one batched upsert, so the
+primary gets one write per interval instead of one per request, and a crashed
+worker loses at most the counts of one interval. The upserts only add to the
+stored counts, so the workers can flush independently of each other.
+"""
+
+import asyncio
+import collections
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from literaflow.core import config, dto, logger, metrics
+from literaflow.core.db import async_session_maker
+from literaflow.models import book as book_models
+from literaflow.services.book_filters import filter_books
+
+DOWNLOADS = "downloads"
+VIEWS = "views"
+
+
+class BookStatsBuffer:
+    """Download and view counts of the books that are not flushed yet."""
+
+    def __init__(self) -> None:
+        """Initialize an empty buffer."""
+        self.downloads: collections.Counter[dto.BookID] = collections.Counter()
+        self.views: collections.Counter[dto.BookID] = collections.Counter()
+
+    def __len__(self) -> int:
+        """Get the number of books with pending counts."""
+        return len(self.downloads.keys() | self.views.keys())
+
+    def take(self) -> "BookStatsBuffer":
+        """Move the pending counts to a new buffer, leaving this one empty."""
+        taken = BookStatsBuffer()
+        taken.downloads, self.downloads = self.downloads, taken.downloads
+        taken.views, self.views = self.views, taken.views
+        return taken
+
+    def merge(self, other: "BookStatsBuffer") -> None:
+        """Add the counts of another buffer to this one."""
+        self.downloads.update(other.downloads)
+        self.views.update(other.views)
+
+
+pending_book_stats = BookStatsBuffer()
+metrics.Gauge(
+    "literaflow_book_stats_pending_books",
+    "Books with download or view counts waiting to be flushed.",
+    function=lambda: len(pending_book_stats),
+)
+
+
+class BookStatsService:
+    """Service class for the download and view counts of books."""
+
+    @staticmethod
+    def record_download(book_id: dto.BookID) -> None:
+        """Count a download of the book."""
+        if config.app_settings.BOOK_STATS_ENABLED:
+            pending_book_stats.downloads[book_id] += 1
+
+    @staticmethod
+    def record_view(book_id: dto.BookID) -> None:
+        """Count a view of the book."""
+        if config.app_settings.BOOK_STATS_ENABLED:
+            pending_book_stats.views[book_id] += 1
+
+    @staticmethod
+    async def flush() -> int:
+        """Add the pending counts to the stored ones, returning the books updated."""
+        stats = pending_book_stats.take()
+        # Rows are locked in key order, so concurrent flushes cannot deadlock
+        book_ids = sorted(stats.downloads.keys() | stats.views.keys())
+        if not book_ids:
+            return 0
+
+        insert = postgresql.insert(book_models.BookStats)
+        committed = False
+        try:
+            async with async_session_maker() as session:
+                await session.execute(
+                    insert.on_conflict_do_update(
+                        index_elements=["book_id"],
+                        set_={
+                            "download_count": book_models.BookStats.download_count
+                            + insert.excluded.download_count,
+                            "view_count": book_models.BookStats.view_count
+                            + insert.excluded.view_count,
+                            "updated_at": sa.text("TIMEZONE('utc', now())"),
+                        },
+                    ),
+                    [
+                        {
+                            "book_id": book_id,
+                            "download_count": stats.downloads[book_id],
+                            "view_count": stats.views[book_id],
+                        }
+                        for book_id in book_ids
+                    ],
+                )
+                await session.commit()
+                committed = True
+        except Exception:
+            metrics.book_stats_flushes_total.inc(outcome="error")
+            raise
+        finally:
+            # Kept for the next flush, counts recorded meanwhile included;
+            # committed counts are not, or a flush cancelled while closing
+            # its session would add them twice
+            if not committed:
+                pending_book_stats.merge(stats)
+        metrics.book_stats_flushes_total.inc(outcome="ok")
+        return len(book_ids)
+
+    @classmethod
+    async def flush_periodically(cls) -> None:
+        """Flush the pending counts every flush interval."""
+        while True:
+            await asyncio.sleep(config.app_settings.BOOK_STATS_FLUSH_INTERVAL_S)
+            try:
+                await cls.flush()
+            except Exception as exc:  # noqa: BLE001
+                logger.error(f"Failed to flush the book stats: {exc}")
+
+    @staticmethod
+    async def query_popular_books(
+        filters_dto: dto.BookFilters, by: str, limit: int
+    ) -> Sequence[sa.Row[tuple[book_models.Book, book_models.BookStats]]]:
+        """Get the filtered books with the most downloads or views, with their stats."""
+        count_column = (
+            book_models.BookStats.download_count
+            if by == DOWNLOADS
+            else book_models.BookStats.view_count
+        )
+        query = (
+            sa.select(book_models.Book, book_models.BookStats)
+            .join(
+                book_models.BookStats,
+                book_models.BookStats.book_id == book_models.Book.id,
+            )
+            .where(count_column > 0)
+            .order_by(count_column.desc(), book_models.Book.id)
+            .limit(limit)
+        )
+        query = filter_books(query, filters_dto)
+
+        async with async_session_maker() as session:
+            return (await session.execute(query)).all()
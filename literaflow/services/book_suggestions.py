@@ -0,0 +1,370 @@
+"""
+Autocomplete of book names and authors.
+
+Each worker keeps the normalized names and authors of all the books in one
+sorted array, so the suggestions for a prefix are the entries from its
+binary search position on, found without a database query. They are the
+first entries in alphabetical order, not ranked by popularity or relevance.
+The array is built at startup from a streamed scan of the books, gets the
+books created by the worker as they are created, and catches up with the
+books created by other workers every `BOOK_SUGGESTIONS_REFRESH_INTERVAL_S`.
+
+Book IDs are taken before the books are committed, so a book committed late
+can have a lower ID than books already indexed. The IDs skipped by a catch up
+are looked up again by the next ones, until `CATCH_UP_MISSING_TTL_S` passes:
+only books committed later than that after taking their ID are missed.
+"""
+
+import array
+import asyncio
+import bisect
+import dataclasses
+import sys
+import time
+import unicodedata
+from collections.abc import Iterable
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from literaflow.core import config, dto, logger, metrics
+from literaflow.core.db import async_session_maker
+from literaflow.models import book as book_models
+
+NAME = "name"
+AUTHOR = "author"
+
+LOAD_BATCH_SIZE = 10_000
+# A loaded index does not know the IDs it skipped, so its first catch up
+# starts this many IDs back, and the entries found again are skipped
+CATCH_UP_ID_OVERLAP = 1000
+# Skipped book IDs are looked up again for this long, then taken as deleted
+CATCH_UP_MISSING_TTL_S = 600
+# At most the skipped IDs among this many below the last caught up one are
+# looked up again, as a first catch up skips the IDs of all deleted books
+_MAX_MISSING_ID_RANGE = 100_000
+# Fewer new entries than this are inserted one by one, which moves the
+# entries after them each time; more are merged into new lists
+_MAX_INSERTED_ENTRIES = 8
+# A merge made in a thread is done again when entries were added meanwhile,
+# and on the event loop after this many attempts
+_MAX_MERGE_ATTEMPTS = 3
+
+# Entries of authors stand for all their books, so they have no book ID
+_NO_BOOK_ID = 0
+# Separates the normalized text from the text in an entry
+_SEPARATOR = "\x00"
+
+
+def normalize(text: str) -> str:
+    """Normalize a text for prefix matching: case, accents and spacing are ignored."""
+    if text.isascii():
+        return " ".join(text.lower().replace(_SEPARATOR, "").split())
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return " ".join(
+        "".join(
+            char
+            for char in decomposed
+            if not unicodedata.combining(char) and char != _SEPARATOR
+        ).split()
+    )
+
+
+def _make_entry(text: str) -> str:
+    # One string per entry instead of a tuple of strings; sorting the entries
+    # sorts them by the normalized text, which has no separator
+    return f"{normalize(text)}{_SEPARATOR}{text}"
+
+
+def _merge(
+    entries: list[str], book_ids: array.array, new_entries: Iterable[tuple[str, int]]
+) -> tuple[list[str], array.array]:
+    """Merge entries into copies of the sorted entries and of their book IDs."""
+    merged_entries: list[str] = []
+    merged_book_ids = array.array("q")
+    start = 0
+    # The runs of entries between the new ones are copied in slices
+    for entry, book_id in sorted(new_entries):
+        position = bisect.bisect_right(entries, entry, lo=start)
+        merged_entries += entries[start:position]
+        merged_book_ids += book_ids[start:position]
+        merged_entries.append(entry)
+        merged_book_ids.append(book_id)
+        start = position
+    merged_entries += entries[start:]
+    merged_book_ids += book_ids[start:]
+    return merged_entries, merged_book_ids
+
+
+@dataclasses.dataclass
+class NewEntries:
+    """Entries of books to add to an index at once, collected as books stream in."""
+
+    # Revision of the index the entries were checked against
+    revision: int
+    entries: set[tuple[str, int]] = dataclasses.field(default_factory=set)
+    # Authors have many books, their entry is made once
+    author_entries: dict[str, tuple[str, int]] = dataclasses.field(default_factory=dict)
+
+
+class PrefixIndex:
+    """
+    Sorted array of the normalized names and authors of the books.
+
+    Entries are kept as "normalized text, separator, text" strings in a list
+    sorted together with an array of their book IDs.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty index."""
+        self._entries: list[str] = []
+        self._book_ids = array.array("q")
+        self.memory_bytes = self._get_empty_size()
+        self.max_book_id = 0
+        # Highest book ID of the books created by all workers that were looked
+        # up, and the skipped lower IDs with the time they were first skipped
+        self.caught_up_book_id = 0
+        self.missing_book_ids: dict[int, float] = {}
+        # Changes whenever entries are added or replaced
+        self.revision = 0
+
+    def _get_empty_size(self) -> int:
+        return sys.getsizeof(self._entries) + sys.getsizeof(self._book_ids)
+
+    def __len__(self) -> int:
+        """Get the number of entries."""
+        return len(self._entries)
+
+    def _contains(self, entry: str, book_id: int) -> bool:
+        start = bisect.bisect_left(self._entries, entry)
+        end = bisect.bisect_right(self._entries, entry, lo=start)
+        return book_id in self._book_ids[start:end]
+
+    def add_books(self, books: Iterable[tuple[int, str, str]]) -> int:
+        """Index the names and authors of the books, and get the new entries count."""
+        new_entries = NewEntries(revision=self.revision)
+        self.collect_entries(books, new_entries)
+        return self.add_entries(new_entries)
+
+    def collect_entries(
+        self, books: Iterable[tuple[int, str, str]], new_entries: NewEntries
+    ) -> None:
+        """Collect the entries of the books that are not indexed yet."""
+        # Nothing is indexed on the first load
+        check_indexed = bool(self._entries)
+        for book_id, name, author in books:
+            self.max_book_id = max(self.max_book_id, book_id)
+            author_entry = new_entries.author_entries.get(author)
+            if author_entry is None:
+                author_entry = new_entries.author_entries[author] = (
+                    _make_entry(author),
+                    _NO_BOOK_ID,
+                )
+            for entry in ((_make_entry(name), book_id), author_entry):
+                if entry not in new_entries.entries and not (
+                    check_indexed and self._contains(*entry)
+                ):
+                    new_entries.entries.add(entry)
+
+    def _get_unindexed(
+        self, entries: set[tuple[str, int]], revision: int
+    ) -> set[tuple[str, int]]:
+        if revision == self.revision:
+            return entries
+        # Entries were added since these were checked
+        return {entry for entry in entries if not self._contains(*entry)}
+
+    def add_entries(self, new_entries: NewEntries) -> int:
+        """Add collected entries to the index, and get their count."""
+        entries = self._get_unindexed(new_entries.entries, new_entries.revision)
+        self._insert(entries)
+        return len(entries)
+
+    async def merge_entries(self, new_entries: NewEntries) -> int:
+        """Merge collected entries into the index in a thread, and get their count."""
+        entries, revision = new_entries.entries, new_entries.revision
+        for _ in range(_MAX_MERGE_ATTEMPTS):
+            entries = self._get_unindexed(entries, revision)
+            if len(entries) < _MAX_INSERTED_ENTRIES:
+                break
+            revision = self.revision
+            merged = await asyncio.to_thread(
+                _merge, self._entries, self._book_ids, entries
+            )
+            if revision == self.revision:
+                self._replace(*merged, entries)
+                return len(entries)
+        return self.add_entries(NewEntries(revision=revision, entries=entries))
+
+    def _insert(self, new_entries: set[tuple[str, int]]) -> None:
+        if not new_entries:
+            return
+        if len(new_entries) < _MAX_INSERTED_ENTRIES:
+            self.revision += 1
+            for entry, book_id in new_entries:
+                position = bisect.bisect_right(self._entries, entry)
+                self._entries.insert(position, entry)
+                self._book_ids.insert(position, book_id)
+            self._count_memory(new_entries)
+        else:
+            self._replace(
+                *_merge(self._entries, self._book_ids, new_entries), new_entries
+            )
+
+    def _replace(
+        self,
+        entries: list[str],
+        book_ids: array.array,
+        new_entries: set[tuple[str, int]],
+    ) -> None:
+        self._entries = entries
+        self._book_ids = book_ids
+        self.revision += 1
+        self._count_memory(new_entries)
+
+    def _count_memory(self, new_entries: set[tuple[str, int]]) -> None:
+        # Each entry also takes a slot in the list and one in the array
+        self.memory_bytes += sum(
+            sys.getsizeof(entry) + 8 + self._book_ids.itemsize
+            for entry, _ in new_entries
+        )
+
+    def get_catch_up_range(self) -> tuple[int, list[int]]:
+        """Get the last caught up book ID and the skipped IDs to look up again."""
+        return self.caught_up_book_id, list(self.missing_book_ids)
+
+    def record_caught_up(self, after_book_id: int, found_book_ids: set[int]) -> None:
+        """Remember the book IDs a catch up skipped, and forget the expired ones."""
+        now = time.monotonic()
+        for book_id in found_book_ids:
+            self.missing_book_ids.pop(book_id, None)
+        last_book_id = max(after_book_id, *found_book_ids, 0)
+        first_book_id = max(after_book_id, last_book_id - _MAX_MISSING_ID_RANGE) + 1
+        for book_id in range(first_book_id, last_book_id + 1):
+            if book_id not in found_book_ids:
+                self.missing_book_ids[book_id] = now
+        self.missing_book_ids = {
+            book_id: missed_at
+            for book_id, missed_at in self.missing_book_ids.items()
+            if now - missed_at < CATCH_UP_MISSING_TTL_S
+        }
+        self.caught_up_book_id = max(self.caught_up_book_id, last_book_id)
+
+    def suggest(self, prefix: str, limit: int) -> list[dict]:
+        """Get the first names and authors starting with the prefix, alphabetically."""
+        key = normalize(prefix)
+        if not key:
+            return []
+        suggestions = []
+        entries = self._entries
+        for position in range(bisect.bisect_left(entries, key), len(entries)):
+            entry = entries[position]
+            if len(suggestions) >= limit or not entry.startswith(key):
+                break
+            text = entry.partition(_SEPARATOR)[2]
+            book_id = self._book_ids[position]
+            if book_id == _NO_BOOK_ID:
+                suggestions.append({"kind": AUTHOR, "text": text})
+            else:
+                suggestions.append({"kind": NAME, "text": text, "id": book_id})
+        return suggestions
+
+    def export(self) -> tuple[list[str], array.array]:
+        """Get copies of the sorted entries and of their book IDs."""
+        return list(self._entries), array.array("q", self._book_ids)
+
+    def load(self, entries: list[str], book_ids: array.array, max_book_id: int) -> None:
+        """Replace the entries with exported ones."""
+        self._entries = entries
+        self._book_ids = book_ids
+        self.max_book_id = max_book_id
+        self.caught_up_book_id = max(max_book_id - CATCH_UP_ID_OVERLAP, 0)
+        self.missing_book_ids = {}
+        self.revision += 1
+        self.memory_bytes = self._get_empty_size() + sum(
+            sys.getsizeof(entry) + 8 + self._book_ids.itemsize for entry in entries
+        )
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        self._entries = []
+        self._book_ids = array.array("q")
+        self.memory_bytes = self._get_empty_size()
+        self.max_book_id = 0
+        self.caught_up_book_id = 0
+        self.missing_book_ids = {}
+        self.revision += 1
+
+
+book_suggestions = PrefixIndex()
+metrics.Gauge(
+    "literaflow_book_suggestions_entries",
+    "Names and authors in the worker's autocomplete index.",
+    function=lambda: len(book_suggestions),
+)
+metrics.Gauge(
+    "literaflow_book_suggestions_memory_bytes",
+    "Approximate memory used by the worker's autocomplete index in bytes.",
+    function=lambda: book_suggestions.memory_bytes,
+)
+
+
+class BookSuggestionService:
+    """Service class for the autocomplete of book names and authors."""
+
+    @staticmethod
+    def suggest(prefix: str, limit: int) -> list[dict]:
+        """Get the first names and authors starting with the prefix, alphabetically."""
+        return book_suggestions.suggest(prefix, limit)
+
+    @staticmethod
+    def record_book(book_id: dto.BookID, name: str, author: str) -> None:
+        """Index a book created by this worker."""
+        if config.app_settings.BOOK_SUGGESTIONS_ENABLED:
+            book_suggestions.add_books([(book_id, name, author)])
+
+    @staticmethod
+    async def catch_up() -> int:
+        """Index the books created since the last catch up, all of them at first."""
+        after_book_id, missing_book_ids = book_suggestions.get_catch_up_range()
+        query = (
+            sa.select(
+                book_models.Book.id, book_models.Book.name, book_models.Book.author
+            )
+            .where(
+                sa.or_(
+                    book_models.Book.id > after_book_id,
+                    book_models.Book.id
+                    == sa.any_(
+                        sa.bindparam(
+                            "missing_book_ids",
+                            missing_book_ids,
+                            type_=postgresql.ARRAY(sa.Integer),
+                        )
+                    ),
+                )
+            )
+            .order_by(book_models.Book.id)
+            .execution_options(yield_per=LOAD_BATCH_SIZE)
+        )
+        # Only the entries are kept from each partition, and they are merged
+        # at once into the array in a thread
+        new_entries = NewEntries(revision=book_suggestions.revision)
+        found_book_ids: set[int] = set()
+        async with async_session_maker() as session:
+            result = await session.stream(query)
+            async for partition in result.partitions():
+                found_book_ids.update(book_id for book_id, _, _ in partition)
+                book_suggestions.collect_entries(partition, new_entries)
+        book_suggestions.record_caught_up(after_book_id, found_book_ids)
+        return await book_suggestions.merge_entries(new_entries)
+
+    @classmethod
+    async def catch_up_periodically(cls) -> None:
+        """Index the books created by other workers every refresh interval."""
+        while True:
+            await asyncio.sleep(config.app_settings.BOOK_SUGGESTIONS_REFRESH_INTERVAL_S)
+            try:
+                await cls.catch_up()
+            except Exception as exc:  # noqa: BLE001
+                logger.error(f"Failed to catch up the book suggestions: {exc}")
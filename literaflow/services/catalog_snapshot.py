@@ -0,0 +1,310 @@
+"""
+Catalog snapshots of the JSON fragment cache and the suggestions index.
+
+A new worker starts with empty caches: the suggestions index is built from a
+scan of the whole books table and every book is encoded to JSON again on
+first use. Every `CATALOG_SNAPSHOT_INTERVAL_S` one worker per host writes
+the JSON fragments of the hot books and the suggestions index to a file, and
+new workers load it at startup, then catch up with the books created or
+updated since the snapshot's version stamp instead of rebuilding both.
+
+Only these two caches are warmed. Book rows are not snapshotted, so every
+book request still looks its row up in the database; the snapshot saves the
+encoding of hot books and the scan behind the suggestions index.
+
+The file is a header followed by fixed-width arrays and blobs in the native
+byte order (it never leaves the host), aligned to 8 bytes, so loading it
+takes one read of the file and slices of that buffer, without parsing:
+
+- header: magic, format version, version stamp (database time of the
+  snapshot), highest indexed book ID, fragment and entry counts, and a
+  digest of the database and the books table it was taken from;
+- fragments: book IDs, `updated_at` in microseconds, blob offsets and the
+  JSON blob;
+- suggestions: book IDs, blob offsets and the UTF-8 blob of the entries.
+"""
+
+import array
+import asyncio
+import dataclasses
+import datetime
+import hashlib
+import os
+import pathlib
+import struct
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from literaflow.core import config, logger, metrics
+from literaflow.core.db import async_session_maker
+from literaflow.models import book as book_models
+from literaflow.services.book_suggestions import book_suggestions
+from literaflow.utils import serialization
+
+MAGIC = b"LFCATSNP"
+FORMAT_VERSION = 1
+# Magic, format version, version stamp, max book ID, fragment count, entry
+# count and catalog digest
+_HEADER = struct.Struct("=8sI4xqqqq32s")
+_ALIGNMENT = 8
+
+# Books updated in transactions that started before the stamp but committed
+# after it have an older `updated_at`, so catching up starts this far back
+CATCH_UP_MARGIN = datetime.timedelta(minutes=1)
+
+_EPOCH = datetime.datetime(1970, 1, 1)  # noqa: DTZ001
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+# Key of a book's fragment: its ID and `updated_at`
+FragmentKey = tuple[int, datetime.datetime]
+
+
+@dataclasses.dataclass
+class CatalogSnapshot:
+    """Hot catalog state of a worker."""
+
+    stamp: datetime.datetime
+    catalog_digest: bytes
+    fragments: list[tuple[FragmentKey, bytes]]
+    suggestion_entries: list[str]
+    suggestion_book_ids: array.array
+    max_book_id: int
+
+
+def get_catalog_digest() -> bytes:
+    """Get a digest of the database of the catalog and of the books' columns."""
+    url = config.postgresql_connection_settings.async_url
+    # Fragments of another version of the books table have other fields
+    columns = ",".join(book_models.Book.__table__.columns.keys())
+    return hashlib.sha256(
+        f"{url.host}:{url.port}/{url.database}/{columns}".encode()
+    ).digest()
+
+
+def _to_microseconds(moment: datetime.datetime) -> int:
+    return (moment - _EPOCH) // _MICROSECOND
+
+
+def _from_microseconds(microseconds: int) -> datetime.datetime:
+    return _EPOCH + microseconds * _MICROSECOND
+
+
+def _pad(size: int) -> bytes:
+    return b"\0" * (-size % _ALIGNMENT)
+
+
+def _pack_blobs(blobs: list[bytes]) -> list[bytes]:
+    offsets = array.array("q", [0])
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    data = b"".join(blobs)
+    return [offsets.tobytes(), data, _pad(len(data))]
+
+
+def write_snapshot(path: pathlib.Path, snapshot: CatalogSnapshot) -> int:
+    """Write a snapshot atomically, and get its size in bytes."""
+    fragment_keys = [key for key, _ in snapshot.fragments]
+    parts = [
+        _HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            _to_microseconds(snapshot.stamp),
+            snapshot.max_book_id,
+            len(snapshot.fragments),
+            len(snapshot.suggestion_entries),
+            snapshot.catalog_digest,
+        ),
+        array.array("q", [book_id for book_id, _ in fragment_keys]).tobytes(),
+        array.array(
+            "q", [_to_microseconds(updated_at) for _, updated_at in fragment_keys]
+        ).tobytes(),
+        *_pack_blobs([fragment for _, fragment in snapshot.fragments]),
+        snapshot.suggestion_book_ids.tobytes(),
+        *_pack_blobs([entry.encode() for entry in snapshot.suggestion_entries]),
+    ]
+    partial_path = path.with_name(f"{path.name}.{os.getpid()}.part")
+    try:
+        with partial_path.open("wb") as f:
+            f.writelines(parts)
+        # Workers loading the snapshot see the old file or the new one, not a mix
+        partial_path.replace(path)
+    except Exception:
+        partial_path.unlink(missing_ok=True)
+        raise
+    return sum(len(part) for part in parts)
+
+
+class _Reader:
+    def __init__(self, data: memoryview) -> None:
+        self.data = data
+        self.position = _HEADER.size
+
+    def read_array(self, length: int) -> array.array:
+        values = array.array("q")
+        end = self.position + length * values.itemsize
+        if end > len(self.data):
+            raise ValueError("The snapshot is truncated")
+        values.frombytes(self.data[self.position : end])
+        self.position = end
+        return values
+
+    def read_blobs(self, count: int) -> list[bytes]:
+        offsets = self.read_array(count + 1)
+        start = self.position
+        end = start + offsets[-1]
+        if end > len(self.data):
+            raise ValueError("The snapshot is truncated")
+        data = self.data[start:end]
+        self.position = end + len(_pad(offsets[-1]))
+        # Each blob is copied once, out of the file's buffer
+        return [bytes(data[offsets[i] : offsets[i + 1]]) for i in range(count)]
+
+
+def read_snapshot(path: pathlib.Path) -> CatalogSnapshot:
+    """Read a snapshot, raising ValueError when it cannot be used."""
+    with memoryview(path.read_bytes()) as data:
+        if len(data) < _HEADER.size:
+            raise ValueError("The snapshot is truncated")
+        (
+            magic,
+            format_version,
+            stamp,
+            max_book_id,
+            fragment_count,
+            entry_count,
+            catalog_digest,
+        ) = _HEADER.unpack_from(data)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {format_version}")
+
+        reader = _Reader(data)
+        book_ids = reader.read_array(fragment_count)
+        updated_ats = reader.read_array(fragment_count)
+        fragments = reader.read_blobs(fragment_count)
+        suggestion_book_ids = reader.read_array(entry_count)
+        suggestion_entries = [
+            entry.decode() for entry in reader.read_blobs(entry_count)
+        ]
+
+    return CatalogSnapshot(
+        stamp=_from_microseconds(stamp),
+        catalog_digest=catalog_digest,
+        fragments=[
+            ((book_id, _from_microseconds(updated_at)), fragment)
+            for book_id, updated_at, fragment in zip(
+                book_ids, updated_ats, fragments, strict=True
+            )
+        ],
+        suggestion_entries=suggestion_entries,
+        suggestion_book_ids=suggestion_book_ids,
+        max_book_id=max_book_id,
+    )
+
+
+async def take_snapshot() -> CatalogSnapshot:
+    """Take a snapshot of the worker's hot catalog state."""
+    async with async_session_maker() as session:
+        stamp = await session.scalar(sa.select(sa.func.timezone("utc", sa.func.now())))
+    suggestion_entries, suggestion_book_ids = book_suggestions.export()
+    return CatalogSnapshot(
+        stamp=stamp,
+        catalog_digest=get_catalog_digest(),
+        fragments=serialization.get_fragment_cache().items(),
+        suggestion_entries=suggestion_entries,
+        suggestion_book_ids=suggestion_book_ids,
+        max_book_id=book_suggestions.max_book_id,
+    )
+
+
+async def save_snapshot() -> None:
+    """Write a snapshot of the worker's hot catalog state."""
+    path = config.app_settings.get_catalog_snapshot_path()
+    snapshot = await take_snapshot()
+    started_at = time.perf_counter()
+    size = await asyncio.to_thread(write_snapshot, path, snapshot)
+    logger.info(
+        f"Wrote a catalog snapshot of {len(snapshot.fragments)} books and"
+        f" {len(snapshot.suggestion_entries)} suggestions ({size} bytes) in"
+        f" {time.perf_counter() - started_at:.3f} seconds"
+    )
+
+
+async def save_snapshot_periodically() -> None:
+    """Write a snapshot every interval, unless another worker just did."""
+    while True:
+        interval = config.app_settings.CATALOG_SNAPSHOT_INTERVAL_S
+        await asyncio.sleep(interval)
+        path = config.app_settings.get_catalog_snapshot_path()
+        try:
+            if time.time() - path.stat().st_mtime < interval / 2:
+                continue
+        except FileNotFoundError:
+            pass
+        try:
+            await save_snapshot()
+            metrics.catalog_snapshot_writes_total.inc(outcome="success")
+        except Exception as exc:  # noqa: BLE001
+            metrics.catalog_snapshot_writes_total.inc(outcome="failure")
+            logger.error(f"Failed to write the catalog snapshot: {exc}")
+
+
+async def _catch_up_fragments(snapshot: CatalogSnapshot) -> int:
+    """Encode the snapshot's books updated since the snapshot again."""
+    book_ids = [book_id for (book_id, _), _ in snapshot.fragments]
+    if not book_ids:
+        return 0
+    async with async_session_maker() as session:
+        result = await session.execute(
+            sa.select(book_models.Book).where(
+                book_models.Book.updated_at > snapshot.stamp - CATCH_UP_MARGIN,
+                book_models.Book.id
+                == sa.any_(
+                    sa.bindparam(
+                        "book_ids", book_ids, type_=postgresql.ARRAY(sa.Integer)
+                    )
+                ),
+            )
+        )
+        books = result.scalars().all()
+    fragment_cache = serialization.get_fragment_cache()
+    for book in books:
+        fragment_cache.get_or_encode(key=(book.id, book.updated_at), build=book.to_dict)
+    return len(books)
+
+
+async def load_snapshot() -> bool:
+    """Warm the worker's caches from the snapshot, and tell whether it was loaded."""
+    path = config.app_settings.get_catalog_snapshot_path()
+    started_at = time.perf_counter()
+    try:
+        snapshot = await asyncio.to_thread(read_snapshot, path)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError, struct.error) as exc:
+        logger.warning(f"Ignoring the catalog snapshot {path}: {exc}")
+        return False
+    if snapshot.catalog_digest != get_catalog_digest():
+        logger.warning(f"Ignoring the catalog snapshot {path} of another catalog")
+        return False
+
+    fragment_cache = serialization.get_fragment_cache()
+    for key, fragment in snapshot.fragments:
+        fragment_cache.put(key, fragment)
+    # The suggestions index is shared by the applications of the process, and
+    # only a new one is replaced
+    if config.app_settings.BOOK_SUGGESTIONS_ENABLED and not len(book_suggestions):
+        book_suggestions.load(
+            snapshot.suggestion_entries,
+            snapshot.suggestion_book_ids,
+            snapshot.max_book_id,
+        )
+    updated_books = await _catch_up_fragments(snapshot)
+    logger.info(
+        f"Loaded the catalog snapshot of {snapshot.stamp.isoformat()} with"
+        f" {len(snapshot.fragments)} books, {updated_books} updated since, and"
+        f" {len(snapshot.suggestion_entries)} suggestions in"
+        f" {time.perf_counter() - started_at:.3f} seconds"
+    )
+    return True
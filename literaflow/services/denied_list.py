@@ -1,7 +1,9 @@
 import sqlalchemy as sa
 
+from literaflow.core import metrics
 from literaflow.core.db import async_session_maker
 from literaflow.models.book import Book
+from literaflow.services.book_facets import BookFacetService
 from literaflow.utils.denied_books_parser import DeniedBooksDict
 
 
@@ -11,16 +13,20 @@ class DeniedListService:
     @staticmethod
     async def update_denied_books(denied_books: DeniedBooksDict) -> None:
         """Update books to be marked as denied."""
-        async with async_session_maker() as session:
-            stmt = (
-                sa.update(Book)
-                .where(
-                    sa.or_(
-                        Book.name.in_(denied_books["names"]),
-                        Book.author.in_(denied_books["authors"]),
+        with metrics.denied_list_apply_duration_seconds.time():
+            async with async_session_maker() as session:
+                stmt = (
+                    sa.update(Book)
+                    .where(
+                        sa.or_(
+                            Book.name.in_(denied_books["names"]),
+                            Book.author.in_(denied_books["authors"]),
+                        ),
+                        Book.is_denied.is_(False),
                     )
+                    .values(is_denied=True)
+                    .returning(Book.genre, Book.author, Book.date_published)
                 )
-                .values(is_denied=True)
-            )
-            await session.execute(stmt)
-            await session.commit()
+                result = await session.execute(stmt)
+                await BookFacetService.deny_books(session, result.tuples())
+                await session.commit()
@@ -8,3 +8,7 @@ class BookDownloadTimeoutError(BookDownloadError):
 
 class BookAlreadyExistsError(Exception):
     """Book already exists error."""
+
+
+class BookNotReadableError(Exception):
+    """Book cannot be read online error."""
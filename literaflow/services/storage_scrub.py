@@ -0,0 +1,359 @@
+"""
+Scrubbing of the books directory against the books table.
+
+Book files are written before their book is committed, so failed inserts and
+crashed workers leave files that no book refers to, and files can go missing
+or get truncated under the books that refer to them. A scrub walks both sides
+in batches:
+
+- storage: files older than `STORAGE_SCRUB_MIN_AGE_S` whose name does not
+  start with the file name of a book are deleted. Sidecars (`.gz`, `.br`,
+  `.gz.skip`, `.br.skip`, `.pageindex`, `.pagetext`, `.cover.*`) are named
+  after their book's file, so they live and die with it; stale `.part`
+  files are always deleted. Only the names are compared, so books keep
+  their files when the books directory moves, and a batch with an abnormal
+  share of orphans turns the scrub into a dry run;
+- table: books whose file is missing, differs in size from `file_size` or,
+  when checksums are verified, no longer matches `file_sha256` get their
+  `file_status` set, which is cleared once the file is fine again.
+
+File operations and the bytes read for checksums are paced by token buckets,
+so a scrub does not compete with live traffic for the disk.
+"""
+
+import asyncio
+import collections
+import dataclasses
+import hashlib
+import os
+import pathlib
+import time
+from collections.abc import Iterator
+
+import aiofiles
+import aiofiles.os
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from literaflow.core import config, logger, metrics
+from literaflow.core.db import async_session_maker, get_async_engine
+from literaflow.models import book as book_models
+from literaflow.utils import files as files_utils
+from literaflow.utils.download_scheduler import TokenBucket
+
+FILE_MISSING = "missing"
+FILE_TRUNCATED = "truncated"
+FILE_CORRUPT = "corrupt"
+
+PARTIAL_FILE_SUFFIX = ".part"
+
+# Held by the running scrub, so workers and the CLI never scrub at once
+SCRUB_LOCK_ID = 7_301_043
+
+# Batches with fewer orphans than this are cleaned whatever their share of
+# orphans, so that small books directories are scrubbed too
+MIN_GUARDED_ORPHANS = 10
+
+
+@dataclasses.dataclass
+class ScrubReport:
+    """What a scrub found and did."""
+
+    scanned_files: int = 0
+    orphan_files: int = 0
+    orphan_bytes: int = 0
+    deleted_files: int = 0
+    # Set when too many orphans were found to delete them
+    deletion_refused: bool = False
+    checked_books: int = 0
+    flagged_books: collections.Counter[str] = dataclasses.field(
+        default_factory=collections.Counter
+    )
+
+
+@dataclasses.dataclass(frozen=True)
+class _StoredFile:
+    name: str
+    size: int
+    modified_at: float
+
+
+def _scan_books_dir(books_dir: str, batch_size: int) -> Iterator[list[_StoredFile]]:
+    """Yield the regular files of the directory in batches, without listing it whole."""
+    batch = []
+    with os.scandir(books_dir) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            batch.append(_StoredFile(entry.name, stat.st_size, stat.st_mtime))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _get_owner_names(file_name: str) -> list[str]:
+    """Get the names of the book files the file may belong to, itself included."""
+    parts = file_name.split(".")
+    return [".".join(parts[:length]) for length in range(1, len(parts) + 1)]
+
+
+class StorageScrubber:
+    """Deletes orphan book files and flags books with damaged files."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        books_dir: str,
+        batch_size: int,
+        min_age: float,
+        delete_orphans: bool,
+        verify_checksums: bool,
+        max_orphan_ratio: float = 1,
+        files_per_second: float = 0,
+        read_bytes_per_second: float = 0,
+    ) -> None:
+        """Initialize the scrubber; rates of 0 are unlimited."""
+        self.books_dir = books_dir
+        self.batch_size = batch_size
+        self.min_age = min_age
+        self.delete_orphans = delete_orphans
+        self.max_orphan_ratio = max_orphan_ratio
+        self.verify_checksums = verify_checksums
+        # Buckets hold about one second of work
+        self._file_operations = TokenBucket(files_per_second, files_per_second)
+        self._read_bytes = TokenBucket(
+            read_bytes_per_second,
+            max(read_bytes_per_second, files_utils.CHECKSUM_CHUNK_SIZE),
+        )
+        self.report = ScrubReport()
+
+    def _get_path(self, file_name: str) -> str:
+        return str(pathlib.Path(self.books_dir, file_name))
+
+    async def scrub(self) -> ScrubReport:
+        """Scrub the storage, then the books table."""
+        await self.scrub_storage()
+        await self.scrub_books()
+        return self.report
+
+    async def scrub_storage(self) -> None:
+        """Delete the files in the books directory that no book refers to."""
+        if not pathlib.Path(self.books_dir).is_dir():
+            return
+        batches = _scan_books_dir(self.books_dir, self.batch_size)
+        while batch := await asyncio.to_thread(next, batches, None):
+            await self._file_operations.consume(len(batch))
+            self.report.scanned_files += len(batch)
+            # Young files may belong to a book that is not committed yet
+            modified_before = time.time() - self.min_age
+            old_files = [file for file in batch if file.modified_at < modified_before]
+            orphans = await self._find_orphans(old_files)
+            if self.delete_orphans and self._has_too_many_orphans(orphans, old_files):
+                self._refuse_deletion(orphans, old_files)
+            for orphan in orphans:
+                await self._remove_orphan(orphan)
+
+    @staticmethod
+    async def _find_orphans(files: list[_StoredFile]) -> list[_StoredFile]:
+        owner_names = {name for file in files for name in _get_owner_names(file.name)}
+        if not owner_names:
+            return []
+        async with async_session_maker() as session:
+            result = await session.execute(
+                sa.select(book_models.book_file_name).where(
+                    book_models.book_file_name
+                    == sa.any_(
+                        sa.bindparam(
+                            "file_names",
+                            sorted(owner_names),
+                            type_=postgresql.ARRAY(sa.String),
+                        )
+                    )
+                )
+            )
+            book_file_names = set(result.scalars())
+        return [
+            file
+            for file in files
+            # Partial files of finished writes are left behind by crashes
+            if file.name.endswith(PARTIAL_FILE_SUFFIX)
+            or book_file_names.isdisjoint(_get_owner_names(file.name))
+        ]
+
+    def _has_too_many_orphans(
+        self, orphans: list[_StoredFile], files: list[_StoredFile]
+    ) -> bool:
+        return (
+            len(orphans) >= MIN_GUARDED_ORPHANS
+            and len(orphans) > len(files) * self.max_orphan_ratio
+        )
+
+    def _refuse_deletion(
+        self, orphans: list[_StoredFile], files: list[_StoredFile]
+    ) -> None:
+        # A books directory or a database other than the expected ones makes
+        # every file look orphan, so the rest of the scrub is a dry run
+        self.delete_orphans = False
+        self.report.deletion_refused = True
+        logger.error(
+            f"{len(orphans)} of {len(files)} files of a batch of {self.books_dir}"
+            f" have no book, more than STORAGE_SCRUB_MAX_ORPHAN_RATIO"
+            f" ({self.max_orphan_ratio}) allows: orphan files are only reported"
+        )
+
+    async def _remove_orphan(self, orphan: _StoredFile) -> None:
+        self.report.orphan_files += 1
+        self.report.orphan_bytes += orphan.size
+        if not self.delete_orphans:
+            logger.info(f"Found orphan file {orphan.name} ({orphan.size} bytes)")
+            return
+        await self._file_operations.consume(1)
+        await files_utils.remove_file(self._get_path(orphan.name))
+        self.report.deleted_files += 1
+        metrics.storage_scrub_deleted_files_total.inc()
+        metrics.storage_scrub_deleted_bytes_total.inc(orphan.size)
+        logger.info(f"Deleted orphan file {orphan.name} ({orphan.size} bytes)")
+
+    async def scrub_books(self) -> None:
+        """Flag the books whose file is missing, truncated or corrupt."""
+        last_book_id = 0
+        while True:
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    sa.select(
+                        book_models.Book.id,
+                        book_models.Book.file_path,
+                        book_models.Book.file_size,
+                        book_models.Book.file_sha256,
+                        book_models.Book.file_status,
+                    )
+                    .where(
+                        book_models.Book.file_path.is_not(None),
+                        book_models.Book.id > last_book_id,
+                    )
+                    .order_by(book_models.Book.id)
+                    .limit(self.batch_size)
+                )
+                books = result.all()
+            if not books:
+                return
+            last_book_id = books[-1].id
+
+            changed_statuses: dict[str | None, list[int]] = collections.defaultdict(
+                list
+            )
+            for book in books:
+                status = await self._check_file(
+                    book.file_path, book.file_size, book.file_sha256
+                )
+                if status is not None:
+                    self.report.flagged_books[status] += 1
+                if status != book.file_status:
+                    changed_statuses[status].append(book.id)
+            self.report.checked_books += len(books)
+            await self._update_statuses(changed_statuses)
+
+    async def _check_file(
+        self, file_path: str, file_size: int | None, file_sha256: str | None
+    ) -> str | None:
+        await self._file_operations.consume(1)
+        try:
+            size = (await aiofiles.os.stat(file_path)).st_size
+        except FileNotFoundError:
+            return FILE_MISSING
+        if file_size is not None and size != file_size:
+            return FILE_TRUNCATED if size < file_size else FILE_CORRUPT
+        if self.verify_checksums and file_sha256 is not None:
+            try:
+                if await self._get_checksum(file_path) != file_sha256:
+                    return FILE_CORRUPT
+            except FileNotFoundError:
+                return FILE_MISSING
+        return None
+
+    async def _get_checksum(self, file_path: str) -> str:
+        digest = hashlib.sha256()
+        async with aiofiles.open(file_path, "rb") as f:
+            while chunk := await f.read(files_utils.CHECKSUM_CHUNK_SIZE):
+                digest.update(chunk)
+                await self._read_bytes.consume(len(chunk))
+        return digest.hexdigest()
+
+    @staticmethod
+    async def _update_statuses(changed_statuses: dict[str | None, list[int]]) -> None:
+        if not changed_statuses:
+            return
+        async with async_session_maker() as session:
+            for status, book_ids in changed_statuses.items():
+                # Bumping `updated_at` also invalidates the books' cached JSON
+                await session.execute(
+                    sa.update(book_models.Book)
+                    .where(book_models.Book.id.in_(book_ids))
+                    .values(file_status=status)
+                )
+                if status is not None:
+                    metrics.storage_scrub_flagged_books_total.inc(
+                        len(book_ids), status=status
+                    )
+                    logger.warning(f"Books with a {status} file: {book_ids}")
+            await session.commit()
+
+
+async def run_storage_scrub(**options: bool | float) -> ScrubReport | None:
+    """
+    Scrub the storage with the configured options, overridden by the given ones.
+
+    Return None without scrubbing when another scrub is running.
+    """
+    settings = config.app_settings
+    scrubber = StorageScrubber(**{
+        "books_dir": settings.get_books_dir_path(),
+        "batch_size": settings.STORAGE_SCRUB_BATCH_SIZE,
+        "min_age": settings.STORAGE_SCRUB_MIN_AGE_S,
+        "delete_orphans": settings.STORAGE_SCRUB_DELETE_ORPHANS,
+        "max_orphan_ratio": settings.STORAGE_SCRUB_MAX_ORPHAN_RATIO,
+        "verify_checksums": settings.STORAGE_SCRUB_VERIFY_CHECKSUMS,
+        "files_per_second": settings.STORAGE_SCRUB_FILES_PER_S,
+        "read_bytes_per_second": settings.STORAGE_SCRUB_READ_BYTES_PER_S,
+        **options,
+    })
+    # A connection of its own holds the lock without holding a transaction open
+    async with get_async_engine().connect() as connection:
+        await connection.execution_options(isolation_level="AUTOCOMMIT")
+        if not await connection.scalar(
+            sa.select(sa.func.pg_try_advisory_lock(SCRUB_LOCK_ID))
+        ):
+            return None
+        try:
+            started_at = time.perf_counter()
+            report = await scrubber.scrub()
+            logger.info(
+                f"Scrubbed the storage in {time.perf_counter() - started_at:.1f}"
+                f" seconds: {report}"
+            )
+            return report
+        finally:
+            try:
+                await connection.scalar(
+                    sa.select(sa.func.pg_advisory_unlock(SCRUB_LOCK_ID))
+                )
+            except BaseException:
+                # Closing the connection releases the lock
+                await connection.invalidate()
+                raise
+
+
+async def scrub_storage_periodically() -> None:
+    """Scrub the storage every scrub interval."""
+    while True:
+        await asyncio.sleep(config.app_settings.STORAGE_SCRUB_INTERVAL_S)
+        try:
+            await run_storage_scrub()
+        except Exception as exc:  # noqa: BLE001
+            logger.error(f"Failed to scrub the storage: {exc}")
@@ -0,0 +1,180 @@
+"""
+Admission control for expensive routes.
+
+Each limited route gets a concurrency limit and a bounded queue of waiting
+requests. Requests beyond both are rejected immediately instead of piling up
+until memory and the database pool are exhausted. The concurrency limit
+adapts to the route's latency (AIMD): it grows by one per window of fast
+requests and shrinks multiplicatively when latency rises well above the
+lowest latency recently observed, or when requests fail. Routes whose
+latency is set by other servers only shrink their limit on failures.
+"""
+
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import math
+import time
+from collections.abc import AsyncIterator
+
+from aiohttp import web
+
+# Multiplicative decrease of the limit on slow or failed requests
+LIMIT_DECREASE_FACTOR = 0.9
+# Growth of the recorded minimum latency per request, so that it follows
+# the route's latency up again after a fast period
+MIN_LATENCY_DRIFT = 1.01
+# Weight of the latest request in the average latency
+LATENCY_SMOOTHING = 0.2
+
+
+class AdmissionRejectedError(Exception):
+    """The route is saturated and the request was not admitted."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        """Initialize the error with the reason and the suggested delay."""
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclasses.dataclass
+class Admission:
+    """An admitted request, whose response status is recorded once known."""
+
+    status: int | None = None
+
+    @property
+    def failed(self) -> bool:
+        """Check if the request raised or the server failed to answer it."""
+        return (
+            self.status is None
+            or self.status >= web.HTTPInternalServerError.status_code
+        )
+
+
+class AdaptiveLimit:
+    """
+    A concurrency limit adjusted by additive increase/multiplicative decrease.
+
+    An infinite tolerance ignores latency, for routes that mostly wait on
+    other servers: the limit then only decreases when requests fail.
+    """
+
+    def __init__(
+        self, initial_limit: int, min_limit: int, max_limit: int, tolerance: float
+    ) -> None:
+        """Initialize the limit and its bounds."""
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._min_latency = math.inf
+        self.average_latency = 0.0
+
+    @property
+    def limit(self) -> int:
+        """Get the current number of requests allowed to run concurrently."""
+        return int(self._limit)
+
+    def on_complete(self, latency: float, *, failed: bool = False) -> None:
+        """Adjust the limit according to a completed request."""
+        self._min_latency = min(latency, self._min_latency * MIN_LATENCY_DRIFT)
+        self.average_latency = (
+            latency
+            if self.average_latency == 0
+            else (1 - LATENCY_SMOOTHING) * self.average_latency
+            + LATENCY_SMOOTHING * latency
+        )
+        if failed or latency > self._min_latency * self.tolerance:
+            self._limit = max(self.min_limit, self._limit * LIMIT_DECREASE_FACTOR)
+        else:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+
+class AdmissionController:
+    """Concurrency limit and bounded FIFO queue of a route."""
+
+    def __init__(
+        self,
+        limit: AdaptiveLimit,
+        max_queue_size: int,
+        queue_timeout: float,
+    ) -> None:
+        """Initialize the controller with no running or waiting requests."""
+        self.adaptive_limit = limit
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: collections.deque[asyncio.Future[None]] = collections.deque()
+
+    @property
+    def queue_size(self) -> int:
+        """Get the number of requests waiting to be admitted."""
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Estimate the seconds until the queue drains, at least 1."""
+        limit = self.adaptive_limit
+        drain_time = (self.queue_size + 1) * limit.average_latency / limit.limit
+        return max(1, math.ceil(drain_time))
+
+    @contextlib.asynccontextmanager
+    async def admit(self) -> AsyncIterator[Admission]:
+        """
+        Run the block once the request is admitted, or reject it.
+
+        The block records the status of its response on the admission, so that
+        server errors count as failures whether they are returned or raised.
+        """
+        await self._acquire()
+        start_time = time.perf_counter()
+        admission = Admission()
+        try:
+            yield admission
+        except web.HTTPException as exc:
+            admission.status = exc.status
+            raise
+        finally:
+            self.adaptive_limit.on_complete(
+                time.perf_counter() - start_time, failed=admission.failed
+            )
+            self._release()
+
+    async def _acquire(self) -> None:
+        if self.in_flight < self.adaptive_limit.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        if self.queue_size >= self.max_queue_size:
+            raise AdmissionRejectedError("queue_full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        # A slot handed over by `_release` is already counted in `in_flight`
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except TimeoutError:
+            if _has_slot(waiter):
+                return
+            raise AdmissionRejectedError("queue_timeout", self.retry_after()) from None
+        except asyncio.CancelledError:
+            if _has_slot(waiter):
+                self._release()
+            raise
+        finally:
+            with contextlib.suppress(ValueError):
+                self._waiters.remove(waiter)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.adaptive_limit.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+def _has_slot(waiter: asyncio.Future[None]) -> bool:
+    """Check if a slot was handed to the waiter just before it gave up."""
+    return waiter.done() and not waiter.cancelled()
@@ -1,10 +1,22 @@
+import math
 import typing
 
 import aiohttp
 import aiohttp_cors
 
+from literaflow.api import middlewares
 from literaflow.api.routes import setup_routes
+from literaflow.core import config, logger
 from literaflow.core.db import create_tables
+from literaflow.core.logger import setup_logger
+from literaflow.services import catalog_snapshot, storage_scrub
+from literaflow.services.book_facets import BookFacetService
+from literaflow.services.book_stats import BookStatsService
+from literaflow.services.book_suggestions import (
+    book_suggestions,
+    BookSuggestionService,
+)
+from literaflow.utils import admission, background, book_metadata, compression
 
 OnStartUpArgs = typing.Any
 
@@ -14,9 +26,98 @@ async def setup_database(*_: OnStartUpArgs) -> None:
     await create_tables()
 
 
+async def backfill_book_facets(*_: OnStartUpArgs) -> None:
+    """Count the existing books into a new facet counts table."""
+    await BookFacetService.backfill_counts()
+
+
+async def load_catalog_snapshot(*_: OnStartUpArgs) -> None:
+    """Warm the caches from the catalog snapshot, before they are filled."""
+    await catalog_snapshot.load_snapshot()
+
+
+async def start_catalog_snapshots(*_: OnStartUpArgs) -> None:  # noqa: RUF029
+    """Write the catalog snapshot periodically."""
+    background.run_in_background(catalog_snapshot.save_snapshot_periodically())
+
+
+async def load_book_suggestions(*_: OnStartUpArgs) -> None:
+    """Index the book names and authors for autocomplete, then keep catching up."""
+    new_entries = await BookSuggestionService.catch_up()
+    logger.info(
+        f"Indexed {new_entries} book names and authors for suggestions,"
+        f" {book_suggestions.memory_bytes / 2**20:.1f} MiB in total"
+    )
+    background.run_in_background(BookSuggestionService.catch_up_periodically())
+
+
+async def start_books_precompression(*_: OnStartUpArgs) -> None:  # noqa: RUF029
+    """Pre-compress the stored book files that have no variants yet."""
+    background.run_in_background(
+        compression.precompress_books_dir(config.app_settings.get_books_dir_path())
+    )
+
+
+async def start_book_stats_flushing(*_: OnStartUpArgs) -> None:  # noqa: RUF029
+    """Flush the buffered book download and view counts periodically."""
+    background.run_in_background(BookStatsService.flush_periodically())
+
+
+async def flush_book_stats(*_: OnStartUpArgs) -> None:
+    """Flush the book download and view counts counted since the last flush."""
+    try:
+        await BookStatsService.flush()
+    except Exception as exc:  # noqa: BLE001
+        logger.error(f"Failed to flush the book stats: {exc}")
+
+
+async def start_storage_scrubbing(*_: OnStartUpArgs) -> None:  # noqa: RUF029
+    """Scrub the books directory against the books table periodically."""
+    background.run_in_background(storage_scrub.scrub_storage_periodically())
+
+
+async def flush_logs(*_: OnStartUpArgs) -> None:
+    """Wait for the enqueued log records to be written."""
+    await logger.complete()
+
+
+def create_admission_controllers() -> dict[str, admission.AdmissionController]:
+    """Create the admission controllers of the limited routes."""
+    settings = config.app_settings
+    return {
+        route: admission.AdmissionController(
+            limit=admission.AdaptiveLimit(
+                initial_limit=max_limit,
+                min_limit=settings.ADMISSION_MIN_LIMIT,
+                max_limit=max_limit,
+                tolerance=(
+                    math.inf
+                    if route in settings.ADMISSION_LATENCY_EXEMPT_ROUTES
+                    else settings.ADMISSION_LATENCY_TOLERANCE
+                ),
+            ),
+            max_queue_size=settings.ADMISSION_QUEUE_SIZE,
+            queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+        )
+        for route, max_limit in settings.ADMISSION_ROUTE_LIMITS.items()
+    }
+
+
 def create_app() -> aiohttp.web.Application:
     """Create the application."""
-    app = aiohttp.web.Application()
+    setup_logger()
+    app_middlewares = [
+        middlewares.request_id_middleware,
+        middlewares.metrics_middleware,
+    ]
+    if config.app_settings.ADMISSION_CONTROL_ENABLED:
+        app_middlewares.append(middlewares.admission_middleware)
+    app_middlewares += [
+        middlewares.slow_request_middleware,
+        middlewares.compression_middleware,
+    ]
+    app = aiohttp.web.Application(middlewares=app_middlewares)
+    app[middlewares.ADMISSION_CONTROLLERS] = create_admission_controllers()
     setup_routes(app)
 
     cors = aiohttp_cors.setup(
@@ -33,4 +134,23 @@ def create_app() -> aiohttp.web.Application:
         cors.add(route)
 
     app.on_startup.append(setup_database)
+    app.on_startup.append(backfill_book_facets)
+    if config.app_settings.CATALOG_SNAPSHOT_ENABLED:
+        # Before the suggestions, which only catch up with the snapshot then
+        app.on_startup.append(load_catalog_snapshot)
+        if config.app_settings.CATALOG_SNAPSHOT_INTERVAL_S > 0:
+            app.on_startup.append(start_catalog_snapshots)
+    if config.app_settings.BOOK_SUGGESTIONS_ENABLED:
+        app.on_startup.append(load_book_suggestions)
+    if config.app_settings.PRECOMPRESS_BOOK_FILES:
+        app.on_startup.append(start_books_precompression)
+    if config.app_settings.BOOK_STATS_ENABLED:
+        app.on_startup.append(start_book_stats_flushing)
+    if config.app_settings.STORAGE_SCRUB_INTERVAL_S > 0:
+        app.on_startup.append(start_storage_scrubbing)
+    app.on_cleanup.append(background.cancel_background_tasks)
+    # After the periodic flushing is cancelled, so the two cannot overlap
+    app.on_cleanup.append(flush_book_stats)
+    app.on_cleanup.append(book_metadata.shutdown_extraction_pool)
+    app.on_cleanup.append(flush_logs)
     return app
@@ -0,0 +1,34 @@
+import asyncio
+import typing
+from collections.abc import Coroutine
+
+from literaflow.core import logger
+
+OnCleanUpArgs = typing.Any
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def _log_failures(coro: Coroutine[typing.Any, typing.Any, None]) -> None:
+    try:
+        await coro
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:  # noqa: BLE001
+        logger.error(f"Background task {coro.__qualname__} failed: {exc}")
+
+
+def run_in_background(coro: Coroutine[typing.Any, typing.Any, None]) -> asyncio.Task:
+    """Run a coroutine in the background, keeping a reference to its task."""
+    task = asyncio.create_task(_log_failures(coro))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def cancel_background_tasks(*_: OnCleanUpArgs) -> None:
+    """Cancel the background tasks that are still running."""
+    tasks = list(_background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,403 @@
+"""
+Metadata of ingested book files.
+
+The real format of a downloaded file is sniffed from its first bytes, since
+URLs often lie about it. The embedded title, author, language, page count
+and cover of EPUB, FB2 and PDF books are then extracted in a process pool,
+so parsing large books neither blocks the event loop nor holds the GIL.
+Covers are stored next to the book as a thumbnail.
+"""
+
+import asyncio
+import base64
+import binascii
+import concurrent.futures
+import dataclasses
+import functools
+import io
+import mimetypes
+import multiprocessing
+import pathlib
+import time
+import typing
+import uuid
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+
+# ElementTree does not resolve external entities, and the bundled expat
+# limits entity expansion, so it is safe for book metadata
+from xml.etree import ElementTree  # noqa: S405
+
+from literaflow.core import config, logger, metrics
+from literaflow.utils import page_index
+
+if typing.TYPE_CHECKING:
+    import pypdf
+
+OnCleanUpArgs = typing.Any
+
+# Bytes read from the start of a file to sniff its format
+SNIFF_SIZE = 4096
+
+EXTRACTABLE_FORMATS = frozenset({"epub", "fb2", "pdf"})
+
+COVER_SUFFIX = ".cover"
+COVER_THUMBNAIL_SIZE = (400, 600)
+COVER_THUMBNAIL_QUALITY = 85
+# Extensions of covers stored as they are, when Pillow is not installed
+COVER_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+
+_EPUB_MIMETYPE = b"application/epub+zip"
+# The EPUB mimetype file comes first and uncompressed, right after its
+# 30-byte local header and its 8-byte name
+_EPUB_MIMETYPE_OFFSET = 38
+# Offset, signature and format of the files recognized by their first bytes
+_MAGIC_SIGNATURES = (
+    (0, b"%PDF-", "pdf"),
+    (60, b"BOOKMOBI", "mobi"),
+    (60, b"TEXtREAd", "mobi"),
+    (0, b"AT&TFORM", "djvu"),
+    (0, b"{\\rtf", "rtf"),
+    (0, b"\x1f\x8b", "gz"),
+)
+_UTF8_MAX_CHAR_SIZE = 4
+
+
+class MetadataError(Exception):
+    """The book file's metadata cannot be extracted."""
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class BookMetadata:
+    """Metadata embedded in a book file."""
+
+    page_count: int | None = None
+    language: str | None = None
+    title: str | None = None
+    author: str | None = None
+    cover_path: str | None = None
+
+
+def sniff_format(book_path: str) -> str | None:
+    """Get the format of the file from its magic bytes, or None if unknown."""
+    with pathlib.Path(book_path).open("rb") as book_file:
+        head = book_file.read(SNIFF_SIZE)
+
+    for offset, signature, book_format in _MAGIC_SIGNATURES:
+        if head.startswith(signature, offset):
+            return book_format
+    if head.startswith(b"PK\x03\x04"):
+        return "epub" if _is_epub(book_path, head) else "zip"
+    if b"<FictionBook" in head:
+        return "fb2"
+    if _is_text(head):
+        return "html" if b"<html" in head.lower() else "txt"
+    return None
+
+
+def _is_epub(book_path: str, head: bytes) -> bool:
+    if head[30:_EPUB_MIMETYPE_OFFSET] == b"mimetype":
+        return head[_EPUB_MIMETYPE_OFFSET:].startswith(_EPUB_MIMETYPE)
+    # Sloppy packagers do not put the mimetype first
+    try:
+        with zipfile.ZipFile(book_path) as archive:
+            return archive.read("mimetype").strip() == _EPUB_MIMETYPE
+    except (zipfile.BadZipFile, KeyError):
+        return False
+
+
+def _is_text(head: bytes) -> bool:
+    if not head or b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        # The head may end in the middle of a character
+        return exc.start > len(head) - _UTF8_MAX_CHAR_SIZE and len(head) == SNIFF_SIZE
+    return True
+
+
+def identify_book_file(book_path: str) -> tuple[str, str | None, int]:
+    """
+    Sniff the format of the book file and fix its extension to match.
+
+    Return the path of the file, its format (None if unknown) and its size.
+    """
+    book_format = sniff_format(book_path)
+    path = pathlib.Path(book_path)
+    if book_format is not None and page_index.get_book_format(book_path) != book_format:
+        path = path.rename(path.with_suffix(f".{book_format}"))
+    return str(path), book_format, path.stat().st_size
+
+
+def get_cover_path(book_path: str, extension: str) -> str:
+    """Get the path of the book's cover with the given extension."""
+    return f"{book_path}{COVER_SUFFIX}.{extension}"
+
+
+def save_cover(book_path: str, data: bytes, media_type: str) -> str | None:
+    """Store the cover next to the book, as a thumbnail if Pillow is installed."""
+    try:
+        # Imported on first use: only the extraction processes need it
+        from PIL import Image  # noqa: PLC0415
+    except ImportError:
+        Image = None  # noqa: N806
+
+    if Image is None:
+        extension = COVER_EXTENSIONS.get(media_type)
+        if extension is None:
+            return None
+    else:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.thumbnail(COVER_THUMBNAIL_SIZE)
+                thumbnail = io.BytesIO()
+                image.convert("RGB").save(
+                    thumbnail, "JPEG", quality=COVER_THUMBNAIL_QUALITY, optimize=True
+                )
+        except (OSError, ValueError, Image.DecompressionBombError) as exc:
+            logger.warning(f"Failed to read the cover of {book_path}: {exc}")
+            return None
+        data = thumbnail.getvalue()
+        extension = "jpg"
+
+    cover_path = pathlib.Path(get_cover_path(book_path, extension))
+    partial_cover_path = cover_path.with_name(
+        f"{cover_path.name}.{uuid.uuid4().hex}.part"
+    )
+    try:
+        partial_cover_path.write_bytes(data)
+        partial_cover_path.replace(cover_path)
+    finally:
+        partial_cover_path.unlink(missing_ok=True)
+    return str(cover_path)
+
+
+def _get_local_name(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+def _get_text(element: ElementTree.Element | None) -> str | None:
+    if element is None or element.text is None:
+        return None
+    return " ".join(element.text.split()) or None
+
+
+def _extract_epub(book_path: str) -> tuple[BookMetadata, tuple[bytes, str] | None]:
+    namespaces = page_index.EPUB_NAMESPACES
+    with zipfile.ZipFile(book_path) as archive:
+        package_path, package = page_index.read_epub_package(archive)
+        metadata = package.find("opf:metadata", namespaces)
+        if metadata is None:
+            metadata = ElementTree.Element("metadata")
+        manifest = page_index.get_epub_manifest(package_path, package)
+        media_types = {
+            item.attrib["id"]: item.attrib.get("media-type", "")
+            for item in package.iterfind("opf:manifest/opf:item", namespaces)
+        }
+
+        # EPUB 3 marks the cover in the manifest, EPUB 2 in a meta element
+        cover_id = next(
+            (
+                item.attrib["id"]
+                for item in package.iterfind("opf:manifest/opf:item", namespaces)
+                if "cover-image" in item.attrib.get("properties", "").split()
+            ),
+            None,
+        )
+        if cover_id is None:
+            cover_meta = metadata.find("opf:meta[@name='cover']", namespaces)
+            if cover_meta is not None:
+                cover_id = cover_meta.attrib.get("content")
+        cover = None
+        if cover_id in manifest:
+            cover = archive.read(manifest[cover_id]), media_types[cover_id]
+
+        return BookMetadata(
+            page_count=len(page_index.get_epub_spine(package_path, package)),
+            language=_get_text(metadata.find("dc:language", namespaces)),
+            title=_get_text(metadata.find("dc:title", namespaces)),
+            author=_get_text(metadata.find("dc:creator", namespaces)),
+        ), cover
+
+
+def _get_fb2_author(author: ElementTree.Element) -> str | None:
+    names = {_get_local_name(child.tag): _get_text(child) for child in author}
+    full_name = " ".join(
+        name
+        for name in (
+            names.get("first-name"),
+            names.get("middle-name"),
+            names.get("last-name"),
+        )
+        if name
+    )
+    return full_name or names.get("nickname")
+
+
+def _extract_fb2(book_path: str) -> tuple[BookMetadata, tuple[bytes, str] | None]:
+    data = pathlib.Path(book_path).read_bytes()
+    fields: dict[str, str | None] = {}
+    cover_id = None
+    cover = None
+    for _, element in ElementTree.iterparse(io.BytesIO(data)):  # noqa: S314
+        tag = _get_local_name(element.tag)
+        if tag == "title-info":
+            for child in element:
+                child_tag = _get_local_name(child.tag)
+                if child_tag == "author" and "author" not in fields:
+                    fields["author"] = _get_fb2_author(child)
+                elif child_tag in {"book-title", "lang"}:
+                    fields[child_tag] = _get_text(child)
+                elif child_tag == "coverpage" and len(child):
+                    cover_id = next(
+                        (
+                            value.lstrip("#")
+                            for name, value in child[0].attrib.items()
+                            if _get_local_name(name) == "href"
+                        ),
+                        None,
+                    )
+        elif tag == "binary" and cover_id and element.attrib.get("id") == cover_id:
+            try:
+                cover = (
+                    base64.b64decode(element.text or ""),
+                    element.attrib.get("content-type", ""),
+                )
+            except binascii.Error as exc:
+                logger.warning(f"The cover of {book_path} is not base64: {exc}")
+        if tag in {"section", "binary"}:
+            # The text and the images are not needed once seen
+            element.clear()
+
+    return BookMetadata(
+        page_count=len(page_index.find_fb2_pages(data)),
+        language=fields.get("lang"),
+        title=fields.get("book-title"),
+        author=fields.get("author"),
+    ), cover
+
+
+def _get_pdf_cover(
+    book_path: str, page: "pypdf.PageObject"
+) -> tuple[bytes, str] | None:
+    """Get the first image of the page, taken as the cover of the book."""
+    try:
+        for image in page.images:
+            return image.data, mimetypes.guess_type(image.name)[0] or ""
+    except Exception as exc:  # noqa: BLE001
+        # pypdf decodes images with Pillow and fails in many ways on odd ones
+        logger.warning(f"Failed to read the cover of {book_path}: {exc!r}")
+    return None
+
+
+def _extract_pdf(book_path: str) -> tuple[BookMetadata, tuple[bytes, str] | None]:
+    try:
+        import pypdf  # noqa: PLC0415
+    except ImportError as exc:
+        raise MetadataError("Reading PDF metadata requires the pdf extra") from exc
+
+    try:
+        reader = pypdf.PdfReader(book_path)
+        info = reader.metadata
+        catalog = reader.trailer["/Root"]
+        language = catalog.get("/Lang")
+        if language is not None:
+            language = str(language.get_object()) or None
+        page_count = len(reader.pages)
+    except pypdf.errors.PyPdfError as exc:
+        raise MetadataError(f"Failed to read the PDF file: {exc}") from exc
+
+    return BookMetadata(
+        page_count=page_count,
+        language=language,
+        title=(info.title or None) if info else None,
+        author=(info.author or None) if info else None,
+    ), _get_pdf_cover(book_path, reader.pages[0]) if page_count else None
+
+
+_EXTRACTORS = {
+    "epub": _extract_epub,
+    "fb2": _extract_fb2,
+    "pdf": _extract_pdf,
+}
+
+
+def extract_metadata(book_path: str) -> BookMetadata:
+    """Extract the metadata and the cover of an EPUB, FB2 or PDF book file."""
+    book_format = page_index.get_book_format(book_path)
+    extractor = _EXTRACTORS.get(book_format)
+    if extractor is None:
+        raise MetadataError(
+            f"Books in {book_format or "unknown"} format have no metadata"
+        )
+    try:
+        metadata, cover = extractor(book_path)
+    except (
+        zipfile.BadZipFile,
+        KeyError,
+        ElementTree.ParseError,
+        ValueError,
+        page_index.PageIndexError,
+    ) as exc:
+        raise MetadataError(
+            f"Failed to read the metadata of {book_path}: {exc}"
+        ) from exc
+
+    if cover is not None:
+        metadata = dataclasses.replace(
+            metadata, cover_path=save_cover(book_path, *cover)
+        )
+    return metadata
+
+
+@functools.cache
+def get_extraction_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """Get the worker's pool of metadata extraction processes."""
+    # Forking a process with a running event loop and threads is unsafe
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=config.app_settings.METADATA_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+async def extract_book_metadata(book_path: str) -> BookMetadata:
+    """Extract the book file's metadata in the process pool."""
+    start_time = time.perf_counter()
+    outcome = "error"
+    try:
+        if config.app_settings.METADATA_WORKERS <= 0:
+            metadata = await asyncio.to_thread(extract_metadata, book_path)
+        else:
+            pool = get_extraction_pool()
+            try:
+                metadata = await asyncio.get_running_loop().run_in_executor(
+                    pool, extract_metadata, book_path
+                )
+            except BrokenProcessPool as exc:
+                # A crashed extraction takes the pool down, start a new one
+                get_extraction_pool.cache_clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise MetadataError(
+                    f"Metadata extraction of {book_path} crashed"
+                ) from exc
+        outcome = "success"
+        return metadata
+    finally:
+        metrics.book_metadata_extraction_duration_seconds.observe(
+            time.perf_counter() - start_time, outcome=outcome
+        )
+
+
+async def shutdown_extraction_pool(*_: OnCleanUpArgs) -> None:
+    """Stop the metadata extraction processes, abandoning pending extractions."""
+    if get_extraction_pool.cache_info().currsize:
+        pool = get_extraction_pool()
+        get_extraction_pool.cache_clear()
+        # Running extractions are waited for, so no process outlives the app
+        await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
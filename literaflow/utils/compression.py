@@ -0,0 +1,188 @@
+import asyncio
+import gzip
+import pathlib
+import threading
+import uuid
+from collections.abc import Callable, Sequence
+
+from literaflow.core import logger
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli comes with aiohttp[speedups]
+    brotli = None
+
+GZIP = "gzip"
+BROTLI = "br"
+
+# Preferred first: brotli produces noticeably smaller text payloads.
+SUPPORTED_ENCODINGS: tuple[str, ...] = (BROTLI, GZIP) if brotli else (GZIP,)
+
+# Suffixes aiohttp's FileResponse looks for when it serves a pre-compressed file.
+VARIANT_SUFFIXES = {BROTLI: ".br", GZIP: ".gz"}
+
+# EPUB, PDF and the like are already compressed containers and barely shrink.
+COMPRESSIBLE_BOOK_FORMATS = frozenset({"fb2", "txt", "rtf", "html", "htm", "xml"})
+
+# A variant is only kept when it saves at least this share of the original size.
+MIN_VARIANT_SAVINGS = 0.1
+
+# Empty marker next to a skipped variant, so the file is not compressed again.
+SKIPPED_VARIANT_SUFFIX = ".skip"
+
+# Bodies larger than this are compressed in a thread to keep the loop responsive.
+_OFFLOAD_THRESHOLD = 256 * 1024
+
+_DYNAMIC_GZIP_LEVEL = 6
+_DYNAMIC_BROTLI_QUALITY = 5
+_STATIC_GZIP_LEVEL = 9
+_STATIC_BROTLI_QUALITY = 11
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """Parse an Accept-Encoding header into codings and their q-values."""
+    codings = {}
+    for item in header.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codings[coding.lower()] = quality
+    return codings
+
+
+def negotiate_encoding(header: str, available: Sequence[str]) -> str | None:
+    """Pick the best available content coding accepted by the client."""
+    accepted = parse_accept_encoding(header)
+    best_encoding, best_quality = None, 0.0
+    for encoding in available:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best_encoding, best_quality = encoding, quality
+    return best_encoding
+
+
+def compress(data: bytes, encoding: str, *, static: bool = False) -> bytes:
+    """Compress data with the given content coding."""
+    if encoding == BROTLI and brotli is not None:
+        quality = _STATIC_BROTLI_QUALITY if static else _DYNAMIC_BROTLI_QUALITY
+        return brotli.compress(data, quality=quality)
+    if encoding == GZIP:
+        level = _STATIC_GZIP_LEVEL if static else _DYNAMIC_GZIP_LEVEL
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    raise ValueError(f"Unsupported content coding: {encoding}")
+
+
+async def compress_async(data: bytes, encoding: str) -> bytes:
+    """Compress a response body, off the event loop if it is large."""
+    if len(data) < _OFFLOAD_THRESHOLD:
+        return compress(data, encoding)
+    return await asyncio.to_thread(compress, data, encoding)
+
+
+def is_compressible_book(file_path: str) -> bool:
+    """Check if a stored book file is worth pre-compressing."""
+    return pathlib.Path(file_path).suffix.lstrip(".").lower() in (
+        COMPRESSIBLE_BOOK_FORMATS
+    )
+
+
+def precompress_file(file_path: str) -> list[str]:
+    """
+    Write the compressed variants of a file next to it.
+
+    Variants are served by aiohttp's FileResponse according to the request's
+    Accept-Encoding, so the compression cost is paid once per file.
+    Returns the paths of the variants that exist after the call. Variants that
+    do not save enough are recorded with an empty marker file instead.
+    """
+    source = pathlib.Path(file_path)
+    source_mtime = source.stat().st_mtime
+    data = None
+    variant_paths = []
+
+    for encoding in SUPPORTED_ENCODINGS:
+        variant = source.with_name(source.name + VARIANT_SUFFIXES[encoding])
+        skip_marker = variant.with_name(variant.name + SKIPPED_VARIANT_SUFFIX)
+        if _is_up_to_date(variant, source_mtime):
+            variant_paths.append(str(variant))
+            continue
+        if _is_up_to_date(skip_marker, source_mtime):
+            continue
+
+        if data is None:
+            data = source.read_bytes()
+        compressed = compress(data, encoding, static=True)
+        if len(compressed) > len(data) * (1 - MIN_VARIANT_SAVINGS):
+            skip_marker.touch()
+            continue
+
+        # Several workers may compress the same file, so each one writes its own
+        # partial file and the atomic rename decides which variant stays.
+        partial_variant = variant.with_name(f"{variant.name}.{uuid.uuid4().hex}.part")
+        partial_variant.write_bytes(compressed)
+        partial_variant.replace(variant)
+        variant_paths.append(str(variant))
+        logger.info(
+            f"Pre-compressed {file_path} with {encoding}: "
+            f"{len(data)} -> {len(compressed)} bytes"
+        )
+    return variant_paths
+
+
+def _is_up_to_date(path: pathlib.Path, source_mtime: float) -> bool:
+    """Check if a file derived from the source exists and is not older than it."""
+    try:
+        return path.stat().st_mtime >= source_mtime
+    except FileNotFoundError:
+        return False
+
+
+async def _run_in_thread(
+    func: Callable[..., object], *args: object, on_cancel: Callable[[], None]
+) -> None:
+    """Run a function in a worker thread that is waited for even when cancelled."""
+    thread_future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        await asyncio.shield(thread_future)
+    except asyncio.CancelledError:
+        # A thread cannot be interrupted: it is asked to stop and waited for, so
+        # that it does not outlive the application
+        on_cancel()
+        await asyncio.wait([thread_future])
+        raise
+
+
+async def precompress_book_file(file_path: str) -> None:
+    """Pre-compress a stored book file in a worker thread."""
+    await _run_in_thread(precompress_file, file_path, on_cancel=lambda: None)
+
+
+def _precompress_books_dir(books_dir: str, stopping: threading.Event) -> None:
+    books_dir_path = pathlib.Path(books_dir)
+    if not books_dir_path.is_dir():
+        return
+    for entry in books_dir_path.iterdir():
+        if stopping.is_set():
+            return
+        try:
+            if entry.is_file() and is_compressible_book(str(entry)):
+                precompress_file(str(entry))
+        except OSError as exc:
+            # Files can be deleted or unreadable, the others are compressed
+            logger.warning(f"Failed to pre-compress {entry}: {exc}")
+
+
+async def precompress_books_dir(books_dir: str) -> None:
+    """Pre-compress every compressible book file in the books' directory."""
+    stopping = threading.Event()
+    await _run_in_thread(
+        _precompress_books_dir, books_dir, stopping, on_cancel=stopping.set
+    )
@@ -1,6 +1,5 @@
 from io import BytesIO
 
-import pandas as pd
 from typing_extensions import TypedDict
 
 
@@ -13,6 +12,10 @@ class DeniedBooksDict(TypedDict):
 
 def parse_denied_books(file_content: bytes) -> DeniedBooksDict:
     """Parse the denied books from an XLS file."""
+    # pandas and openpyxl take most of the worker's import time, while the
+    # denied list is uploaded rarely, so they are loaded on the first upload.
+    import pandas as pd  # noqa: PLC0415
+
     f = BytesIO(file_content)
     try:
         sheets = pd.read_excel(f, sheet_name=["name", "author"], engine="openpyxl")
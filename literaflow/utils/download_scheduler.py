@@ -0,0 +1,221 @@
+"""
+Scheduling of book file downloads across origins.
+
+Transfers are capped per origin (scheme, host and port) and in total, and
+waiting transfers are started round-robin across origins, so one bulk feed
+cannot take every slot. Each origin's bytes are paced by a token bucket,
+with an optional bucket for the total bandwidth.
+"""
+
+import asyncio
+import collections
+import contextlib
+import functools
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+import yarl
+
+from literaflow.core import config, metrics
+
+Throttle = Callable[[int], Awaitable[None]]
+
+
+class TokenBucket:
+    """Paces a byte stream to a rate, allowing bursts up to the bucket size."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        """Initialize a full bucket; a rate of 0 disables pacing."""
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def consume(self, amount: int) -> float:
+        """Take the amount from the bucket, waiting while it is in debt."""
+        if self.rate <= 0:
+            return 0.0
+        # Callers are served in arrival order, each waiting off its own debt
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            delay = -self._tokens / self.rate
+            await asyncio.sleep(delay)
+            return delay
+
+
+class DownloadScheduler:
+    """Admits transfers fairly across origins and paces their bytes."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        max_concurrent_transfers: int,
+        max_concurrent_per_origin: int,
+        origin_rate: float = 0,
+        origin_burst: float = 0,
+        total_rate: float = 0,
+        total_burst: float = 0,
+    ) -> None:
+        """Initialize the scheduler with its limits; rates of 0 are unlimited."""
+        self.max_concurrent_transfers = max_concurrent_transfers
+        self.max_concurrent_per_origin = max_concurrent_per_origin
+        self.origin_rate = origin_rate
+        self.origin_burst = origin_burst
+        self._total_bucket = TokenBucket(total_rate, total_burst)
+        self._origin_buckets: dict[str, TokenBucket] = {}
+        self._active: collections.Counter[str] = collections.Counter()
+        self._waiters: dict[str, collections.deque[asyncio.Future[None]]] = {}
+        # Origins with waiting transfers, in the order they get the next slot
+        self._turns: collections.deque[str] = collections.deque()
+        self.throttled_seconds = 0.0
+
+    @property
+    def active_transfers(self) -> int:
+        """Get the number of running transfers."""
+        return self._active.total()
+
+    @property
+    def queued_transfers(self) -> int:
+        """Get the number of transfers waiting for a slot."""
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def active_transfers_of(self, origin: str) -> int:
+        """Get the number of running transfers from an origin."""
+        return self._active[origin]
+
+    @contextlib.asynccontextmanager
+    async def transfer(self, url: str) -> AsyncIterator[Throttle]:
+        """Run a transfer once it gets a slot; pace it with the yielded throttle."""
+        origin = get_origin(url)
+        await self._acquire(origin)
+        try:
+            yield functools.partial(self._throttle, origin)
+        finally:
+            self._release(origin)
+
+    async def _throttle(self, origin: str, amount: int) -> None:
+        origin_bucket = self._origin_buckets.get(origin)
+        if origin_bucket is None:
+            origin_bucket = self._origin_buckets[origin] = TokenBucket(
+                self.origin_rate, self.origin_burst
+            )
+        self.throttled_seconds += await origin_bucket.consume(amount)
+        self.throttled_seconds += await self._total_bucket.consume(amount)
+
+    def _has_free_slot(self, origin: str) -> bool:
+        return (
+            self.active_transfers < self.max_concurrent_transfers
+            and self._active[origin] < self.max_concurrent_per_origin
+        )
+
+    async def _acquire(self, origin: str) -> None:
+        if not self._waiters.get(origin) and self._has_free_slot(origin):
+            self._active[origin] += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        if origin not in self._waiters:
+            self._waiters[origin] = collections.deque()
+            self._turns.append(origin)
+        self._waiters[origin].append(waiter)
+        try:
+            # The slot is counted by `_dispatch` when it resolves the waiter
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(origin)
+            else:
+                self._discard_waiter(origin, waiter)
+            raise
+
+    def _discard_waiter(self, origin: str, waiter: asyncio.Future[None]) -> None:
+        waiters = self._waiters.get(origin)
+        if waiters is None:
+            return
+        with contextlib.suppress(ValueError):
+            waiters.remove(waiter)
+        if not waiters:
+            del self._waiters[origin]
+            # `_dispatch` may have taken the origin's turn already
+            with contextlib.suppress(ValueError):
+                self._turns.remove(origin)
+
+    def _release(self, origin: str) -> None:
+        self._active[origin] -= 1
+        if not self._active[origin]:
+            del self._active[origin]
+            if origin not in self._waiters:
+                # Idle origins start again with a full bucket
+                self._origin_buckets.pop(origin, None)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Start waiting transfers, one per origin in turn, while slots are free."""
+        skipped = 0
+        while (
+            self._turns
+            and skipped < len(self._turns)
+            and self.active_transfers < self.max_concurrent_transfers
+        ):
+            origin = self._turns.popleft()
+            if self._active[origin] >= self.max_concurrent_per_origin:
+                self._turns.append(origin)
+                skipped += 1
+                continue
+            waiters = self._waiters[origin]
+            # Waiters cancelled before they could leave the queue are skipped
+            while waiters and waiters[0].done():
+                waiters.popleft()
+            if waiters:
+                self._active[origin] += 1
+                waiters.popleft().set_result(None)
+            if waiters:
+                self._turns.append(origin)
+            else:
+                del self._waiters[origin]
+            skipped = 0
+
+
+def get_origin(url: str) -> str:
+    """Get the origin of a URL, e.g. `https://example.com:443`."""
+    parsed_url = yarl.URL(url)
+    return f"{parsed_url.scheme}://{parsed_url.host}:{parsed_url.port}"
+
+
+@functools.cache
+def get_download_scheduler() -> DownloadScheduler:
+    """Get the worker's download scheduler."""
+    settings = config.app_settings
+    return DownloadScheduler(
+        max_concurrent_transfers=settings.DOWNLOAD_MAX_CONCURRENT_TRANSFERS,
+        max_concurrent_per_origin=settings.DOWNLOAD_MAX_CONCURRENT_PER_ORIGIN,
+        origin_rate=settings.DOWNLOAD_ORIGIN_RATE_BYTES_PER_S,
+        origin_burst=settings.DOWNLOAD_ORIGIN_BURST_BYTES,
+        total_rate=settings.DOWNLOAD_TOTAL_RATE_BYTES_PER_S,
+        total_burst=settings.DOWNLOAD_TOTAL_BURST_BYTES,
+    )
+
+
+metrics.Gauge(
+    "literaflow_book_downloads_active",
+    "Book file downloads transferring data.",
+    function=lambda: get_download_scheduler().active_transfers,
+)
+metrics.Gauge(
+    "literaflow_book_downloads_queued",
+    "Book file downloads waiting for a transfer slot.",
+    function=lambda: get_download_scheduler().queued_transfers,
+)
+metrics.Counter(
+    "literaflow_book_download_throttled_seconds_total",
+    "Time book file downloads were paced by the byte rate limits.",
+    function=lambda: get_download_scheduler().throttled_seconds,
+)
@@ -0,0 +1,138 @@
+"""
+Serving of stored book files.
+
+In the default direct mode the worker streams the file itself. In the other
+modes the worker only looks the book up and authorizes the download, and the
+bytes are moved by something built for slow clients:
+
+- `x-accel-redirect`: nginx serves the file from an `internal` location
+  mapped to the books directory, named by the `X-Accel-Redirect` header;
+- `x-sendfile`: Apache (mod_xsendfile) or lighttpd serve the absolute path
+  named by the `X-Sendfile` header;
+- `signed-url`: the client is redirected to a static file tier with a URL
+  that is valid until it expires, signed with HMAC-SHA256 (see
+  `verify_signature`).
+"""
+
+import base64
+import hashlib
+import hmac
+import mimetypes
+import pathlib
+import time
+import urllib.parse
+
+from aiohttp import hdrs, web
+
+from literaflow.core import config, logger
+from literaflow.utils import http_statuses
+
+DIRECT = "direct"
+X_ACCEL_REDIRECT = "x-accel-redirect"
+X_SENDFILE = "x-sendfile"
+SIGNED_URL = "signed-url"
+
+X_ACCEL_REDIRECT_HEADER = "X-Accel-Redirect"
+X_SENDFILE_HEADER = "X-Sendfile"
+
+EXPIRES_PARAM = "expires"
+SIGNATURE_PARAM = "signature"
+
+
+def get_storage_key(file_path: str) -> str | None:
+    """Get the path of the file relative to the books directory, if it is in it."""
+    try:
+        relative_path = (
+            pathlib.Path(file_path)
+            .resolve()
+            .relative_to(
+                pathlib.Path(config.app_settings.get_books_dir_path()).resolve()
+            )
+        )
+    except ValueError:
+        return None
+    return relative_path.as_posix()
+
+
+def sign(storage_key: str, expires: int, key: bytes) -> str:
+    """Sign a storage key until an expiry time, as URL-safe base64 without padding."""
+    digest = hmac.new(key, f"{storage_key}\n{expires}".encode(), hashlib.sha256)
+    return base64.urlsafe_b64encode(digest.digest()).rstrip(b"=").decode()
+
+
+def verify_signature(
+    storage_key: str,
+    expires: str,
+    signature: str,
+    key: bytes,
+    now: float | None = None,
+) -> bool:
+    """
+    Check the signature of a signed URL, for the static file tier.
+
+    The tier serves `<base URL><storage key>?expires=<unix time>&signature=<...>`
+    only while the URL has not expired and its signature is
+    `sign(storage_key, expires, key)`.
+    """
+    if not expires.isdigit() or int(expires) < (time.time() if now is None else now):
+        return False
+    return hmac.compare_digest(sign(storage_key, int(expires), key), signature)
+
+
+def build_signed_url(storage_key: str, now: float | None = None) -> str:
+    """Build a URL of the file on the static file tier, valid for a limited time."""
+    settings = config.app_settings
+    expires = int(time.time() if now is None else now) + settings.FILE_SERVING_URL_TTL_S
+    signature = sign(
+        storage_key,
+        expires,
+        settings.FILE_SERVING_SIGNING_KEY.get_secret_value().encode(),
+    )
+    query = urllib.parse.urlencode({EXPIRES_PARAM: expires, SIGNATURE_PARAM: signature})
+    return (
+        f"{settings.FILE_SERVING_SIGNED_URL_BASE.rstrip("/")}/"
+        f"{urllib.parse.quote(storage_key)}?{query}"
+    )
+
+
+def _get_content_type(file_path: str) -> str:
+    return mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+
+
+def create_file_response(file_path: str) -> web.StreamResponse:
+    """Create the response that serves a book file in the configured mode."""
+    settings = config.app_settings
+    mode = settings.FILE_SERVING_MODE
+    if mode == DIRECT:
+        # FileResponse sends the pre-compressed variant of the file (see
+        # utils.compression) when the client accepts its encoding.
+        return web.FileResponse(path=file_path)
+    if mode == X_SENDFILE:
+        return web.Response(
+            headers={X_SENDFILE_HEADER: str(pathlib.Path(file_path).resolve())},
+            content_type=_get_content_type(file_path),
+        )
+
+    storage_key = get_storage_key(file_path)
+    if storage_key is None:
+        logger.error(f"Book file {file_path} is outside the books directory")
+        return web.FileResponse(path=file_path)
+    if mode == X_ACCEL_REDIRECT:
+        internal_prefix = settings.FILE_SERVING_INTERNAL_PREFIX.rstrip("/")
+        # The proxy takes the content type from the response, not the file
+        return web.Response(
+            headers={
+                X_ACCEL_REDIRECT_HEADER: (
+                    f"{internal_prefix}/{urllib.parse.quote(storage_key)}"
+                )
+            },
+            content_type=_get_content_type(file_path),
+        )
+    return web.Response(
+        status=http_statuses.HTTP_307_TEMPORARY_REDIRECT,
+        headers={
+            hdrs.LOCATION: build_signed_url(storage_key),
+            # The URL expires, so neither the client nor proxies may reuse it
+            hdrs.CACHE_CONTROL: "no-store",
+        },
+    )
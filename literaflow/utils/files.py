@@ -1,37 +1,299 @@
 import asyncio
+import contextlib
+import dataclasses
+import hashlib
+import pathlib
+import random
+import re
+import time
 
 import aiofiles
+import aiofiles.os
 import aiohttp
+from aiohttp import hdrs
 
-from literaflow.core import logger
-from literaflow.utils import http_statuses
+from literaflow.core import config, logger, metrics
+from literaflow.utils import download_scheduler, http_statuses
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+PARTIAL_FILE_SUFFIX = ".part"
+
+# Statuses worth retrying: the origin may succeed on a later attempt
+RETRYABLE_STATUSES = frozenset({
+    http_statuses.HTTP_408_REQUEST_TIMEOUT,
+    http_statuses.HTTP_429_TOO_MANY_REQUESTS,
+    http_statuses.HTTP_500_INTERNAL_SERVER_ERROR,
+    http_statuses.HTTP_502_BAD_GATEWAY,
+    http_statuses.HTTP_503_SERVICE_UNAVAILABLE,
+    http_statuses.HTTP_504_GATEWAY_TIMEOUT,
+})
+
+_CONTENT_RANGE_PATTERN = re.compile(r"bytes (?:(\d+)-\d+|\*)/(\d+|\*)")
+
+
+class IncompleteDownloadError(aiohttp.ClientPayloadError):
+    """The response body does not match the announced length."""
+
+
+class _RetryableStatusError(aiohttp.ClientResponseError):
+    """The origin answered with a status worth retrying."""
+
+
+def get_partial_file_path(destination_path: str) -> str:
+    """Get the path the file is downloaded to before it is complete."""
+    return destination_path + PARTIAL_FILE_SUFFIX
+
+
+def get_file_checksum(path: str) -> str:
+    """Get the hex SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with pathlib.Path(path).open("rb") as f:
+        while chunk := f.read(CHECKSUM_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Get the delay before the next attempt: exponential with full jitter."""
+    settings = config.app_settings
+    max_delay = settings.DOWNLOAD_BACKOFF_MAX_MS / 1000
+    delay = random.uniform(  # noqa: S311
+        0, min(max_delay, settings.DOWNLOAD_BACKOFF_BASE_MS / 1000 * 2 ** (attempt - 1))
+    )
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, max_delay))
+    return delay
+
+
+def _get_retry_after(exc: aiohttp.ClientResponseError) -> float | None:
+    raw_value = (exc.headers or {}).get(hdrs.RETRY_AFTER, "")
+    return float(raw_value) if raw_value.isdigit() else None
+
+
+def _get_content_range(resp: aiohttp.ClientResponse) -> tuple[int | None, int | None]:
+    """Get the start offset and the total length from Content-Range."""
+    match = _CONTENT_RANGE_PATTERN.fullmatch(resp.headers.get(hdrs.CONTENT_RANGE, ""))
+    if match is None:
+        return None, None
+    start, total = match.groups()
+    return (
+        int(start) if start is not None else None,
+        int(total) if total != "*" else None,
+    )
+
+
+async def _get_file_size(path: str) -> int:
+    try:
+        return (await aiofiles.os.stat(path)).st_size
+    except FileNotFoundError:
+        return 0
+
+
+async def remove_file(path: str) -> None:
+    """Remove a file if it exists."""
+    with contextlib.suppress(FileNotFoundError):
+        await aiofiles.os.remove(path)
+
+
+def _raise_for_status(resp: aiohttp.ClientResponse) -> None:
+    """Raise for error statuses, retryably for those worth another attempt."""
+    if resp.status in RETRYABLE_STATUSES:
+        raise _RetryableStatusError(
+            resp.request_info,
+            resp.history,
+            status=resp.status,
+            message=resp.reason or "",
+            headers=resp.headers,
+        )
+    resp.raise_for_status()
+
+
+@dataclasses.dataclass
+class _DownloadProgress:
+    """Progress of a download over all its attempts."""
+
+    # Bytes written to the partial file, by failed attempts too
+    received: int = 0
+    # ETag or Last-Modified of the first response, to resume with
+    validator: str | None = None
+
+
+async def _download_attempt(
+    session: aiohttp.ClientSession,
+    file_to_download_url: str,
+    partial_path: str,
+    progress: _DownloadProgress,
+    throttle: download_scheduler.Throttle,
+) -> None:
+    """Download the file, or its missing part, to the partial file."""
+    offset = await _get_file_size(partial_path)
+    # Lengths and ranges are checked against the bytes as stored, not as a
+    # content coding of the origin would transfer them
+    headers = {hdrs.ACCEPT_ENCODING: "identity"}
+    if offset:
+        headers[hdrs.RANGE] = f"bytes={offset}-"
+        if progress.validator is not None:
+            # Resume only if the file has not changed since the first attempt
+            headers[hdrs.IF_RANGE] = progress.validator
+
+    # Opened before the request: waiting for the file to open between the
+    # response headers and the first read would let a dropped connection
+    # discard the body bytes already received
+    async with (
+        aiofiles.open(partial_path, mode="ab") as f,
+        session.get(file_to_download_url, headers=headers) as resp,
+    ):
+        if resp.status == http_statuses.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE:
+            _, total = _get_content_range(resp)
+            if total == offset:
+                return
+            # The partial file does not match the origin's file, start over
+            await remove_file(partial_path)
+            raise IncompleteDownloadError("Partial file exceeds the remote file")
+
+        _raise_for_status(resp)
+
+        start, total = _get_content_range(resp)
+        if resp.status == http_statuses.HTTP_200_OK:
+            total = resp.content_length
+            if offset:
+                # The origin ignored the range (or the file changed), start over
+                offset = 0
+                await f.truncate(0)
+        elif resp.status != http_statuses.HTTP_206_PARTIAL_CONTENT or start != offset:
+            await remove_file(partial_path)
+            raise IncompleteDownloadError(
+                f"Unexpected response to a range request: {resp.status}"
+            )
+
+        progress.validator = resp.headers.get(hdrs.ETAG) or resp.headers.get(
+            hdrs.LAST_MODIFIED
+        )
+        received = 0
+        async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+            await f.write(chunk)
+            received += len(chunk)
+            progress.received += len(chunk)
+            await throttle(len(chunk))
+
+    if total is not None and offset + received != total:
+        raise IncompleteDownloadError(
+            f"Received {offset + received} of {total} bytes of {file_to_download_url}"
+        )
+
+
+async def _download_with_retries(
+    session: aiohttp.ClientSession,
+    file_to_download_url: str,
+    partial_path: str,
+    progress: _DownloadProgress,
+    throttle: download_scheduler.Throttle,
+) -> None:
+    """Download the file to the partial file, retrying failed attempts."""
+    settings = config.app_settings
+    attempt = 1
+    while True:
+        try:
+            await _download_attempt(
+                session, file_to_download_url, partial_path, progress, throttle
+            )
+        except (
+            _RetryableStatusError,
+            aiohttp.ClientConnectionError,
+            aiohttp.ClientPayloadError,
+            TimeoutError,
+        ) as exc:
+            if attempt >= settings.DOWNLOAD_MAX_ATTEMPTS:
+                raise
+            retry_after = (
+                _get_retry_after(exc)
+                if isinstance(exc, _RetryableStatusError)
+                else None
+            )
+            delay = get_backoff_delay(attempt, retry_after)
+            logger.warning(
+                f"Attempt {attempt} to download {file_to_download_url} "
+                f"failed: {exc!r}, retrying in {delay:.2f} seconds"
+            )
+            metrics.book_download_retries_total.inc()
+            await asyncio.sleep(delay)
+            attempt += 1
+        else:
+            return
 
 
 async def download_file(
     file_to_download_url: str,
     destination_path: str,
-    download_timeout: int = 120,
+    download_timeout: float | None = None,
 ) -> None:
-    """Download a file from a URL to a destination path."""
-    try:
-        async with (
-            asyncio.timeout(download_timeout),
-            aiohttp.ClientSession() as session,
-            session.get(file_to_download_url) as resp,
-        ):
-            if resp.status == http_statuses.HTTP_200_OK:
-                async with aiofiles.open(destination_path, mode="wb") as f:
-                    content = await resp.read()
-                    await f.write(content)
-                logger.info(
-                    f"Successfully downloaded {file_to_download_url} to {destination_path}"
-                )
-            else:
-                logger.error(
-                    f"Failed to download {file_to_download_url}: Status {resp.status}"
+    """
+    Download a file from a URL to a destination path.
+
+    The download waits for a slot of the URL's origin in the download
+    scheduler, which also paces its bytes. Failed attempts are retried with
+    jittered exponential backoff, resuming from the bytes already received
+    when the origin supports ranges. The file appears at the destination
+    path only once it is complete; errors are raised after the last attempt,
+    and non-retryable HTTP statuses are raised at once as
+    `aiohttp.ClientResponseError`.
+    """
+    settings = config.app_settings
+    if download_timeout is None:
+        download_timeout = settings.DOWNLOAD_TIMEOUT_S
+    partial_path = get_partial_file_path(destination_path)
+    client_timeout = aiohttp.ClientTimeout(sock_read=settings.DOWNLOAD_READ_TIMEOUT_S)
+    scheduler = download_scheduler.get_download_scheduler()
+
+    queued_at = time.perf_counter()
+    async with scheduler.transfer(file_to_download_url) as throttle:
+        start_time = time.perf_counter()
+        metrics.book_download_queue_duration_seconds.observe(start_time - queued_at)
+        outcome = "error"
+        progress = _DownloadProgress()
+        try:
+            async with (
+                asyncio.timeout(download_timeout),
+                aiohttp.ClientSession(
+                    timeout=client_timeout, auto_decompress=False
+                ) as session,
+            ):
+                await _download_with_retries(
+                    session, file_to_download_url, partial_path, progress, throttle
                 )
-    except TimeoutError as exc:
-        logger.error(
-            f"Download of {file_to_download_url} timed out after {download_timeout} seconds"
-        )
-        raise exc
+
+            await aiofiles.os.replace(partial_path, destination_path)
+            outcome = "success"
+            logger.info(
+                f"Successfully downloaded {file_to_download_url} to {destination_path}"
+            )
+        except aiohttp.ServerTimeoutError:
+            # Also a TimeoutError, but of the last attempt's read, not the whole
+            # download's
+            outcome = "timeout"
+            logger.error(
+                f"Download of {file_to_download_url} received no data for "
+                f"{settings.DOWNLOAD_READ_TIMEOUT_S} seconds"
+            )
+            raise
+        except TimeoutError:
+            outcome = "timeout"
+            logger.error(
+                f"Download of {file_to_download_url} timed out after "
+                f"{download_timeout} seconds"
+            )
+            raise
+        except aiohttp.ClientResponseError as exc:
+            outcome = "http_error"
+            logger.error(
+                f"Failed to download {file_to_download_url}: Status {exc.status}"
+            )
+            raise
+        finally:
+            if outcome != "success":
+                await remove_file(partial_path)
+            metrics.book_download_bytes_total.inc(progress.received)
+            metrics.book_download_duration_seconds.observe(
+                time.perf_counter() - start_time, outcome=outcome
+            )
@@ -0,0 +1,412 @@
+"""
+Page indexes for reading books online one page at a time.
+
+A book's index is built once and stored next to the file as a JSON sidecar
+listing the byte range of each page: a section of an FB2 file, a spine
+document of an EPUB file (a range of the ZIP archive) or, for PDF files,
+the page's text in a second sidecar. Reading a page is then a seek and a
+read of one range instead of parsing the whole book.
+"""
+
+import asyncio
+import codecs
+import dataclasses
+import functools
+import html.parser
+import io
+import json
+import pathlib
+import posixpath
+import re
+import struct
+import urllib.parse
+import uuid
+import zipfile
+import zlib
+
+# ElementTree does not resolve external entities, and the bundled expat
+# limits entity expansion, so it is safe for EPUB package documents
+from xml.etree import ElementTree  # noqa: S405
+
+from literaflow.core import logger
+from literaflow.utils.single_flight import SingleFlight
+
+INDEX_SUFFIX = ".pageindex"
+# Extracted text of the pages of formats without a readable markup (PDF)
+TEXT_SUFFIX = ".pagetext"
+INDEX_VERSION = 1
+
+SOURCE_BOOK = "book"
+SOURCE_TEXT = "text"
+
+PAGINATED_FORMATS = frozenset({"epub", "fb2", "pdf"})
+
+_FB2_ENCODING_PATTERN = re.compile(rb"<\?xml[^>]*encoding=[\"']([\w.-]+)[\"']")
+_FB2_BODY_PATTERN = re.compile(rb"<body[\s>].*?</body>", re.DOTALL)
+_FB2_SECTION_TAG_PATTERN = re.compile(rb"<(/?)section[\s>]")
+_TITLE_PATTERN = re.compile(r"<(title|h[1-3])[\s>].*?</\1>", re.DOTALL | re.IGNORECASE)
+
+# Size of a ZIP local file header before the file name and the extra field
+_ZIP_LOCAL_HEADER = struct.Struct("<4s22xHH")
+EPUB_NAMESPACES = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+    "dc": "http://purl.org/dc/elements/1.1/",
+}
+
+# Concurrent first reads of a book share one index build
+index_builds = SingleFlight()
+
+
+class PageIndexError(Exception):
+    """The book cannot be paginated."""
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Page:
+    """A page of a book as served to readers."""
+
+    number: int
+    page_count: int
+    title: str | None
+    text: str
+
+
+class _TextExtractor(html.parser.HTMLParser):
+    """Collects the text of XHTML/FB2 markup, one line per block element."""
+
+    BLOCK_TAGS = frozenset(
+        {"p", "div", "br", "li", "tr", "title", "section", "subtitle", "v", "stanza"}
+        | {f"h{level}" for level in range(1, 7)}
+    )
+    SKIPPED_TAGS = frozenset({"script", "style", "head", "binary"})
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self._parts: list[str] = []
+        self._skipped_depth = 0
+
+    def handle_starttag(self, tag: str, _: list) -> None:
+        tag = tag.rpartition(":")[2]
+        if tag in self.SKIPPED_TAGS:
+            self._skipped_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        tag = tag.rpartition(":")[2]
+        if tag in self.SKIPPED_TAGS:
+            self._skipped_depth = max(0, self._skipped_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_data(self, data: str) -> None:
+        if not self._skipped_depth:
+            self._parts.append(data)
+
+    def get_text(self) -> str:
+        lines = (" ".join(line.split()) for line in "".join(self._parts).splitlines())
+        return "\n".join(line for line in lines if line)
+
+
+def extract_text(markup: str) -> str:
+    """Get the readable text of XHTML or FB2 markup."""
+    extractor = _TextExtractor()
+    extractor.feed(markup)
+    extractor.close()
+    return extractor.get_text()
+
+
+def _find_title(markup: str) -> str | None:
+    match = _TITLE_PATTERN.search(markup)
+    if match is None:
+        return None
+    return extract_text(match[0]).replace("\n", " ") or None
+
+
+def get_index_path(book_path: str) -> str:
+    """Get the path of the book's page index."""
+    return book_path + INDEX_SUFFIX
+
+
+def get_text_path(book_path: str) -> str:
+    """Get the path of the extracted page texts of the book."""
+    return book_path + TEXT_SUFFIX
+
+
+def get_book_format(book_path: str) -> str:
+    """Get the book's format from its file extension."""
+    return pathlib.Path(book_path).suffix.lstrip(".").lower()
+
+
+def is_paginated_book(book_path: str) -> bool:
+    """Check if the book's format can be read page by page."""
+    return get_book_format(book_path) in PAGINATED_FORMATS
+
+
+def get_fb2_encoding(data: bytes) -> str:
+    """Get the encoding declared in the FB2 file's XML prolog, utf-8 if unknown."""
+    encoding_match = _FB2_ENCODING_PATTERN.search(data, 0, 200)
+    if encoding_match is None:
+        return "utf-8"
+    encoding = encoding_match[1].decode(errors="replace")
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return "utf-8"
+    return encoding
+
+
+def find_fb2_pages(data: bytes) -> list[tuple[int, int]]:
+    """Find the offset and length of the innermost sections of the main body."""
+    # Later bodies hold notes and comments, not the text of the book
+    body = _FB2_BODY_PATTERN.search(data)
+    if body is None:
+        raise PageIndexError("The FB2 file has no body")
+
+    pages = []
+    open_sections: list[tuple[int, bool]] = []
+    for tag in _FB2_SECTION_TAG_PATTERN.finditer(data, body.start(), body.end()):
+        if not tag[1]:
+            if open_sections:
+                # The parent section is not a page, only its innermost children
+                open_sections[-1] = (open_sections[-1][0], True)
+            open_sections.append((tag.start(), False))
+            continue
+        if not open_sections:
+            continue
+        start, has_subsections = open_sections.pop()
+        if not has_subsections:
+            end = data.index(b">", tag.end() - 1) + 1
+            pages.append((start, end - start))
+
+    return pages or [(body.start(), body.end() - body.start())]
+
+
+def _build_fb2_pages(book_path: str) -> tuple[list[dict], str]:
+    """Index the innermost sections of the FB2 file's main body."""
+    data = pathlib.Path(book_path).read_bytes()
+    encoding = get_fb2_encoding(data)
+    pages = []
+    for offset, length in find_fb2_pages(data):
+        markup = data[offset : offset + length].decode(encoding, errors="replace")
+        pages.append({"offset": offset, "length": length, "title": _find_title(markup)})
+    return pages, encoding
+
+
+def _get_zip_member_data_offset(
+    book_file: io.BufferedReader, info: zipfile.ZipInfo
+) -> int:
+    book_file.seek(info.header_offset)
+    signature, name_length, extra_length = _ZIP_LOCAL_HEADER.unpack(
+        book_file.read(_ZIP_LOCAL_HEADER.size)
+    )
+    if signature != b"PK\x03\x04":
+        raise PageIndexError(f"Bad ZIP local header of {info.filename}")
+    return info.header_offset + _ZIP_LOCAL_HEADER.size + name_length + extra_length
+
+
+def read_epub_package(archive: zipfile.ZipFile) -> tuple[str, ElementTree.Element]:
+    """Get the path and the parsed package document (OPF) of an EPUB archive."""
+    container = ElementTree.fromstring(  # noqa: S314
+        archive.read("META-INF/container.xml")
+    )
+    rootfile = container.find(".//container:rootfile", EPUB_NAMESPACES)
+    if rootfile is None:
+        raise PageIndexError("The EPUB file has no package document")
+    package_path = rootfile.attrib["full-path"]
+    return package_path, ElementTree.fromstring(archive.read(package_path))  # noqa: S314
+
+
+def get_epub_manifest(package_path: str, package: ElementTree.Element) -> dict:
+    """Map the IDs of the EPUB package's manifest items to their archive members."""
+    return {
+        item.attrib["id"]: posixpath.normpath(
+            posixpath.join(
+                posixpath.dirname(package_path),
+                urllib.parse.unquote(item.attrib["href"].partition("#")[0]),
+            )
+        )
+        for item in package.iterfind("opf:manifest/opf:item", EPUB_NAMESPACES)
+    }
+
+
+def get_epub_spine(package_path: str, package: ElementTree.Element) -> list[str]:
+    """Get the archive members of the EPUB package's spine, in reading order."""
+    manifest = get_epub_manifest(package_path, package)
+    return [
+        manifest[itemref.attrib["idref"]]
+        for itemref in package.iterfind("opf:spine/opf:itemref", EPUB_NAMESPACES)
+        if itemref.attrib.get("idref") in manifest
+    ]
+
+
+def _build_epub_pages(book_path: str) -> tuple[list[dict], str]:
+    """Index the EPUB file's spine documents as ranges of the ZIP archive."""
+    with (
+        pathlib.Path(book_path).open("rb") as book_file,
+        zipfile.ZipFile(book_file) as archive,
+    ):
+        pages = []
+        for member_name in get_epub_spine(*read_epub_package(archive)):
+            info = archive.getinfo(member_name)
+            if info.compress_type not in {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED}:
+                raise PageIndexError(f"Unsupported compression of {member_name}")
+            pages.append({
+                "offset": _get_zip_member_data_offset(book_file, info),
+                "length": info.compress_size,
+                "compression": info.compress_type,
+                "title": _find_title(
+                    archive.read(info).decode("utf-8", errors="replace")
+                ),
+            })
+    if not pages:
+        raise PageIndexError("The EPUB file has an empty spine")
+    return pages, "utf-8"
+
+
+def _build_pdf_pages(book_path: str) -> tuple[list[dict], str]:
+    """Extract the PDF file's page texts to the text sidecar."""
+    try:
+        import pypdf  # noqa: PLC0415
+    except ImportError as exc:
+        raise PageIndexError("Reading PDF books requires the pdf extra") from exc
+
+    pages = []
+    offset = 0
+    text_path = pathlib.Path(get_text_path(book_path))
+    partial_text_path = text_path.with_name(f"{text_path.name}.{uuid.uuid4().hex}.part")
+    try:
+        with partial_text_path.open("wb") as text_file:
+            try:
+                pdf_pages = pypdf.PdfReader(book_path).pages
+            except pypdf.errors.PyPdfError as exc:
+                raise PageIndexError(f"Failed to read the PDF file: {exc}") from exc
+            for pdf_page in pdf_pages:
+                text = pdf_page.extract_text().encode()
+                text_file.write(text)
+                pages.append({"offset": offset, "length": len(text), "title": None})
+                offset += len(text)
+        partial_text_path.replace(text_path)
+    finally:
+        partial_text_path.unlink(missing_ok=True)
+    return pages, "utf-8"
+
+
+_PAGE_BUILDERS = {
+    "epub": (_build_epub_pages, SOURCE_BOOK),
+    "fb2": (_build_fb2_pages, SOURCE_BOOK),
+    "pdf": (_build_pdf_pages, SOURCE_TEXT),
+}
+
+
+def build_index(book_path: str) -> dict:
+    """Build the book's page index and store it next to the file."""
+    book_format = get_book_format(book_path)
+    if book_format not in _PAGE_BUILDERS:
+        raise PageIndexError(
+            f"Books in {book_format or "unknown"} format have no pages"
+        )
+    build_pages, source = _PAGE_BUILDERS[book_format]
+    try:
+        pages, encoding = build_pages(book_path)
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError, ValueError) as exc:
+        raise PageIndexError(f"Failed to paginate {book_path}: {exc}") from exc
+
+    index = {
+        "version": INDEX_VERSION,
+        "format": book_format,
+        "source": source,
+        "encoding": encoding,
+        "pages": pages,
+    }
+    index_path = pathlib.Path(get_index_path(book_path))
+    # Several workers may index the same book; the atomic rename picks one
+    partial_index_path = index_path.with_name(
+        f"{index_path.name}.{uuid.uuid4().hex}.part"
+    )
+    try:
+        partial_index_path.write_text(json.dumps(index), encoding="utf-8")
+        partial_index_path.replace(index_path)
+    finally:
+        partial_index_path.unlink(missing_ok=True)
+    logger.info(f"Indexed {len(pages)} pages of {book_path}")
+    return index
+
+
+@functools.lru_cache(maxsize=1024)
+def _load_index(index_path: str, _mtime_ns: int) -> dict:
+    # The modification time is part of the cache key, so rebuilt indexes are
+    # read again
+    return json.loads(pathlib.Path(index_path).read_text(encoding="utf-8"))
+
+
+def load_index(book_path: str) -> dict | None:
+    """Load the book's stored page index, if it is up to date."""
+    index_path = pathlib.Path(get_index_path(book_path))
+    try:
+        index_mtime_ns = index_path.stat().st_mtime_ns
+        book_mtime_ns = pathlib.Path(book_path).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if index_mtime_ns < book_mtime_ns:
+        return None
+    index = _load_index(str(index_path), index_mtime_ns)
+    if index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def _read_page(book_path: str, index: dict, page_number: int) -> Page:
+    page = index["pages"][page_number - 1]
+    source_path = (
+        book_path if index["source"] == SOURCE_BOOK else get_text_path(book_path)
+    )
+    with pathlib.Path(source_path).open("rb") as source_file:
+        source_file.seek(page["offset"])
+        data = source_file.read(page["length"])
+    if page.get("compression") == zipfile.ZIP_DEFLATED:
+        try:
+            data = zlib.decompress(data, wbits=-zlib.MAX_WBITS)
+        except zlib.error as exc:
+            raise PageIndexError(
+                f"Failed to decompress page {page_number} of {book_path}: {exc}"
+            ) from exc
+
+    text = data.decode(index["encoding"], errors="replace")
+    if index["source"] == SOURCE_BOOK:
+        text = extract_text(text)
+    return Page(
+        number=page_number,
+        page_count=len(index["pages"]),
+        title=page.get("title"),
+        text=text,
+    )
+
+
+async def get_index(book_path: str) -> dict:
+    """Get the book's page index, building it on first use."""
+    index = await asyncio.to_thread(load_index, book_path)
+    if index is None:
+        index = await index_builds.do(
+            book_path, lambda: asyncio.to_thread(build_index, book_path)
+        )
+    return index
+
+
+async def read_page(book_path: str, page_number: int) -> Page | None:
+    """Read a page of the book, or None if the book has no such page."""
+    index = await get_index(book_path)
+    if not 1 <= page_number <= len(index["pages"]):
+        return None
+    return await asyncio.to_thread(_read_page, book_path, index, page_number)
+
+
+async def index_book_file(book_path: str) -> None:
+    """Build the book's page index in a worker thread, logging failures."""
+    try:
+        await index_builds.do(
+            book_path, lambda: asyncio.to_thread(build_index, book_path)
+        )
+    except PageIndexError as exc:
+        logger.warning(f"Book {book_path} is not readable online: {exc}")
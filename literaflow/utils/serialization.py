@@ -0,0 +1,105 @@
+import functools
+import json
+import typing
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+
+from aiohttp import web
+
+from literaflow.core import config, profiling
+from literaflow.utils import http_statuses
+
+JSONDumps = Callable[[typing.Any], bytes]
+JSONLoads = Callable[[str | bytes], typing.Any]
+
+
+def _stdlib_dumps(obj: typing.Any) -> bytes:  # noqa: ANN401
+    return json.dumps(obj).encode()
+
+
+@functools.cache
+def _get_backend() -> tuple[JSONDumps, JSONLoads]:
+    """Get the configured JSON backend."""
+    if config.app_settings.JSON_BACKEND == "orjson":
+        import orjson  # noqa: PLC0415
+
+        return orjson.dumps, orjson.loads
+    return _stdlib_dumps, json.loads
+
+
+def dumps(obj: typing.Any) -> bytes:  # noqa: ANN401
+    """Serialize an object to JSON bytes with the configured backend."""
+    backend_dumps, _ = _get_backend()
+    with profiling.phase(profiling.PHASE_SERIALIZATION):
+        return backend_dumps(obj)
+
+
+def loads(data: str | bytes) -> typing.Any:  # noqa: ANN401
+    """Deserialize JSON with the configured backend."""
+    _, backend_loads = _get_backend()
+    return backend_loads(data)
+
+
+def encode_array(fragments: Iterable[bytes]) -> bytes:
+    """Join pre-encoded JSON values into a JSON array."""
+    with profiling.phase(profiling.PHASE_SERIALIZATION):
+        return b"[" + b",".join(fragments) + b"]"
+
+
+def json_response(
+    data: typing.Any = None,  # noqa: ANN401
+    *,
+    body: bytes | None = None,
+    status: int = http_statuses.HTTP_200_OK,
+) -> web.Response:
+    """Create a JSON response, either from data or from a pre-encoded body."""
+    if body is None:
+        body = dumps(data)
+    return web.json_response(body=body, status=status)
+
+
+class FragmentCache:
+    """LRU cache of pre-encoded JSON fragments."""
+
+    def __init__(self, maxsize: int) -> None:
+        """Initialize the cache with the maximum number of fragments."""
+        self.maxsize = maxsize
+        self._fragments: OrderedDict[Hashable, bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Get the number of cached fragments."""
+        return len(self._fragments)
+
+    def get_or_encode(self, key: Hashable, build: Callable[[], typing.Any]) -> bytes:
+        """Get a cached fragment or encode the built object and cache it."""
+        fragment = self._fragments.get(key)
+        if fragment is not None:
+            self._fragments.move_to_end(key)
+            return fragment
+
+        fragment = dumps(build())
+        self.put(key, fragment)
+        return fragment
+
+    def items(self) -> list[tuple[Hashable, bytes]]:
+        """Get the cached fragments and their keys, least recently used first."""
+        return list(self._fragments.items())
+
+    def put(self, key: Hashable, fragment: bytes) -> None:
+        """Cache an encoded fragment as the most recently used one."""
+        if self.maxsize <= 0:
+            return
+        self._fragments[key] = fragment
+        self._fragments.move_to_end(key)
+        if len(self._fragments) > self.maxsize:
+            self._fragments.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached fragments."""
+        self._fragments.clear()
+
+
+@functools.cache
+def get_fragment_cache() -> FragmentCache:
+    """Get the process-wide cache of pre-encoded book fragments."""
+    return FragmentCache(maxsize=config.app_settings.JSON_FRAGMENT_CACHE_SIZE)
@@ -0,0 +1,53 @@
+import asyncio
+import functools
+import typing
+from collections.abc import Callable, Coroutine, Hashable
+
+T = typing.TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into a single in-flight call.
+
+    The first caller for a key starts the call, and callers arriving while it
+    is still running await the same result (or exception) instead of
+    starting their own. Nothing is cached once the call completes.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the registry of in-flight calls and the counters."""
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self.executed_calls = 0
+        self.coalesced_calls = 0
+
+    @property
+    def in_flight_calls(self) -> int:
+        """Get the number of calls currently in flight."""
+        return len(self._in_flight)
+
+    async def do(
+        self,
+        key: Hashable,
+        call: Callable[[], Coroutine[typing.Any, typing.Any, T]],
+    ) -> T:
+        """Run the call, or join the identical one that is already running."""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(call())
+            self._in_flight[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+            self.executed_calls += 1
+        else:
+            self.coalesced_calls += 1
+
+        # A cancelled caller (e.g. a client that went away) must not cancel
+        # the call the other callers are waiting for.
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller went away.
+            task.exception()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Scrub the books directory against the books table once.
+
+Deletes the files no book refers to and flags the books whose file is
+missing, truncated or corrupt, see `literaflow.services.storage_scrub`.
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+
+from literaflow.core import config
+from literaflow.core.db import create_tables
+from literaflow.core.logger import setup_logger
+from literaflow.services import storage_scrub
+
+
+async def scrub(args: argparse.Namespace) -> storage_scrub.ScrubReport | None:
+    """Scrub the storage with the options given on the command line."""
+    await create_tables()
+    options = {
+        "delete_orphans": not args.dry_run,
+        "verify_checksums": args.verify_checksums,
+    }
+    if args.files_per_second is not None:
+        options["files_per_second"] = args.files_per_second
+    if args.read_bytes_per_second is not None:
+        options["read_bytes_per_second"] = args.read_bytes_per_second
+    if args.max_orphan_ratio is not None:
+        options["max_orphan_ratio"] = args.max_orphan_ratio
+    return await storage_scrub.run_storage_scrub(**options)
+
+
+def main() -> None:
+    """Run the scrub and print its report."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Report orphan files, keep them"
+    )
+    parser.add_argument(
+        "--verify-checksums",
+        action="store_true",
+        default=config.app_settings.STORAGE_SCRUB_VERIFY_CHECKSUMS,
+        help="Read every file to compare it with its stored SHA-256",
+    )
+    parser.add_argument("--files-per-second", type=float, help="0 is unlimited")
+    parser.add_argument("--read-bytes-per-second", type=float, help="0 is unlimited")
+    parser.add_argument(
+        "--max-orphan-ratio",
+        type=float,
+        help="Share of orphans in a batch beyond which none are deleted, 1 is none",
+    )
+    args = parser.parse_args()
+
+    setup_logger()
+    report = asyncio.run(scrub(args))
+    if report is None:
+        raise SystemExit("Another storage scrub is running")
+    print(json.dumps(dataclasses.asdict(report), indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
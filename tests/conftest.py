@@ -1,11 +1,14 @@
 import asyncio
+import pathlib
 import typing
 from collections.abc import Callable
 
 import pytest
 from aiohttp.test_utils import TestClient
 
+from benchmarks.file_server import create_file_server_app
 from literaflow import utils
+from literaflow.core import config
 
 
 @pytest.fixture(scope="session")
@@ -16,8 +19,27 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def _extract_metadata_in_threads(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Extract book metadata in threads, not in a process pool per test app."""
+    monkeypatch.setattr(config.app_settings, "METADATA_WORKERS", 0)
+
+
+@pytest.fixture(autouse=True)
+def _books_dir(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Store the books downloaded by a test in its temporary directory."""
+    monkeypatch.setattr(config.app_settings, "BOOKS_DIR", str(tmp_path / "books"))
+
+
 @pytest.fixture
 async def client(aiohttp_client: Callable[..., typing.Any]) -> TestClient:
     """Create a test client for the application."""
     app = utils.create_app()
     return await aiohttp_client(app)
+
+
+@pytest.fixture
+async def file_server_url(aiohttp_server: Callable[..., typing.Any]) -> str:
+    """Start a local server of synthetic book files."""
+    server = await aiohttp_server(create_file_server_app())
+    return str(server.make_url("")).rstrip("/")
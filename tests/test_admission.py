@@ -0,0 +1,197 @@
+import asyncio
+import math
+
+import pytest
+from aiohttp import hdrs
+from aiohttp.test_utils import TestClient
+
+from literaflow.api import middlewares
+from literaflow.utils import admission, app_running, http_statuses
+from tests.test_books import (
+    get_fake_author_name,
+    get_fake_book_name,
+    get_fake_date_published,
+)
+
+FAST_LATENCY = 0.01
+SLOW_LATENCY = 1.0
+
+
+def create_controller(
+    limit: int = 1, max_queue_size: int = 0, queue_timeout: float = 1.0
+) -> admission.AdmissionController:
+    """Create a controller with a fixed limit."""
+    return admission.AdmissionController(
+        limit=admission.AdaptiveLimit(
+            initial_limit=limit, min_limit=limit, max_limit=limit, tolerance=2.0
+        ),
+        max_queue_size=max_queue_size,
+        queue_timeout=queue_timeout,
+    )
+
+
+def test_limit_increases_while_latency_is_low():
+    """Test that the limit grows additively while requests stay fast."""
+    limit = admission.AdaptiveLimit(
+        initial_limit=2, min_limit=1, max_limit=4, tolerance=2.0
+    )
+    for _ in range(10):
+        limit.on_complete(FAST_LATENCY)
+    assert limit.limit == 4  # noqa: PLR2004
+
+
+def test_limit_decreases_on_high_latency_and_failures():
+    """Test that the limit shrinks when latency rises or requests fail."""
+    limit = admission.AdaptiveLimit(
+        initial_limit=10, min_limit=2, max_limit=10, tolerance=2.0
+    )
+    limit.on_complete(FAST_LATENCY)
+    limit.on_complete(SLOW_LATENCY)
+    assert limit.limit < 10  # noqa: PLR2004
+
+    for _ in range(50):
+        limit.on_complete(FAST_LATENCY, failed=True)
+    assert limit.limit == 2  # noqa: PLR2004
+
+
+def test_infinite_tolerance_decreases_only_on_failures():
+    """Test that routes exempt from latency keep their limit while slow."""
+    limit = admission.AdaptiveLimit(
+        initial_limit=10, min_limit=2, max_limit=10, tolerance=math.inf
+    )
+    limit.on_complete(FAST_LATENCY)
+    limit.on_complete(SLOW_LATENCY)
+    assert limit.limit == 10  # noqa: PLR2004
+
+    limit.on_complete(FAST_LATENCY, failed=True)
+    assert limit.limit < 10  # noqa: PLR2004
+
+
+@pytest.mark.parametrize(
+    ("status", "failed"),
+    [
+        (http_statuses.HTTP_200_OK, False),
+        (http_statuses.HTTP_404_NOT_FOUND, False),
+        (http_statuses.HTTP_500_INTERNAL_SERVER_ERROR, True),
+        (http_statuses.HTTP_503_SERVICE_UNAVAILABLE, True),
+    ],
+)
+async def test_returned_server_errors_are_failures(status: int, *, failed: bool):
+    """Test that server error responses shrink the limit like raised errors."""
+    controller = admission.AdmissionController(
+        limit=admission.AdaptiveLimit(
+            initial_limit=10, min_limit=1, max_limit=10, tolerance=math.inf
+        ),
+        max_queue_size=0,
+        queue_timeout=1.0,
+    )
+
+    async with controller.admit() as admitted:
+        admitted.status = status
+
+    assert (controller.adaptive_limit.limit < 10) is failed  # noqa: PLR2004
+
+
+async def test_full_queue_is_rejected_immediately():
+    """Test that a request is rejected when the slots and the queue are full."""
+    controller = create_controller(limit=1, max_queue_size=0)
+
+    async with controller.admit():
+        with pytest.raises(admission.AdmissionRejectedError) as exc_info:
+            async with controller.admit():
+                pass
+
+    assert exc_info.value.reason == "queue_full"
+    assert exc_info.value.retry_after >= 1
+    assert controller.in_flight == 0
+
+
+async def test_queued_request_is_admitted_when_a_slot_is_released():
+    """Test that waiting requests are admitted in order as slots free up."""
+    controller = create_controller(limit=1, max_queue_size=2)
+    order = []
+
+    async def request(name: str, duration: float) -> None:
+        async with controller.admit():
+            order.append(name)
+            await asyncio.sleep(duration)
+
+    await asyncio.gather(
+        request("first", 0.02), request("second", 0), request("third", 0)
+    )
+
+    assert order == ["first", "second", "third"]
+    assert controller.in_flight == 0
+    assert controller.queue_size == 0
+
+
+async def test_queued_request_times_out():
+    """Test that a request waiting longer than the timeout is rejected."""
+    controller = create_controller(limit=1, max_queue_size=1, queue_timeout=0.01)
+
+    async with controller.admit():
+        with pytest.raises(admission.AdmissionRejectedError) as exc_info:
+            async with controller.admit():
+                pass
+
+    assert exc_info.value.reason == "queue_timeout"
+    assert controller.queue_size == 0
+
+
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    """Test that a request cancelled while queued leaves no slot taken."""
+    controller = create_controller(limit=1, max_queue_size=1)
+
+    async def queued_request() -> None:
+        async with controller.admit():
+            pass
+
+    async with controller.admit():
+        task = asyncio.create_task(queued_request())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    assert controller.in_flight == 0
+    async with controller.admit():
+        assert controller.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_saturated_route_is_shed_while_other_routes_are_served(
+    client: TestClient,
+):
+    """Test that a saturated route gets 503 and Retry-After, others still work."""
+    create_response = await client.post(
+        "/v1/books",
+        json={
+            "name": get_fake_book_name(),
+            "author": get_fake_author_name(),
+            "date_published": get_fake_date_published(),
+        },
+    )
+    book = await create_response.json()
+
+    controller = create_controller(limit=1, max_queue_size=0)
+    client.app[middlewares.ADMISSION_CONTROLLERS]["GET /v1/books"] = controller
+
+    async with controller.admit():
+        list_response = await client.get("/v1/books")
+        get_response = await client.get(f"/v1/books/{book["id"]}")
+
+    assert list_response.status == http_statuses.HTTP_503_SERVICE_UNAVAILABLE
+    assert int(list_response.headers[hdrs.RETRY_AFTER]) >= 1
+    assert "error" in await list_response.json()
+    assert get_response.status == http_statuses.HTTP_200_OK
+
+    list_response = await client.get("/v1/books")
+    assert list_response.status == http_statuses.HTTP_200_OK
+
+
+def test_book_creation_limit_ignores_latency():
+    """Test that book creation, which waits on origins, is exempt from latency."""
+    controllers = app_running.create_admission_controllers()
+
+    assert controllers["POST /v1/books"].adaptive_limit.tolerance == math.inf
+    assert controllers["GET /v1/books"].adaptive_limit.tolerance < math.inf
@@ -0,0 +1,136 @@
+import uuid
+
+import pytest
+from aiohttp.test_utils import TestClient
+
+from literaflow.core import config
+from literaflow.services import book_counts
+from literaflow.services.book_counts import BookCount, BookCountCache
+from literaflow.utils import http_statuses
+from tests.test_books import get_fake_author_name, get_fake_book_name
+
+
+@pytest.fixture(autouse=True)
+def clear_book_count_cache():
+    """Start each test without cached totals."""
+    book_counts.get_book_count_cache().clear()
+
+
+@pytest.fixture
+def genre() -> str:
+    """Generate a genre no other test uses, to count only this test's books."""
+    return f"genre-{uuid.uuid4().hex}"
+
+
+async def create_books(client: TestClient, genre: str, count: int) -> list[dict]:
+    """Create books of the genre."""
+    books = []
+    for _ in range(count):
+        response = await client.post(
+            "/v1/books",
+            json={
+                "name": get_fake_book_name(),
+                "author": get_fake_author_name(),
+                "date_published": "2001-01-01",
+                "genre": genre,
+            },
+        )
+        assert response.status == http_statuses.HTTP_201_CREATED
+        books.append(await response.json())
+    return books
+
+
+async def get_total(client: TestClient, **params: str) -> tuple[int, str]:
+    """Get the total count of the listing and whether it is exact."""
+    response = await client.get("/v1/books", params=params)
+    assert response.status == http_statuses.HTTP_200_OK
+    await response.read()
+    return int(response.headers["X-Total-Count"]), response.headers[
+        "X-Total-Count-Exact"
+    ]
+
+
+@pytest.mark.parametrize("total", ["exact", "estimated"])
+async def test_small_totals_are_exact(client: TestClient, genre: str, total: str):
+    """Test that totals below the threshold are counted exactly."""
+    books = await create_books(client, genre, count=2)
+
+    assert await get_total(client, genre=genre, total=total) == (len(books), "true")
+
+
+async def test_name_totals_are_exact(client: TestClient, genre: str):
+    """Test that totals of a name are counted directly from the books."""
+    books = await create_books(client, genre, count=2)
+
+    assert await get_total(client, name=books[0]["name"], total="estimated") == (
+        1,
+        "true",
+    )
+
+
+async def test_large_totals_are_estimated(
+    client: TestClient, genre: str, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that totals above the threshold are estimated unless exact."""
+    books = await create_books(client, genre, count=2)
+    monkeypatch.setattr(config.app_settings, "BOOK_COUNT_EXACT_THRESHOLD", 0)
+
+    _, is_exact = await get_total(client, total="estimated")
+
+    assert is_exact == "false"
+    assert await get_total(client, genre=genre, total="exact") == (len(books), "true")
+
+
+async def test_totals_are_cached(client: TestClient, genre: str):
+    """Test that totals of a filter are reused until the cache expires."""
+    books = await create_books(client, genre, count=1)
+    await get_total(client, genre=genre, total="exact")
+
+    books += await create_books(client, genre, count=1)
+    cached_total = await get_total(client, genre=genre, total="exact")
+    book_counts.get_book_count_cache().clear()
+
+    assert cached_total == (len(books) - 1, "true")
+    assert await get_total(client, genre=genre, total="exact") == (len(books), "true")
+
+
+async def test_totals_are_optional(client: TestClient):
+    """Test that the listing has no total unless asked for."""
+    response = await client.get("/v1/books", params={"fields": "id"})
+    assert response.status == http_statuses.HTTP_200_OK
+    await response.read()
+    assert "X-Total-Count" not in response.headers
+
+
+async def test_invalid_total(client: TestClient):
+    """Test the listing with an unknown kind of total."""
+    response = await client.get("/v1/books", params={"total": "approximate"})
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    data = await response.json()
+    assert "errors" in data
+
+
+def test_cache_expires_totals(monkeypatch: pytest.MonkeyPatch):
+    """Test that cached totals expire after their time to live."""
+    now = 100.0
+    monkeypatch.setattr(book_counts.time, "monotonic", lambda: now)
+    cache = BookCountCache(maxsize=10)
+    cache.put("key", BookCount(1, is_exact=True), ttl=5)
+
+    assert cache.get("key") == BookCount(1, is_exact=True)
+    now += 5
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_cache_evicts_least_recently_used_totals():
+    """Test that the cache keeps at most its maximum number of totals."""
+    cache = BookCountCache(maxsize=2)
+    for key in ("first", "second"):
+        cache.put(key, BookCount(1, is_exact=True), ttl=60)
+    cache.get("first")
+    cache.put("third", BookCount(1, is_exact=True), ttl=60)
+
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.get("third") is not None
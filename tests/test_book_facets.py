@@ -0,0 +1,209 @@
+import io
+import uuid
+
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+from aiohttp import FormData
+from aiohttp.test_utils import TestClient
+
+from literaflow.core.db import async_session_maker
+from literaflow.models import book as book_models
+from literaflow.services.book_facets import BookFacetService
+from literaflow.utils import http_statuses
+from tests.test_books import get_fake_book_name
+
+
+@pytest.fixture
+def genre() -> str:
+    """Generate a genre no other test uses, to count only this test's books."""
+    return f"genre-{uuid.uuid4().hex}"
+
+
+async def create_books(client: TestClient, genre: str, books: list[dict]) -> None:
+    """Create books of the genre."""
+    for book in books:
+        response = await client.post("/v1/books", json={**book, "genre": genre})
+        assert response.status == http_statuses.HTTP_201_CREATED
+
+
+async def deny_authors(client: TestClient, authors: list[str]) -> None:
+    """Upload a denied list of authors."""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        pd.DataFrame({"name": []}).to_excel(writer, sheet_name="name", index=False)
+        pd.DataFrame({"author": authors}).to_excel(
+            writer, sheet_name="author", index=False
+        )
+    form = FormData()
+    form.add_field("file", buffer.getvalue(), filename="denied_books.xlsx")
+    response = await client.post("/v1/books/deny", data=form)
+    assert response.status == http_statuses.HTTP_200_OK
+
+
+async def get_facets(client: TestClient, **params: str) -> dict:
+    """Get the facets of the books matching the filters."""
+    response = await client.get("/v1/books/facets", params=params)
+    assert response.status == http_statuses.HTTP_200_OK
+    return await response.json()
+
+
+@pytest.fixture
+async def books(client: TestClient, genre: str) -> list[dict]:
+    """Create three books of the genre by two authors."""
+    author = f"Author {uuid.uuid4().hex}"
+    other_author = f"Author {uuid.uuid4().hex}"
+    books = [
+        {"name": get_fake_book_name(), "author": author, "date_published": day}
+        for day in ("2001-01-01", "2001-06-30")
+    ]
+    books.append({
+        "name": get_fake_book_name(),
+        "author": other_author,
+        "date_published": "1999-12-31",
+    })
+    await create_books(client, genre, books)
+    return books
+
+
+async def test_get_book_facets(client: TestClient, genre: str, books: list[dict]):
+    """Test counting the books per facet value, most common first."""
+    facets = await get_facets(client, genre=genre)
+
+    assert facets == {
+        "total": 3,
+        "genre": [{"value": genre, "count": 3}],
+        "author": [
+            {"value": books[0]["author"], "count": 2},
+            {"value": books[2]["author"], "count": 1},
+        ],
+        "year": [{"value": 2001, "count": 2}, {"value": 1999, "count": 1}],
+        "is_denied": [{"value": False, "count": 3}],
+    }
+
+
+@pytest.mark.parametrize(
+    ("book_filter", "expected_total"),
+    [
+        (("author", 0), 2),
+        (("date_published", 2), 1),
+        (("name", 1), 1),
+    ],
+)
+async def test_get_book_facets_with_filters(
+    client: TestClient,
+    genre: str,
+    books: list[dict],
+    book_filter: tuple[str, int],
+    expected_total: int,
+):
+    """Test that the facets count only the books matching the filters."""
+    filter_name, book_index = book_filter
+    facets = await get_facets(
+        client, genre=genre, **{filter_name: books[book_index][filter_name]}
+    )
+
+    assert facets["total"] == expected_total
+    assert facets["genre"] == [{"value": genre, "count": expected_total}]
+
+
+async def test_get_book_facets_of_an_author(
+    client: TestClient, genre: str, books: list[dict]
+):
+    """Test the facets of a single filter other than the genre."""
+    facets = await get_facets(client, author=books[0]["author"])
+
+    assert facets == {
+        "total": 2,
+        "genre": [{"value": genre, "count": 2}],
+        "author": [{"value": books[0]["author"], "count": 2}],
+        "year": [{"value": 2001, "count": 2}],
+        "is_denied": [{"value": False, "count": 2}],
+    }
+
+
+@pytest.mark.usefixtures("books")
+async def test_value_counts_are_backfilled_from_the_combinations(genre: str):
+    """Test that backfilled value counts match the ones kept up to date."""
+    value_counts = book_models.BookFacetValueCount
+    query = (
+        sa.select(value_counts.facet, value_counts.value, value_counts.book_count)
+        .where(value_counts.filter_name == "genre", value_counts.filter_value == genre)
+        .order_by(value_counts.facet, value_counts.value)
+    )
+    async with async_session_maker() as session:
+        kept_counts = (await session.execute(query)).all()
+        await session.execute(sa.delete(value_counts))
+
+        await BookFacetService._fill_value_counts(session)  # noqa: SLF001
+
+        assert (await session.execute(query)).all() == kept_counts
+        await session.rollback()
+    assert len(kept_counts) == 6  # noqa: PLR2004
+
+
+async def test_denied_books_move_between_facet_counts(
+    client: TestClient, genre: str, books: list[dict]
+):
+    """Test that applying a denied list updates the denied status counts."""
+    await deny_authors(client, [books[0]["author"]])
+    # Books that are already denied are not counted twice
+    await deny_authors(client, [books[0]["author"]])
+
+    facets = await get_facets(client, genre=genre)
+
+    assert facets["total"] == len(books)
+    assert facets["is_denied"] == [
+        {"value": True, "count": 2},
+        {"value": False, "count": 1},
+    ]
+
+
+async def test_duplicate_book_is_not_counted(
+    client: TestClient, genre: str, books: list[dict]
+):
+    """Test that a book rejected as a duplicate does not change the counts."""
+    response = await client.post("/v1/books", json={**books[0], "genre": genre})
+    assert response.status == http_statuses.HTTP_409_CONFLICT
+
+    facets = await get_facets(client, genre=genre)
+
+    assert facets["total"] == len(books)
+
+
+async def test_get_book_facets_limit(client: TestClient, genre: str, books: list[dict]):
+    """Test that only the most common values of each facet are returned."""
+    facets = await get_facets(client, genre=genre, limit="1")
+
+    assert facets["author"] == [{"value": books[0]["author"], "count": 2}]
+    assert facets["year"] == [{"value": 2001, "count": 2}]
+
+
+async def test_get_book_facets_without_matches(client: TestClient, genre: str):
+    """Test the facets of a filter matching no books."""
+    facets = await get_facets(client, genre=genre)
+
+    assert facets == {
+        "total": 0,
+        "genre": [],
+        "author": [],
+        "year": [],
+        "is_denied": [],
+    }
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"limit": "0"},
+        {"limit": "1001"},
+        {"limit": "many"},
+        {"date_published": "invalid-date"},
+    ],
+)
+async def test_get_book_facets_invalid_query(client: TestClient, params: dict):
+    """Test the facets with invalid query parameters."""
+    response = await client.get("/v1/books/facets", params=params)
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    data = await response.json()
+    assert "errors" in data
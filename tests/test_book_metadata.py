@@ -0,0 +1,253 @@
+import asyncio
+import pathlib
+import sys
+from collections.abc import Callable
+
+import pytest
+from aiohttp.test_utils import TestClient
+
+from benchmarks.file_server import (
+    BOOK_AUTHOR,
+    BOOK_LANGUAGE,
+    BOOK_TITLE,
+    build_book,
+    build_cover,
+    build_epub,
+    build_fb2,
+    build_pdf,
+)
+from literaflow.core import config
+from literaflow.utils import book_metadata, http_statuses, page_index
+from tests.test_books import (
+    get_fake_author_name,
+    get_fake_book_name,
+    get_fake_date_published,
+)
+from tests.test_page_index import write_book
+
+BOOK_SIZE = 64 * 1024
+# Time for the background extraction to store the metadata of a created book
+EXTRACTION_TIMEOUT_S = 30
+
+
+@pytest.mark.parametrize(
+    ("data", "book_format"),
+    [
+        (build_epub(BOOK_SIZE), "epub"),
+        (build_fb2(BOOK_SIZE), "fb2"),
+        (build_pdf(BOOK_SIZE), "pdf"),
+        (build_book("txt", BOOK_SIZE), "txt"),
+        (b"<!DOCTYPE html><html><body>Text</body></html>", "html"),
+        (b"{\\rtf1\\ansi Text}", "rtf"),
+        (b"\x00" * 60 + b"BOOKMOBI" + b"\x00" * 16, "mobi"),
+        (b"PK\x03\x04" + b"\x00" * 64, "zip"),
+        (b"\x00\x01\x02\x03binary", None),
+    ],
+)
+def test_format_is_sniffed_from_magic_bytes(
+    tmp_path: pathlib.Path, data: bytes, book_format: str | None
+):
+    """Test that the format is recognized by the content, not the extension."""
+    book_path = write_book(tmp_path, "book.bin", data)
+    assert book_metadata.sniff_format(book_path) == book_format
+
+
+def test_mislabeled_book_is_renamed(tmp_path: pathlib.Path):
+    """Test that the file's extension is fixed to match its real format."""
+    data = build_pdf(BOOK_SIZE)
+    book_path = write_book(tmp_path, "book.epub", data)
+
+    path, book_format, size = book_metadata.identify_book_file(book_path)
+
+    assert path == str(tmp_path / "book.pdf")
+    assert book_format == "pdf"
+    assert size == len(data)
+    assert not pathlib.Path(book_path).exists()
+
+
+@pytest.mark.parametrize(
+    ("name", "data", "language"),
+    [
+        ("book.epub", build_epub(BOOK_SIZE), BOOK_LANGUAGE),
+        ("book.fb2", build_fb2(BOOK_SIZE), BOOK_LANGUAGE),
+        ("book.pdf", build_pdf(BOOK_SIZE), None),
+    ],
+)
+def test_metadata_is_extracted(
+    tmp_path: pathlib.Path, name: str, data: bytes, language: str | None
+):
+    """Test that the embedded metadata and the page count are extracted."""
+    pytest.importorskip("pypdf")
+    book_path = write_book(tmp_path, name, data)
+
+    metadata = book_metadata.extract_metadata(book_path)
+
+    assert metadata.title == BOOK_TITLE
+    assert metadata.author == BOOK_AUTHOR
+    assert metadata.language == language
+    assert metadata.page_count == len(page_index.build_index(book_path)["pages"])
+    assert metadata.cover_path is None
+
+
+@pytest.mark.parametrize("builder", [build_epub, build_fb2])
+def test_cover_thumbnail_is_stored(
+    tmp_path: pathlib.Path, builder: Callable[..., bytes]
+):
+    """Test that the embedded cover is stored next to the book as a thumbnail."""
+    image_module = pytest.importorskip("PIL.Image")
+    book_path = write_book(
+        tmp_path, "book", builder(BOOK_SIZE, cover=build_cover(1200, 1800))
+    )
+    book_path = book_metadata.identify_book_file(book_path)[0]
+
+    metadata = book_metadata.extract_metadata(book_path)
+
+    assert metadata.cover_path == book_metadata.get_cover_path(book_path, "jpg")
+    with image_module.open(metadata.cover_path) as thumbnail:
+        assert thumbnail.format == "JPEG"
+        assert thumbnail.width <= book_metadata.COVER_THUMBNAIL_SIZE[0]
+        assert thumbnail.height <= book_metadata.COVER_THUMBNAIL_SIZE[1]
+
+
+def test_cover_is_stored_as_is_without_pillow(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that the cover is copied unchanged when Pillow is not installed."""
+    cover = build_cover()
+    monkeypatch.setitem(sys.modules, "PIL", None)
+    book_path = write_book(tmp_path, "book.epub", build_epub(BOOK_SIZE, cover=cover))
+
+    metadata = book_metadata.extract_metadata(book_path)
+
+    assert metadata.cover_path == book_metadata.get_cover_path(book_path, "png")
+    assert pathlib.Path(metadata.cover_path).read_bytes() == cover
+
+
+@pytest.mark.parametrize(
+    ("name", "data"),
+    [
+        ("book.txt", build_book("txt", BOOK_SIZE)),
+        ("book.epub", b"PK\x03\x04 not really a ZIP archive"),
+        ("book.fb2", b"<FictionBook><description>"),
+    ],
+)
+def test_unreadable_metadata_raises(tmp_path: pathlib.Path, name: str, data: bytes):
+    """Test that books without readable metadata raise MetadataError."""
+    book_path = write_book(tmp_path, name, data)
+    with pytest.raises(book_metadata.MetadataError):
+        book_metadata.extract_metadata(book_path)
+
+
+async def test_metadata_is_extracted_in_the_process_pool(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that the extraction runs in a worker process."""
+    monkeypatch.setattr(config.app_settings, "METADATA_WORKERS", 1)
+    book_path = write_book(tmp_path, "book.fb2", build_fb2(BOOK_SIZE))
+    try:
+        metadata = await book_metadata.extract_book_metadata(book_path)
+        assert book_metadata.get_extraction_pool.cache_info().currsize == 1
+    finally:
+        await book_metadata.shutdown_extraction_pool()
+
+    assert metadata.title == BOOK_TITLE
+    assert metadata.author == BOOK_AUTHOR
+
+
+async def wait_for_metadata(client: TestClient, book_id: int) -> dict:
+    """Wait until the background extraction has stored the book's metadata."""
+    async with asyncio.timeout(EXTRACTION_TIMEOUT_S):
+        while True:
+            response = await client.get(f"/v1/books/{book_id}")
+            book = await response.json()
+            if book["page_count"] is not None:
+                return book
+            await asyncio.sleep(0.1)
+
+
+@pytest.mark.parametrize(
+    ("path", "file_format"),
+    [
+        ("/books/novel.epub", "epub"),
+        ("/books/novel.fb2", "fb2"),
+        ("/books/novel.pdf", "pdf"),
+    ],
+)
+async def test_created_book_gets_file_metadata(
+    client: TestClient, file_server_url: str, path: str, file_format: str
+):
+    """Test that ingested books expose the metadata of their files."""
+    pytest.importorskip("pypdf")
+    response = await client.post(
+        "/v1/books",
+        json={
+            "name": get_fake_book_name(),
+            "author": get_fake_author_name(),
+            "date_published": get_fake_date_published(),
+            "url": file_server_url + path,
+        },
+    )
+    assert response.status == http_statuses.HTTP_201_CREATED
+    created_book = await response.json()
+    assert created_book["file_format"] == file_format
+    assert (
+        created_book["file_size"]
+        == pathlib.Path(created_book["file_path"]).stat().st_size
+    )
+
+    book = await wait_for_metadata(client, created_book["id"])
+
+    assert book["file_title"] == BOOK_TITLE
+    assert book["file_author"] == BOOK_AUTHOR
+    assert book["page_count"] > 0
+    assert book["cover_path"] is None
+    cover_response = await client.get(f"/v1/books/{book["id"]}/cover")
+    assert cover_response.status == http_statuses.HTTP_404_NOT_FOUND
+
+
+async def test_get_book_cover(client: TestClient, file_server_url: str):
+    """Test retrieving the cover extracted from a book file."""
+    response = await client.post(
+        "/v1/books",
+        json={
+            "name": get_fake_book_name(),
+            "author": get_fake_author_name(),
+            "date_published": get_fake_date_published(),
+            "url": f"{file_server_url}/books/novel.epub?cover=1",
+        },
+    )
+    assert response.status == http_statuses.HTTP_201_CREATED
+    book = await wait_for_metadata(client, (await response.json())["id"])
+
+    cover_response = await client.get(f"/v1/books/{book["id"]}/cover")
+
+    assert cover_response.status == http_statuses.HTTP_200_OK
+    assert cover_response.content_type in {"image/jpeg", "image/png"}
+    assert await cover_response.read() == pathlib.Path(book["cover_path"]).read_bytes()
+
+
+async def test_get_book_cover_invalid_id(client: TestClient):
+    """Test that non-numeric book IDs are rejected."""
+    response = await client.get("/v1/books/first/cover")
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    assert (await response.json())["error"] == "Invalid book ID"
+
+
+async def test_created_book_format_is_sniffed(client: TestClient, file_server_url: str):
+    """Test that a file whose URL lies about its format is stored as what it is."""
+    response = await client.post(
+        "/v1/books",
+        json={
+            "name": get_fake_book_name(),
+            "author": get_fake_author_name(),
+            "date_published": get_fake_date_published(),
+            # The file server sends plain text for unknown formats
+            "url": f"{file_server_url}/books/novel.mobi",
+        },
+    )
+
+    assert response.status == http_statuses.HTTP_201_CREATED
+    book = await response.json()
+    assert book["file_format"] == "txt"
+    assert book["file_path"].endswith(".txt")
+    assert book["page_count"] is None
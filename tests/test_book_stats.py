@@ -0,0 +1,176 @@
+import asyncio
+import contextlib
+import uuid
+from collections.abc import AsyncIterator
+
+import pytest
+from aiohttp.test_utils import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from literaflow.core import config
+from literaflow.core.db import async_session_maker
+from literaflow.services import book_stats
+from literaflow.services.book_stats import BookStatsService
+from literaflow.utils import http_statuses
+from tests.test_books import get_fake_author_name, get_fake_book_name
+
+
+@pytest.fixture
+def genre() -> str:
+    """Generate a genre no other test uses, to rank only this test's books."""
+    return f"genre-{uuid.uuid4().hex}"
+
+
+async def create_book(
+    client: TestClient, genre: str, file_server_url: str, *, is_denied: bool = False
+) -> dict:
+    """Create a book of the genre with a file."""
+    response = await client.post(
+        "/v1/books",
+        json={
+            "name": get_fake_book_name(),
+            "author": get_fake_author_name(),
+            "date_published": "2001-01-01",
+            "genre": genre,
+            "is_denied": is_denied,
+            "url": f"{file_server_url}/books/novel.fb2",
+        },
+    )
+    assert response.status == http_statuses.HTTP_201_CREATED
+    return await response.json()
+
+
+async def get_popular_books(client: TestClient, **params: str) -> list[dict]:
+    """Get the most popular books, flushing the pending counts first."""
+    await BookStatsService.flush()
+    response = await client.get("/v1/books/popular", params=params)
+    assert response.status == http_statuses.HTTP_200_OK
+    return await response.json()
+
+
+async def open_book(client: TestClient, book_id: int, path: str, times: int) -> None:
+    """Request a book's endpoint a number of times."""
+    for _ in range(times):
+        response = await client.get(f"/v1/books/{book_id}{path}")
+        assert response.status == http_statuses.HTTP_200_OK
+        await response.read()
+
+
+async def test_get_popular_books(client: TestClient, genre: str, file_server_url: str):
+    """Test ranking the books by their downloads and views."""
+    first_book = await create_book(client, genre, file_server_url)
+    second_book = await create_book(client, genre, file_server_url)
+    await create_book(client, genre, file_server_url)
+    await open_book(client, first_book["id"], "", times=1)
+    await open_book(client, first_book["id"], "/download", times=2)
+    await open_book(client, second_book["id"], "", times=3)
+    await open_book(client, second_book["id"], "/download", times=1)
+
+    by_downloads = await get_popular_books(client, genre=genre)
+    by_views = await get_popular_books(client, genre=genre, by="views", limit="1")
+
+    assert [
+        (item["book"]["id"], item["download_count"], item["view_count"])
+        for item in by_downloads
+    ] == [(first_book["id"], 2, 1), (second_book["id"], 1, 3)]
+    assert [item["book"]["id"] for item in by_views] == [second_book["id"]]
+
+
+async def test_counts_add_up_across_flushes(
+    client: TestClient, genre: str, file_server_url: str
+):
+    """Test that each flush adds to the counts stored by the previous ones."""
+    book = await create_book(client, genre, file_server_url)
+
+    await open_book(client, book["id"], "", times=2)
+    await BookStatsService.flush()
+    await open_book(client, book["id"], "", times=1)
+    popular_books = await get_popular_books(client, genre=genre, by="views")
+
+    assert [item["view_count"] for item in popular_books] == [3]
+
+
+async def test_failed_flush_keeps_the_counts(
+    client: TestClient,
+    genre: str,
+    file_server_url: str,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test that counts that could not be flushed are flushed the next time."""
+    book = await create_book(client, genre, file_server_url)
+    await open_book(client, book["id"], "", times=1)
+
+    def fail() -> None:
+        raise ConnectionError("Database is unavailable")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(book_stats, "async_session_maker", fail)
+        with pytest.raises(ConnectionError):
+            await BookStatsService.flush()
+    await open_book(client, book["id"], "", times=1)
+    popular_books = await get_popular_books(client, genre=genre, by="views")
+
+    assert [item["view_count"] for item in popular_books] == [2]
+
+
+async def test_flush_cancelled_after_commit_does_not_count_twice(
+    client: TestClient,
+    genre: str,
+    file_server_url: str,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test that committed counts are not flushed again after a cancellation."""
+    book = await create_book(client, genre, file_server_url)
+    await open_book(client, book["id"], "", times=1)
+
+    @contextlib.asynccontextmanager
+    async def cancel_after_commit() -> AsyncIterator[AsyncSession]:
+        async with async_session_maker() as session:
+            yield session
+        raise asyncio.CancelledError
+
+    with monkeypatch.context() as patch:
+        patch.setattr(book_stats, "async_session_maker", cancel_after_commit)
+        with pytest.raises(asyncio.CancelledError):
+            await BookStatsService.flush()
+    popular_books = await get_popular_books(client, genre=genre, by="views")
+
+    assert [item["view_count"] for item in popular_books] == [1]
+
+
+async def test_refused_downloads_are_not_counted(
+    client: TestClient, genre: str, file_server_url: str
+):
+    """Test that downloads of denied books are not counted."""
+    book = await create_book(client, genre, file_server_url, is_denied=True)
+
+    response = await client.get(f"/v1/books/{book["id"]}/download")
+    assert response.status == http_statuses.HTTP_403_FORBIDDEN
+
+    assert await get_popular_books(client, genre=genre) == []
+
+
+async def test_disabled_stats_are_not_counted(
+    client: TestClient,
+    genre: str,
+    file_server_url: str,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test that nothing is counted when the stats are disabled."""
+    book = await create_book(client, genre, file_server_url)
+    monkeypatch.setattr(config.app_settings, "BOOK_STATS_ENABLED", False)
+    await open_book(client, book["id"], "", times=1)
+
+    assert await get_popular_books(client, genre=genre, by="views") == []
+
+
+@pytest.mark.parametrize(
+    "params",
+    [{"by": "ratings"}, {"limit": "0"}, {"limit": "101"}, {"date_published": "x"}],
+)
+async def test_get_popular_books_invalid_query(client: TestClient, params: dict):
+    """Test the popular books with invalid query parameters."""
+    response = await client.get("/v1/books/popular", params=params)
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    data = await response.json()
+    assert "errors" in data
@@ -0,0 +1,202 @@
+import asyncio
+import datetime
+import uuid
+
+import pytest
+import sqlalchemy as sa
+from aiohttp.test_utils import TestClient
+
+from literaflow.core import config
+from literaflow.core.db import async_session_maker
+from literaflow.models import book as book_models
+from literaflow.services import book_suggestions
+from literaflow.services.book_suggestions import BookSuggestionService, PrefixIndex
+from literaflow.utils import http_statuses
+
+
+@pytest.fixture
+def word() -> str:
+    """Generate a word no other test uses, to match only this test's books."""
+    return f"Wörd{uuid.uuid4().hex}"
+
+
+async def create_book(client: TestClient, name: str, author: str) -> dict:
+    """Create a book with a name and an author."""
+    response = await client.post(
+        "/v1/books",
+        json={"name": name, "author": author, "date_published": "2001-01-01"},
+    )
+    assert response.status == http_statuses.HTTP_201_CREATED
+    return await response.json()
+
+
+async def suggest(client: TestClient, **params: str) -> list[dict]:
+    """Get the suggestions for a prefix."""
+    response = await client.get("/v1/books/suggest", params=params)
+    assert response.status == http_statuses.HTTP_200_OK
+    return await response.json()
+
+
+def test_normalize():
+    """Test that case, accents and spacing are ignored."""
+    assert book_suggestions.normalize("  Léo \t TOLSTOY ") == "leo tolstoy"
+
+
+def test_prefix_index():
+    """Test suggesting names and authors from the index."""
+    index = PrefixIndex()
+    empty_memory_bytes = index.memory_bytes
+    books = [
+        (1, "War and Peace", "Leo Tolstoy"),
+        (2, "Anna Karenina", "Leo Tolstoy"),
+        (3, "Warlock", "Wilbur Smith"),
+    ]
+    index.add_books(books)
+
+    assert index.suggest("WAR", limit=10) == [
+        {"kind": "name", "text": "War and Peace", "id": 1},
+        {"kind": "name", "text": "Warlock", "id": 3},
+    ]
+    assert index.suggest("leo", limit=10) == [{"kind": "author", "text": "Leo Tolstoy"}]
+    assert index.suggest("w", limit=1) == [
+        {"kind": "name", "text": "War and Peace", "id": 1}
+    ]
+    assert index.suggest(" ", limit=10) == []
+    assert index.add_books([(2, "Anna Karenina", "Leo Tolstoy")]) == 0
+    assert index.max_book_id == books[-1][0]
+    assert index.memory_bytes > empty_memory_bytes
+
+
+def test_prefix_index_entries_collected_in_partitions():
+    """Test that entries collected over several partitions are added once."""
+    index = PrefixIndex()
+    new_entries = book_suggestions.NewEntries(revision=index.revision)
+    index.collect_entries([(1, "War and Peace", "Leo Tolstoy")], new_entries)
+    index.collect_entries([(2, "Anna Karenina", "Leo Tolstoy")], new_entries)
+    # Indexed by another request while the partitions were collected
+    index.add_books([(2, "Anna Karenina", "Leo Tolstoy")])
+
+    assert index.add_entries(new_entries) == 1
+    assert index.suggest("a", limit=10) == [
+        {"kind": "name", "text": "Anna Karenina", "id": 2}
+    ]
+    assert len(index) == 3  # noqa: PLR2004
+
+
+async def test_prefix_index_merges_entries_in_a_thread():
+    """Test that a merge is done again when entries are added meanwhile."""
+    index = PrefixIndex()
+    index.add_books([(1, "War and Peace", "Leo Tolstoy")])
+    new_entries = book_suggestions.NewEntries(revision=index.revision)
+    index.collect_entries(
+        [(book_id, f"Volume {book_id}", "Leo Tolstoy") for book_id in range(2, 22)],
+        new_entries,
+    )
+    # Indexed by another request while the first merge is made
+    asyncio.get_running_loop().call_soon(
+        index.add_books, [(22, "Anna Karenina", "Leo Tolstoy")]
+    )
+
+    assert await index.merge_entries(new_entries) == 20  # noqa: PLR2004
+    assert len(index) == 23  # noqa: PLR2004
+    assert [item["text"] for item in index.suggest("a", limit=10)] == ["Anna Karenina"]
+    assert [item["id"] for item in index.suggest("volume", limit=3)] == [10, 11, 12]
+    entries, _ = index.export()
+    assert entries == sorted(entries)
+
+
+async def test_suggest_created_books(client: TestClient, word: str):
+    """Test that created books are suggested by their name and author."""
+    book = await create_book(client, f"{word} Peace", f"{word} Author")
+
+    suggestions = await suggest(client, prefix=word.upper())
+
+    assert suggestions == [
+        {"kind": "author", "text": book["author"]},
+        {"kind": "name", "text": book["name"], "id": book["id"]},
+    ]
+
+
+async def test_suggest_limit(client: TestClient, word: str):
+    """Test that at most the limit of suggestions are returned."""
+    for number in range(3):
+        await create_book(client, f"{word} {number}", "Leo Tolstoy")
+
+    suggestions = await suggest(client, prefix=word, limit="2")
+
+    assert [item["text"] for item in suggestions] == [f"{word} 0", f"{word} 1"]
+
+
+@pytest.mark.usefixtures("client")
+async def test_catch_up_with_other_workers(word: str):
+    """Test that books created by other workers are indexed when catching up."""
+    async with async_session_maker() as session:
+        book = book_models.Book(
+            name=f"{word} Elsewhere",
+            author="Leo Tolstoy",
+            date_published=datetime.date(2001, 1, 1),
+        )
+        session.add(book)
+        await session.commit()
+
+    assert BookSuggestionService.suggest(word, limit=10) == []
+    await BookSuggestionService.catch_up()
+    assert BookSuggestionService.suggest(word, limit=10) == [
+        {"kind": "name", "text": book.name, "id": book.id}
+    ]
+
+
+@pytest.mark.usefixtures("client")
+async def test_catch_up_with_books_committed_late(word: str):
+    """Test that a book committed after books with much higher IDs is indexed."""
+    await BookSuggestionService.catch_up()
+    async with async_session_maker() as late_session:
+        late_book = book_models.Book(
+            name=f"{word} Late",
+            author="Leo Tolstoy",
+            date_published=datetime.date(2001, 1, 1),
+        )
+        late_session.add(late_book)
+        await late_session.flush()
+        async with async_session_maker() as session:
+            await session.execute(
+                sa.select(
+                    sa.func.setval(
+                        sa.func.pg_get_serial_sequence("books", "id"),
+                        late_book.id + 2 * book_suggestions.CATCH_UP_ID_OVERLAP,
+                    )
+                )
+            )
+            book = book_models.Book(
+                name=f"{word} Early",
+                author="Leo Tolstoy",
+                date_published=datetime.date(2001, 1, 1),
+            )
+            session.add(book)
+            await session.commit()
+        await BookSuggestionService.catch_up()
+        await late_session.commit()
+
+    await BookSuggestionService.catch_up()
+    assert BookSuggestionService.suggest(word, limit=10) == [
+        {"kind": "name", "text": book.name, "id": book.id},
+        {"kind": "name", "text": late_book.name, "id": late_book.id},
+    ]
+
+
+@pytest.mark.parametrize(
+    "params", [{}, {"prefix": ""}, {"prefix": "war", "limit": "51"}]
+)
+async def test_suggest_invalid_query(client: TestClient, params: dict):
+    """Test the suggestions with invalid query parameters."""
+    response = await client.get("/v1/books/suggest", params=params)
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    data = await response.json()
+    assert "errors" in data
+
+
+async def test_suggest_disabled(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    """Test that the suggestions do not exist when they are disabled."""
+    monkeypatch.setattr(config.app_settings, "BOOK_SUGGESTIONS_ENABLED", False)
+    response = await client.get("/v1/books/suggest", params={"prefix": "war"})
+    assert response.status == http_statuses.HTTP_404_NOT_FOUND
@@ -1,5 +1,7 @@
+import datetime
 import io
 import random
+import typing
 
 import pandas as pd
 import pytest
@@ -7,18 +9,23 @@ from aiohttp import FormData
 from aiohttp.test_utils import TestClient
 from faker import Faker
 
+from literaflow.core import dto
+from literaflow.models import book as book_models
 from literaflow.utils import http_statuses
 
 fake = Faker()
 
 
-EXTERNAL_BOOKS_URLS = [
-    "https://oldevgeny.github.io/cv/CV_Evgenii_Andreev.pdf",
-    "http://flibusta.site/b/300929/epub",
-    "http://flibusta.site/b/70332/fb2",
-    "http://flibusta.site/b/138887/epub",
+BOOK_FILE_PATHS = [
+    "/books/cv.pdf",
+    "/books/300929.epub",
+    "/books/70332.fb2",
+    "/books/138887.epub",
 ]
 
+# Placeholder of a parametrized book URL, replaced with a local file server URL
+BOOK_FILE_URL = "{file_server_url}"
+
 
 def get_fake_book_name() -> str:
     """Generate a fake book name."""
@@ -40,9 +47,9 @@ def get_fake_genre() -> str:
     return fake.word()
 
 
-def get_real_external_file_url() -> str:
-    """Generate a real external file URL."""
-    return random.choice(EXTERNAL_BOOKS_URLS)  # noqa: S311
+def get_book_file_url(file_server_url: str) -> str:
+    """Generate a URL of a book file on the local file server."""
+    return file_server_url + random.choice(BOOK_FILE_PATHS)  # noqa: S311
 
 
 @pytest.fixture
@@ -126,6 +133,48 @@ async def test_create_book_invalid_required_data(
     assert "errors" in data
 
 
+@pytest.mark.parametrize("field", ["name", "author"])
+async def test_create_book_empty_required_field_error(
+    client: TestClient, fake_book_data: dict, field: str
+):
+    """Test the error of a book with an empty name or author."""
+    response = await client.post("/v1/books", json={**fake_book_data, field: ""})
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    data = await response.json()
+    assert data["errors"] == [
+        {
+            "loc": [],
+            "msg": "Value error, Name, author and date_published are required",
+            "type": "value_error",
+        }
+    ]
+
+
+@pytest.mark.parametrize(
+    ("path", "body", "has_errors"),
+    [
+        ("/v1/books", b'{"name": "Book",', False),
+        ("/v1/books", b"[1, 2]", True),
+        ("/v1/books/batch", b"ids=1", False),
+        ("/v1/books/batch", b'{"ids": "1"}', True),
+    ],
+)
+async def test_malformed_json_body(
+    client: TestClient,
+    path: str,
+    body: bytes,
+    has_errors: bool,  # noqa: FBT001
+):
+    """Test that bodies that are not JSON objects are rejected."""
+    response = await client.post(
+        path, data=body, headers={"Content-Type": "application/json"}
+    )
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    if has_errors:
+        data = await response.json()
+        assert all(error.keys() == {"loc", "msg", "type"} for error in data["errors"])
+
+
 @pytest.mark.asyncio
 async def test_upload_denied_books(client: TestClient):
     """Test uploading a denied books list via file upload."""
@@ -192,7 +241,7 @@ async def test_upload_denied_books(client: TestClient):
             "author": get_fake_author_name(),
             "date_published": get_fake_date_published(),
             "genre": "",
-            "url": get_real_external_file_url(),
+            "url": BOOK_FILE_URL,
             "is_file_path": True,
         },
         {
@@ -200,13 +249,17 @@ async def test_upload_denied_books(client: TestClient):
             "author": get_fake_author_name(),
             "date_published": get_fake_date_published(),
             "genre": get_fake_genre(),
-            "url": get_real_external_file_url(),
+            "url": BOOK_FILE_URL,
             "is_file_path": True,
         },
     ],
 )
-async def test_create_book_with_valid_data(client: TestClient, valid_data: dict):
+async def test_create_book_with_valid_data(
+    client: TestClient, file_server_url: str, valid_data: dict
+):
     """Test creating a book with valid data."""
+    if valid_data["url"] == BOOK_FILE_URL:
+        valid_data = {**valid_data, "url": get_book_file_url(file_server_url)}
     response = await client.post("/v1/books", json=valid_data)
     assert response.status == http_statuses.HTTP_201_CREATED
     data = await response.json()
@@ -244,10 +297,12 @@ async def test_get_multiple_books_by_id(client: TestClient, book_count: int):
 
 
 @pytest.mark.asyncio
-async def test_download_book(client: TestClient, fake_book_data: dict):
+async def test_download_book(
+    client: TestClient, file_server_url: str, fake_book_data: dict
+):
     """Test downloading a book file."""
     # Assume file_path is valid and points to an existing file for testing
-    fake_book_data["url"] = get_real_external_file_url()
+    fake_book_data["url"] = get_book_file_url(file_server_url)
     create_response = await client.post("/v1/books", json=fake_book_data)
     assert create_response.status == http_statuses.HTTP_201_CREATED
     book = await create_response.json()
@@ -263,7 +318,7 @@ async def test_download_book(client: TestClient, fake_book_data: dict):
 
 
 @pytest.mark.asyncio
-async def test_download_denied_book(client: TestClient):
+async def test_download_denied_book(client: TestClient, file_server_url: str):
     """Test that downloading a denied book is forbidden."""
     # Create a book
     book_data = {
@@ -271,7 +326,7 @@ async def test_download_denied_book(client: TestClient):
         "author": get_fake_author_name(),
         "date_published": get_fake_date_published(),
         "genre": get_fake_genre(),
-        "url": get_real_external_file_url(),
+        "url": get_book_file_url(file_server_url),
     }
     create_response = await client.post("/v1/books", json=book_data)
     assert create_response.status == http_statuses.HTTP_201_CREATED
@@ -427,3 +482,143 @@ async def test_download_book_missing_file_path(
     assert download_response.status == http_statuses.HTTP_404_NOT_FOUND
     data = await download_response.json()
     assert data["error"] == "Book file not found"
+
+
+@pytest.mark.asyncio
+async def test_get_books_batch(client: TestClient):
+    """Test retrieving many books by their IDs in one request."""
+    book_ids = []
+    for _ in range(3):
+        book_data = {
+            "name": get_fake_book_name(),
+            "author": get_fake_author_name(),
+            "date_published": get_fake_date_published(),
+        }
+        create_response = await client.post("/v1/books", json=book_data)
+        assert create_response.status == http_statuses.HTTP_201_CREATED
+        book = await create_response.json()
+        book_ids.append(book["id"])
+
+    missing_id = 999999999
+    requested_ids = [book_ids[2], missing_id, book_ids[0], book_ids[1]]
+    response = await client.post("/v1/books/batch", json={"ids": requested_ids})
+    assert response.status == http_statuses.HTTP_200_OK
+    data = await response.json()
+    assert [book["id"] for book in data["books"]] == [
+        book_ids[2],
+        book_ids[0],
+        book_ids[1],
+    ]
+    assert data["missing"] == [missing_id]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "invalid_data",
+    [
+        {},
+        {"ids": []},
+        {"ids": ["abc"]},
+        {"ids": [0]},
+        {"ids": list(range(1, 1000))},
+    ],
+)
+async def test_get_books_batch_invalid_ids(client: TestClient, invalid_data: dict):
+    """Test retrieving books in batch with invalid IDs."""
+    response = await client.post("/v1/books/batch", json=invalid_data)
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    data = await response.json()
+    assert "errors" in data
+
+
+@pytest.mark.asyncio
+async def test_create_book_with_failed_download(
+    client: TestClient, file_server_url: str, fake_book_data: dict
+):
+    """Test that no book is created when its file cannot be downloaded."""
+    fake_book_data["url"] = f"{file_server_url}/books/missing.epub?status=404"
+    response = await client.post("/v1/books", json=fake_book_data)
+    assert response.status == http_statuses.HTTP_500_INTERNAL_SERVER_ERROR
+
+    get_response = await client.get(
+        "/v1/books", params={"name": fake_book_data["name"]}
+    )
+    assert await get_response.json() == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("fields", "keys"),
+    [
+        ("id,name", ["id", "name"]),
+        ("name,date_published,name", ["name", "date_published"]),
+    ],
+)
+async def test_get_books_with_fields(
+    client: TestClient, fake_book_data: dict, fields: str, keys: list[str]
+):
+    """Test that only the requested fields of the books are returned."""
+    create_response = await client.post("/v1/books", json=fake_book_data)
+    assert create_response.status == http_statuses.HTTP_201_CREATED
+    book = await create_response.json()
+
+    response = await client.get(
+        "/v1/books", params={"name": fake_book_data["name"], "fields": fields}
+    )
+    assert response.status == http_statuses.HTTP_200_OK
+    assert await response.json() == [{key: book[key] for key in keys}]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fields", ["", "id,password", "id,"])
+async def test_get_books_with_invalid_fields(client: TestClient, fields: str):
+    """Test retrieving books with unknown fields."""
+    response = await client.get("/v1/books", params={"fields": fields})
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    data = await response.json()
+    assert "errors" in data
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("fields", "keys"),
+    [
+        ("id,name", ["id", "name"]),
+        ("name,date_published,name", ["name", "date_published"]),
+    ],
+)
+async def test_get_book_with_fields(
+    client: TestClient, fake_book_data: dict, fields: str, keys: list[str]
+):
+    """Test that only the requested fields of a book are returned."""
+    create_response = await client.post("/v1/books", json=fake_book_data)
+    assert create_response.status == http_statuses.HTTP_201_CREATED
+    book = await create_response.json()
+
+    response = await client.get(f"/v1/books/{book["id"]}", params={"fields": fields})
+    assert response.status == http_statuses.HTTP_200_OK
+    assert await response.json() == {key: book[key] for key in keys}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fields", ["", "id,password", "id,"])
+async def test_get_book_with_invalid_fields(
+    client: TestClient, fake_book_data: dict, fields: str
+):
+    """Test retrieving a book with unknown fields."""
+    create_response = await client.post("/v1/books", json=fake_book_data)
+    assert create_response.status == http_statuses.HTTP_201_CREATED
+    book = await create_response.json()
+
+    response = await client.get(f"/v1/books/{book["id"]}", params={"fields": fields})
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    data = await response.json()
+    assert "errors" in data
+
+
+def test_book_fields_match_book_dict():
+    """Test that every field of a book's dictionary can be requested."""
+    book = book_models.Book(
+        name="name", author="author", date_published=datetime.date(2001, 1, 1)
+    )
+    assert list(typing.get_args(dto.BookField)) == list(book.to_dict())
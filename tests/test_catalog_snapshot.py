@@ -0,0 +1,168 @@
+import array
+import datetime
+import operator
+import pathlib
+
+import pytest
+import sqlalchemy as sa
+from aiohttp.test_utils import TestClient
+
+from literaflow.core import config
+from literaflow.core.db import async_session_maker
+from literaflow.models import book as book_models
+from literaflow.services import catalog_snapshot
+from literaflow.services.book_suggestions import book_suggestions
+from literaflow.utils import http_statuses, serialization
+from tests.test_books import get_fake_author_name, get_fake_book_name
+
+
+@pytest.fixture
+def snapshot_path(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> pathlib.Path:
+    """Write the catalog snapshot to a temporary file."""
+    path = tmp_path / "catalog.snapshot"
+    monkeypatch.setattr(config.app_settings, "CATALOG_SNAPSHOT_PATH", str(path))
+    return path
+
+
+def make_snapshot() -> catalog_snapshot.CatalogSnapshot:
+    """Make a snapshot of a small catalog."""
+    return catalog_snapshot.CatalogSnapshot(
+        stamp=datetime.datetime.fromisoformat("2024-05-17T12:30:15.123456"),
+        catalog_digest=catalog_snapshot.get_catalog_digest(),
+        fragments=[
+            ((1, datetime.datetime.fromisoformat("2024-05-01T08:00:00.000001")), b"{}"),
+            ((2, datetime.datetime.fromisoformat("2024-05-02T09:00")), "{é}".encode()),
+        ],
+        suggestion_entries=["leo tolstoy\x00Leo Tolstoy", "miserables\x00Misérables"],
+        suggestion_book_ids=array.array("q", [0, 2]),
+        max_book_id=2,
+    )
+
+
+async def create_book(client: TestClient) -> dict:
+    """Create a book and get it, so its fragment is cached."""
+    response = await client.post(
+        "/v1/books",
+        json={
+            "name": get_fake_book_name(),
+            "author": get_fake_author_name(),
+            "date_published": "2001-01-01",
+        },
+    )
+    assert response.status == http_statuses.HTTP_201_CREATED
+    book = await response.json()
+    response = await client.get(f"/v1/books/{book["id"]}")
+    assert response.status == http_statuses.HTTP_200_OK
+    return book
+
+
+async def get_updated_at(book_id: int) -> datetime.datetime:
+    """Get when a book was last updated."""
+    async with async_session_maker() as session:
+        return await session.scalar(
+            sa.select(book_models.Book.updated_at).where(book_models.Book.id == book_id)
+        )
+
+
+def get_cached_fragment(book_id: int, updated_at: datetime.datetime) -> bytes | None:
+    """Get the cached fragment of a version of a book."""
+    return dict(serialization.get_fragment_cache().items()).get((book_id, updated_at))
+
+
+def test_write_and_read_snapshot(tmp_path: pathlib.Path):
+    """Test that a written snapshot is read back as it was."""
+    snapshot = make_snapshot()
+    path = tmp_path / "catalog.snapshot"
+
+    size = catalog_snapshot.write_snapshot(path, snapshot)
+
+    assert path.stat().st_size == size
+    assert size % catalog_snapshot._ALIGNMENT == 0  # noqa: SLF001
+    assert catalog_snapshot.read_snapshot(path) == snapshot
+
+
+def test_failed_write_leaves_no_partial_file(tmp_path: pathlib.Path):
+    """Test that the partial file is removed when a snapshot cannot be written."""
+    path = tmp_path / "catalog.snapshot"
+    path.mkdir()
+
+    with pytest.raises(OSError):  # noqa: PT011
+        catalog_snapshot.write_snapshot(path, make_snapshot())
+
+    assert list(tmp_path.iterdir()) == [path]
+
+
+@pytest.mark.parametrize(
+    "damage",
+    [
+        operator.itemgetter(slice(-8)),
+        operator.itemgetter(slice(10)),
+        lambda data: b"NOTASNAP" + data[8:],
+    ],
+)
+def test_read_damaged_snapshot(tmp_path: pathlib.Path, damage):  # noqa: ANN001
+    """Test that truncated snapshots and other files are refused."""
+    path = tmp_path / "catalog.snapshot"
+    catalog_snapshot.write_snapshot(path, make_snapshot())
+    path.write_bytes(damage(path.read_bytes()))
+
+    with pytest.raises(ValueError):  # noqa: PT011
+        catalog_snapshot.read_snapshot(path)
+
+
+async def test_load_snapshot(client: TestClient, snapshot_path: pathlib.Path):
+    """Test that a new worker gets the hot books and suggestions of the snapshot."""
+    book = await create_book(client)
+    updated_at = await get_updated_at(book["id"])
+    await catalog_snapshot.save_snapshot()
+    serialization.get_fragment_cache().clear()
+    book_suggestions.clear()
+
+    assert await catalog_snapshot.load_snapshot()
+
+    assert get_cached_fragment(book["id"], updated_at) is not None
+    assert {"kind": "name", "text": book["name"], "id": book["id"]} in (
+        book_suggestions.suggest(book["name"], limit=10)
+    )
+    assert snapshot_path.exists()
+
+
+async def test_load_snapshot_catches_up(
+    client: TestClient, snapshot_path: pathlib.Path
+):
+    """Test that the books updated since the snapshot are encoded again."""
+    book = await create_book(client)
+    await catalog_snapshot.save_snapshot()
+    async with async_session_maker() as session:
+        await session.execute(
+            sa.update(book_models.Book)
+            .where(book_models.Book.id == book["id"])
+            .values(is_denied=True)
+        )
+        await session.commit()
+    updated_at = await get_updated_at(book["id"])
+    serialization.get_fragment_cache().clear()
+
+    assert await catalog_snapshot.load_snapshot()
+
+    fragment = get_cached_fragment(book["id"], updated_at)
+    assert fragment is not None
+    assert serialization.loads(fragment)["is_denied"] is True
+    assert snapshot_path.exists()
+
+
+@pytest.mark.usefixtures("snapshot_path")
+async def test_load_snapshot_of_another_catalog(monkeypatch: pytest.MonkeyPatch):
+    """Test that snapshots of another database or books table are ignored."""
+    await catalog_snapshot.save_snapshot()
+    monkeypatch.setattr(catalog_snapshot, "get_catalog_digest", lambda: b"\0" * 32)
+
+    assert not await catalog_snapshot.load_snapshot()
+
+
+@pytest.mark.usefixtures("snapshot_path")
+async def test_load_missing_snapshot():
+    """Test that workers start cold without a snapshot."""
+    assert not await catalog_snapshot.load_snapshot()
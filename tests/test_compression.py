@@ -0,0 +1,214 @@
+import asyncio
+import os
+import pathlib
+import random
+import threading
+import time
+import typing
+from collections.abc import Callable
+
+import pytest
+from aiohttp import hdrs, web
+from aiohttp.test_utils import TestClient
+
+from literaflow.utils import compression, http_statuses
+from tests.test_books import (
+    get_fake_author_name,
+    get_fake_book_name,
+    get_fake_date_published,
+    get_fake_genre,
+)
+
+FB2_CONTENT = (
+    b'<?xml version="1.0" encoding="utf-8"?><FictionBook><body>'
+    + b"<section><p>It was a bright cold day in April.</p></section>" * 500
+    + b"</body></FictionBook>"
+)
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("gzip, deflate, br", compression.SUPPORTED_ENCODINGS[0]),
+        ("gzip", compression.GZIP),
+        ("br;q=0.5, gzip;q=0.8", compression.GZIP),
+        ("*", compression.SUPPORTED_ENCODINGS[0]),
+        ("gzip;q=0, identity", None),
+        ("deflate", None),
+        ("", None),
+    ],
+)
+def test_negotiate_encoding(header: str, expected: str | None):
+    """Test picking a content coding from an Accept-Encoding header."""
+    assert (
+        compression.negotiate_encoding(header, compression.SUPPORTED_ENCODINGS)
+        == expected
+    )
+
+
+@pytest.mark.parametrize("encoding", compression.SUPPORTED_ENCODINGS)
+def test_precompress_file(tmp_path: pathlib.Path, encoding: str):
+    """Test writing the compressed variants of a book file."""
+    book_path = tmp_path / "book.fb2"
+    book_path.write_bytes(FB2_CONTENT)
+
+    variant_paths = compression.precompress_file(str(book_path))
+
+    variant = tmp_path / f"book.fb2{compression.VARIANT_SUFFIXES[encoding]}"
+    assert str(variant) in variant_paths
+    assert variant.stat().st_size < book_path.stat().st_size
+    assert not list(tmp_path.glob("*.part"))
+    # Up-to-date variants are not compressed again
+    assert compression.precompress_file(str(book_path)) == variant_paths
+
+
+def test_precompress_file_skips_incompressible(tmp_path: pathlib.Path):
+    """Test that no variant is kept when compression does not pay off."""
+    book_path = tmp_path / "book.fb2"
+    book_path.write_bytes(random.randbytes(64 * 1024))  # noqa: S311
+
+    assert compression.precompress_file(str(book_path)) == []
+
+
+def test_precompress_file_remembers_skipped_variants(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that skipped variants are not compressed again until the file changes."""
+    book_path = tmp_path / "book.fb2"
+    book_path.write_bytes(random.randbytes(64 * 1024))  # noqa: S311
+    compression.precompress_file(str(book_path))
+    for encoding in compression.SUPPORTED_ENCODINGS:
+        assert (
+            tmp_path / f"book.fb2{compression.VARIANT_SUFFIXES[encoding]}.skip"
+        ).exists()
+
+    compressed_encodings = []
+    compress = compression.compress
+
+    def record_compress(data: bytes, encoding: str, *, static: bool = False) -> bytes:
+        compressed_encodings.append(encoding)
+        return compress(data, encoding, static=static)
+
+    monkeypatch.setattr(compression, "compress", record_compress)
+    assert compression.precompress_file(str(book_path)) == []
+    assert compressed_encodings == []
+
+    book_path.write_bytes(FB2_CONTENT)
+    os.utime(book_path, (time.time() + 1, time.time() + 1))
+    assert len(compression.precompress_file(str(book_path))) == len(
+        compression.SUPPORTED_ENCODINGS
+    )
+    assert compressed_encodings == list(compression.SUPPORTED_ENCODINGS)
+
+
+def _write_books(books_dir: pathlib.Path, count: int) -> list[pathlib.Path]:
+    books_dir.mkdir()
+    book_paths = [books_dir / f"book-{number}.fb2" for number in range(count)]
+    for book_path in book_paths:
+        book_path.write_bytes(FB2_CONTENT)
+    return book_paths
+
+
+async def test_precompress_books_dir_skips_failed_files(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that a file that cannot be compressed does not stop the others."""
+    book_paths = _write_books(tmp_path / "books", 3)
+    precompress_file = compression.precompress_file
+
+    def fail_on_first_book(file_path: str) -> list[str]:
+        if file_path == str(book_paths[0]):
+            raise PermissionError(file_path)
+        return precompress_file(file_path)
+
+    monkeypatch.setattr(compression, "precompress_file", fail_on_first_book)
+    await compression.precompress_books_dir(str(tmp_path / "books"))
+
+    assert not list(tmp_path.glob("books/book-0.fb2.*"))
+    for book_path in book_paths[1:]:
+        assert book_path.with_name(f"{book_path.name}.gz").exists()
+
+
+async def test_cancelled_books_dir_precompression_waits_for_its_thread(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that a cancelled precompression stops after the file being compressed."""
+    _write_books(tmp_path / "books", 3)
+    started = threading.Event()
+    release = threading.Event()
+    compressed_paths = []
+
+    def compress_slowly(file_path: str) -> list[str]:
+        started.set()
+        release.wait(timeout=5)
+        compressed_paths.append(file_path)
+        return []
+
+    monkeypatch.setattr(compression, "precompress_file", compress_slowly)
+    task = asyncio.create_task(
+        compression.precompress_books_dir(str(tmp_path / "books"))
+    )
+    await asyncio.to_thread(started.wait, 5)
+    task.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert len(compressed_paths) == 1
+
+
+@pytest.mark.parametrize(
+    ("file_path", "expected"),
+    [("/books/a.fb2", True), ("/books/a.TXT", True), ("/books/a.epub", False)],
+)
+def test_is_compressible_book(file_path: str, *, expected: bool):
+    """Test detecting compressible book formats."""
+    assert compression.is_compressible_book(file_path) is expected
+
+
+async def test_file_response_serves_precompressed_variant(
+    aiohttp_client: Callable[..., typing.Any], tmp_path: pathlib.Path
+):
+    """Test that stored variants are served according to Accept-Encoding."""
+    book_path = tmp_path / "book.fb2"
+    book_path.write_bytes(FB2_CONTENT)
+    compression.precompress_file(str(book_path))
+
+    async def download(_: web.Request) -> web.FileResponse:  # noqa: RUF029
+        return web.FileResponse(path=book_path)
+
+    app = web.Application()
+    app.router.add_get("/download", download)
+    client = await aiohttp_client(app)
+
+    response = await client.get(
+        "/download", headers={hdrs.ACCEPT_ENCODING: compression.GZIP}
+    )
+    assert response.status == http_statuses.HTTP_200_OK
+    assert response.headers[hdrs.CONTENT_ENCODING] == compression.GZIP
+    assert await response.read() == FB2_CONTENT
+
+
+async def test_get_books_compressed(client: TestClient):
+    """Test that large listings are compressed when the client accepts it."""
+    for _ in range(10):
+        book_data = {
+            "name": get_fake_book_name(),
+            "author": get_fake_author_name(),
+            "date_published": get_fake_date_published(),
+            "genre": get_fake_genre(),
+        }
+        create_response = await client.post("/v1/books", json=book_data)
+        assert create_response.status == http_statuses.HTTP_201_CREATED
+
+    response = await client.get(
+        "/v1/books", headers={hdrs.ACCEPT_ENCODING: compression.GZIP}
+    )
+    assert response.status == http_statuses.HTTP_200_OK
+    assert response.headers[hdrs.CONTENT_ENCODING] == compression.GZIP
+    assert hdrs.ACCEPT_ENCODING in response.headers[hdrs.VARY]
+    assert isinstance(await response.json(), list)
+
+    response = await client.get("/v1/books", headers={hdrs.ACCEPT_ENCODING: ""})
+    assert hdrs.CONTENT_ENCODING not in response.headers
@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+import pytest
+
+from literaflow.utils import download_scheduler
+
+FIRST_ORIGIN_URL = "http://first.example/books/{}.epub"
+SECOND_ORIGIN_URL = "https://second.example/books/{}.epub"
+
+
+def test_origin_includes_the_default_port():
+    """Test that URLs of the same scheme, host and port share an origin."""
+    assert download_scheduler.get_origin("https://example.com/a.epub") == (
+        download_scheduler.get_origin("https://example.com:443/b.fb2?x=1")
+    )
+    assert download_scheduler.get_origin("http://example.com/a.epub") != (
+        download_scheduler.get_origin("https://example.com/a.epub")
+    )
+
+
+async def test_token_bucket_paces_to_the_rate():
+    """Test that consuming beyond the burst waits for the tokens to refill."""
+    bucket = download_scheduler.TokenBucket(rate=100_000, burst=10_000)
+
+    start_time = time.monotonic()
+    for _ in range(5):
+        await bucket.consume(10_000)
+    elapsed = time.monotonic() - start_time
+
+    # 10 KB of burst, then 40 KB at 100 KB/s
+    assert elapsed == pytest.approx(0.4, abs=0.15)
+
+
+async def test_transfers_per_origin_are_capped():
+    """Test that an origin never has more transfers than its limit."""
+    scheduler = download_scheduler.DownloadScheduler(
+        max_concurrent_transfers=10, max_concurrent_per_origin=2
+    )
+    origin = download_scheduler.get_origin(FIRST_ORIGIN_URL)
+    max_active = 0
+
+    async def transfer(number: int) -> None:
+        nonlocal max_active
+        async with scheduler.transfer(FIRST_ORIGIN_URL.format(number)):
+            max_active = max(max_active, scheduler.active_transfers_of(origin))
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(transfer(number) for number in range(6)))
+
+    assert max_active == 2  # noqa: PLR2004
+    assert scheduler.active_transfers == 0
+    assert scheduler.queued_transfers == 0
+
+
+async def test_waiting_transfers_alternate_between_origins():
+    """Test that a bulk feed from one origin does not starve another origin."""
+    scheduler = download_scheduler.DownloadScheduler(
+        max_concurrent_transfers=1, max_concurrent_per_origin=1
+    )
+    started = []
+
+    async def transfer(url: str) -> None:
+        async with scheduler.transfer(url):
+            started.append(download_scheduler.get_origin(url))
+            await asyncio.sleep(0)
+
+    first_origin_transfers = [
+        transfer(FIRST_ORIGIN_URL.format(number)) for number in range(4)
+    ]
+    second_origin_transfers = [
+        transfer(SECOND_ORIGIN_URL.format(number)) for number in range(2)
+    ]
+    await asyncio.gather(*first_origin_transfers, *second_origin_transfers)
+
+    first_origin = download_scheduler.get_origin(FIRST_ORIGIN_URL)
+    second_origin = download_scheduler.get_origin(SECOND_ORIGIN_URL)
+    assert started == [
+        first_origin,
+        first_origin,
+        second_origin,
+        first_origin,
+        second_origin,
+        first_origin,
+    ]
+
+
+async def test_cancelled_waiting_transfer_frees_its_place():
+    """Test that a transfer cancelled while waiting does not hold a slot."""
+    scheduler = download_scheduler.DownloadScheduler(
+        max_concurrent_transfers=1, max_concurrent_per_origin=1
+    )
+
+    async def transfer() -> None:
+        async with scheduler.transfer(FIRST_ORIGIN_URL.format(1)):
+            pass
+
+    async with scheduler.transfer(SECOND_ORIGIN_URL.format(1)):
+        task = asyncio.create_task(transfer())
+        await asyncio.sleep(0)
+        assert scheduler.queued_transfers == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    assert scheduler.queued_transfers == 0
+    assert scheduler.active_transfers == 0
+    await transfer()
+
+
+async def test_waiter_cancelled_while_a_slot_is_released():
+    """Test that a release does not hand its slot to a cancelled waiter."""
+    scheduler = download_scheduler.DownloadScheduler(
+        max_concurrent_transfers=1, max_concurrent_per_origin=1
+    )
+    release = asyncio.Event()
+
+    async def running_transfer() -> None:
+        async with scheduler.transfer(FIRST_ORIGIN_URL.format(1)):
+            await release.wait()
+
+    async def waiting_transfer() -> None:
+        async with scheduler.transfer(FIRST_ORIGIN_URL.format(2)):
+            pass
+
+    running = asyncio.create_task(running_transfer())
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(waiting_transfer())
+    await asyncio.sleep(0)
+    # The running transfer releases its slot before the waiting one handles
+    # its cancellation
+    release.set()
+    waiting.cancel()
+
+    results = await asyncio.gather(running, waiting, return_exceptions=True)
+
+    assert results[0] is None
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert scheduler.queued_transfers == 0
+    assert scheduler.active_transfers == 0
+    await waiting_transfer()
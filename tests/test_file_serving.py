@@ -0,0 +1,165 @@
+import pathlib
+import urllib.parse
+
+import pydantic
+import pytest
+from aiohttp import hdrs
+from aiohttp.test_utils import TestClient
+
+from literaflow.core import config
+from literaflow.utils import file_serving, http_statuses
+from tests.test_books import (
+    get_fake_author_name,
+    get_fake_book_name,
+    get_fake_date_published,
+)
+
+SIGNING_KEY = "test-signing-key"
+SIGNED_URL_BASE = "https://files.example.com/books/"
+
+
+async def create_book(
+    client: TestClient, file_server_url: str, *, is_denied: bool = False
+) -> dict:
+    """Create a book with a file."""
+    response = await client.post(
+        "/v1/books",
+        json={
+            "name": get_fake_book_name(),
+            "author": get_fake_author_name(),
+            "date_published": get_fake_date_published(),
+            "is_denied": is_denied,
+            "url": f"{file_server_url}/books/novel.epub",
+        },
+    )
+    assert response.status == http_statuses.HTTP_201_CREATED
+    return await response.json()
+
+
+@pytest.fixture
+def serving_mode(
+    request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch
+) -> str:
+    """Switch the file serving mode, configuring the signed URLs."""
+    monkeypatch.setattr(config.app_settings, "FILE_SERVING_MODE", request.param)
+    monkeypatch.setattr(
+        config.app_settings, "FILE_SERVING_SIGNED_URL_BASE", SIGNED_URL_BASE
+    )
+    monkeypatch.setattr(
+        config.app_settings,
+        "FILE_SERVING_SIGNING_KEY",
+        pydantic.SecretStr(SIGNING_KEY),
+    )
+    return request.param
+
+
+@pytest.mark.usefixtures("serving_mode")
+@pytest.mark.parametrize("serving_mode", [file_serving.DIRECT], indirect=True)
+async def test_download_directly(client: TestClient, file_server_url: str):
+    """Test that the worker sends the file itself in the direct mode."""
+    book = await create_book(client, file_server_url)
+
+    response = await client.get(f"/v1/books/{book["id"]}/download")
+
+    assert response.status == http_statuses.HTTP_200_OK
+    assert await response.read() == pathlib.Path(book["file_path"]).read_bytes()
+    assert file_serving.X_ACCEL_REDIRECT_HEADER not in response.headers
+
+
+@pytest.mark.usefixtures("serving_mode")
+@pytest.mark.parametrize("serving_mode", [file_serving.X_ACCEL_REDIRECT], indirect=True)
+async def test_download_with_x_accel_redirect(client: TestClient, file_server_url: str):
+    """Test that nginx is told to serve the file from the internal location."""
+    book = await create_book(client, file_server_url)
+
+    response = await client.get(f"/v1/books/{book["id"]}/download")
+
+    assert response.status == http_statuses.HTTP_200_OK
+    assert response.headers[file_serving.X_ACCEL_REDIRECT_HEADER] == (
+        f"/protected-books/{pathlib.Path(book["file_path"]).name}"
+    )
+    assert response.content_type == "application/epub+zip"
+    assert await response.read() == b""
+
+
+@pytest.mark.usefixtures("serving_mode")
+@pytest.mark.parametrize("serving_mode", [file_serving.X_SENDFILE], indirect=True)
+async def test_download_with_x_sendfile(client: TestClient, file_server_url: str):
+    """Test that the web server is told to serve the file's absolute path."""
+    book = await create_book(client, file_server_url)
+
+    response = await client.get(f"/v1/books/{book["id"]}/download")
+
+    assert response.status == http_statuses.HTTP_200_OK
+    assert response.headers[file_serving.X_SENDFILE_HEADER] == book["file_path"]
+    assert await response.read() == b""
+
+
+@pytest.mark.usefixtures("serving_mode")
+@pytest.mark.parametrize("serving_mode", [file_serving.SIGNED_URL], indirect=True)
+async def test_download_with_signed_url(client: TestClient, file_server_url: str):
+    """Test that the client is redirected to a signed URL of the static tier."""
+    book = await create_book(client, file_server_url)
+
+    response = await client.get(
+        f"/v1/books/{book["id"]}/download", allow_redirects=False
+    )
+
+    assert response.status == http_statuses.HTTP_307_TEMPORARY_REDIRECT
+    assert response.headers[hdrs.CACHE_CONTROL] == "no-store"
+    location = urllib.parse.urlsplit(response.headers[hdrs.LOCATION])
+    storage_key = pathlib.Path(book["file_path"]).name
+    assert location.path == f"/books/{storage_key}"
+    params = dict(urllib.parse.parse_qsl(location.query))
+    assert file_serving.verify_signature(
+        storage_key,
+        params[file_serving.EXPIRES_PARAM],
+        params[file_serving.SIGNATURE_PARAM],
+        SIGNING_KEY.encode(),
+    )
+
+
+@pytest.mark.usefixtures("serving_mode")
+@pytest.mark.parametrize(
+    "serving_mode",
+    [file_serving.X_ACCEL_REDIRECT, file_serving.X_SENDFILE, file_serving.SIGNED_URL],
+    indirect=True,
+)
+async def test_denied_book_is_not_offloaded(client: TestClient, file_server_url: str):
+    """Test that denied books are refused before the download is handed off."""
+    book = await create_book(client, file_server_url, is_denied=True)
+
+    response = await client.get(
+        f"/v1/books/{book["id"]}/download", allow_redirects=False
+    )
+
+    assert response.status == http_statuses.HTTP_403_FORBIDDEN
+    assert file_serving.X_ACCEL_REDIRECT_HEADER not in response.headers
+    assert file_serving.X_SENDFILE_HEADER not in response.headers
+    assert hdrs.LOCATION not in response.headers
+
+
+@pytest.mark.parametrize(
+    ("storage_key", "expires", "now"),
+    [
+        ("other.epub", "2000", 1000),
+        ("book.epub", "999", 1000),
+        ("book.epub", "not-a-time", 1000),
+    ],
+)
+def test_invalid_signatures_are_rejected(storage_key: str, expires: str, now: int):
+    """Test that tampered and expired signed URLs are rejected."""
+    signature = file_serving.sign("book.epub", 2000, SIGNING_KEY.encode())
+
+    assert file_serving.verify_signature(
+        "book.epub", "2000", signature, SIGNING_KEY.encode(), now=1000
+    )
+    assert not file_serving.verify_signature(
+        storage_key, expires, signature, SIGNING_KEY.encode(), now=now
+    )
+
+
+def test_signed_url_mode_requires_a_key():
+    """Test that the signed-url mode cannot be configured without its key."""
+    with pytest.raises(pydantic.ValidationError):
+        config.AppSettings(FILE_SERVING_MODE="signed-url")
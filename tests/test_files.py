@@ -0,0 +1,187 @@
+import pathlib
+
+import aiohttp
+import pytest
+
+from benchmarks.file_server import build_book
+from literaflow.core import config, logger, metrics
+from literaflow.utils import files, http_statuses
+
+BOOK_SIZE = 256 * 1024
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Retry downloads without waiting."""
+    monkeypatch.setattr(config.app_settings, "DOWNLOAD_BACKOFF_BASE_MS", 1)
+    monkeypatch.setattr(config.app_settings, "DOWNLOAD_BACKOFF_MAX_MS", 1)
+
+
+@pytest.mark.asyncio
+async def test_download_file(file_server_url: str, tmp_path: pathlib.Path):
+    """Test that a file is downloaded in full to the destination path."""
+    destination_path = tmp_path / "book.epub"
+
+    await files.download_file(
+        f"{file_server_url}/books/book.epub?size={BOOK_SIZE}", str(destination_path)
+    )
+
+    assert destination_path.read_bytes() == build_book("epub", BOOK_SIZE)
+    assert not pathlib.Path(files.get_partial_file_path(str(destination_path))).exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("book_format", ["fb2", "epub"])
+async def test_download_file_from_compressing_origin(
+    file_server_url: str, tmp_path: pathlib.Path, book_format: str
+):
+    """Test that origins compressing their responses send the file as stored."""
+    destination_path = tmp_path / f"book.{book_format}"
+
+    await files.download_file(
+        f"{file_server_url}/books/book.{book_format}?size={BOOK_SIZE}&compress=1",
+        str(destination_path),
+    )
+
+    assert destination_path.read_bytes() == build_book(book_format, BOOK_SIZE)
+
+
+@pytest.mark.asyncio
+async def test_interrupted_download_from_compressing_origin_is_resumed(
+    file_server_url: str, tmp_path: pathlib.Path
+):
+    """Test that resumed downloads from compressing origins use stored offsets."""
+    destination_path = tmp_path / "book.fb2"
+
+    await files.download_file(
+        f"{file_server_url}/books/dropped.fb2?size={BOOK_SIZE}&compress=1"
+        f"&failures=1&fail_after={BOOK_SIZE // 2}",
+        str(destination_path),
+    )
+
+    assert destination_path.read_bytes() == build_book("fb2", BOOK_SIZE)
+
+
+@pytest.mark.asyncio
+async def test_download_is_retried_after_server_errors(
+    file_server_url: str, tmp_path: pathlib.Path
+):
+    """Test that retryable statuses are retried until the download succeeds."""
+    destination_path = tmp_path / "book.fb2"
+    retries_before = metrics.book_download_retries_total.value()
+
+    await files.download_file(
+        f"{file_server_url}/books/flaky.fb2?failures=2", str(destination_path)
+    )
+
+    assert destination_path.exists()
+    assert metrics.book_download_retries_total.value() == retries_before + 2
+
+
+@pytest.mark.asyncio
+async def test_interrupted_download_is_resumed(
+    file_server_url: str, tmp_path: pathlib.Path
+):
+    """Test that a dropped connection resumes from the received bytes."""
+    destination_path = tmp_path / "book.pdf"
+    book = build_book("pdf", BOOK_SIZE)
+    bytes_before = metrics.book_download_bytes_total.value()
+
+    await files.download_file(
+        f"{file_server_url}/books/dropped.pdf?size={BOOK_SIZE}"
+        f"&failures=1&fail_after={BOOK_SIZE // 2}",
+        str(destination_path),
+    )
+
+    assert destination_path.read_bytes() == book
+    # Only the missing half was transferred again
+    assert metrics.book_download_bytes_total.value() - bytes_before == len(book)
+
+
+@pytest.mark.asyncio
+async def test_interrupted_download_restarts_without_range_support(
+    file_server_url: str, tmp_path: pathlib.Path
+):
+    """Test that the download starts over when the origin ignores ranges."""
+    destination_path = tmp_path / "book.epub"
+    book = build_book("epub", BOOK_SIZE)
+    bytes_before = metrics.book_download_bytes_total.value()
+
+    await files.download_file(
+        f"{file_server_url}/books/no-ranges.epub?size={BOOK_SIZE}"
+        f"&failures=1&fail_after={BOOK_SIZE // 2}&ranges=0",
+        str(destination_path),
+    )
+
+    assert destination_path.read_bytes() == book
+    # The bytes of both attempts were transferred
+    assert metrics.book_download_bytes_total.value() - bytes_before > len(book)
+
+
+@pytest.mark.asyncio
+async def test_client_error_is_raised_without_retries(
+    file_server_url: str, tmp_path: pathlib.Path
+):
+    """Test that non-retryable statuses fail at once and leave no file."""
+    destination_path = tmp_path / "book.epub"
+    retries_before = metrics.book_download_retries_total.value()
+
+    with pytest.raises(aiohttp.ClientResponseError) as exc_info:
+        await files.download_file(
+            f"{file_server_url}/books/missing.epub?status=404", str(destination_path)
+        )
+
+    assert exc_info.value.status == http_statuses.HTTP_404_NOT_FOUND
+    assert metrics.book_download_retries_total.value() == retries_before
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.asyncio
+async def test_download_fails_after_the_last_attempt(
+    file_server_url: str, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that persistent failures are raised and the partial file removed."""
+    monkeypatch.setattr(config.app_settings, "DOWNLOAD_MAX_ATTEMPTS", 2)
+    destination_path = tmp_path / "book.fb2"
+
+    with pytest.raises(aiohttp.ClientPayloadError):
+        await files.download_file(
+            f"{file_server_url}/books/broken.fb2?size={BOOK_SIZE}"
+            f"&failures=5&fail_after={BOOK_SIZE // 4}",
+            str(destination_path),
+        )
+
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.asyncio
+async def test_read_timeout_is_logged_as_such(
+    file_server_url: str, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that a stalled last attempt is not reported as the download timeout."""
+    monkeypatch.setattr(config.app_settings, "DOWNLOAD_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(config.app_settings, "DOWNLOAD_READ_TIMEOUT_S", 0.05)
+    messages = []
+    handler_id = logger.add(messages.append, level="ERROR")
+    try:
+        with pytest.raises(aiohttp.ServerTimeoutError):
+            await files.download_file(
+                f"{file_server_url}/books/stalled.epub?latency_ms=500",
+                str(tmp_path / "book.epub"),
+            )
+    finally:
+        logger.remove(handler_id)
+
+    assert len(messages) == 1
+    assert "received no data for 0.05 seconds" in messages[0]
+
+
+def test_backoff_delay_is_capped(monkeypatch: pytest.MonkeyPatch):
+    """Test that the jittered backoff never exceeds the maximum delay."""
+    monkeypatch.setattr(config.app_settings, "DOWNLOAD_BACKOFF_BASE_MS", 100)
+    monkeypatch.setattr(config.app_settings, "DOWNLOAD_BACKOFF_MAX_MS", 1000)
+
+    delays = [files.get_backoff_delay(attempt) for attempt in range(1, 20)]
+
+    assert all(0 <= delay <= 1 for delay in delays)
+    assert files.get_backoff_delay(1, retry_after=5) == 1
@@ -0,0 +1,60 @@
+import pytest
+from aiohttp.test_utils import TestClient
+
+from literaflow.api.middlewares import REQUEST_ID_HEADER
+from literaflow.core import config, logger
+from literaflow.core.logger import request_id_var, sample_record
+
+
+@pytest.fixture
+def log_records() -> list:
+    """Capture the records that reach the handlers."""
+    records = []
+    handler_id = logger.add(
+        lambda message: records.append(message.record), filter=sample_record
+    )
+    yield records
+    logger.remove(handler_id)
+
+
+def test_records_carry_request_id(log_records: list):
+    """Test that the current correlation ID is attached to log records."""
+    token = request_id_var.set("test-request-id")
+    try:
+        logger.info("Handling the request")
+    finally:
+        request_id_var.reset(token)
+    logger.info("Outside of a request")
+
+    assert [record["extra"]["request_id"] for record in log_records] == [
+        "test-request-id",
+        "-",
+    ]
+
+
+def test_sampling_keeps_warnings(log_records: list, monkeypatch: pytest.MonkeyPatch):
+    """Test that sampled-out levels are dropped while warnings are kept."""
+    monkeypatch.setattr(config.get_app_settings(), "LOG_SAMPLE_RATE", 0.0)
+
+    logger.info("Sampled out")
+    logger.warning("Always kept")
+
+    assert [record["message"] for record in log_records] == ["Always kept"]
+
+
+@pytest.mark.asyncio
+async def test_request_id_header(client: TestClient):
+    """Test that responses carry the request's correlation ID."""
+    response = await client.get("/v1/books/abc")
+    generated_request_id = response.headers[REQUEST_ID_HEADER]
+    assert generated_request_id
+
+    response = await client.get(
+        "/v1/books/abc", headers={REQUEST_ID_HEADER: "client-id-42"}
+    )
+    assert response.headers[REQUEST_ID_HEADER] == "client-id-42"
+
+    response = await client.get(
+        "/v1/books/abc", headers={REQUEST_ID_HEADER: "invalid id\twith spaces"}
+    )
+    assert response.headers[REQUEST_ID_HEADER] != "invalid id\twith spaces"
@@ -0,0 +1,110 @@
+import pytest
+from aiohttp.test_utils import TestClient
+
+from literaflow.core import metrics
+from literaflow.utils import http_statuses
+
+
+@pytest.fixture
+def registry() -> metrics.Registry:
+    """Create an isolated metrics registry."""
+    return metrics.Registry()
+
+
+def test_counter_render(registry: metrics.Registry):
+    """Test rendering a labelled counter."""
+    counter = metrics.Counter(
+        "requests_total", "Requests.", ("route",), registry=registry
+    )
+    counter.inc(route="/v1/books")
+    counter.inc(2, route='/v1/"quoted"')
+
+    assert registry.render() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{route="/v1/books"} 1\n'
+        'requests_total{route="/v1/\\"quoted\\""} 2\n'
+    )
+
+
+def test_counter_rejects_wrong_labels(registry: metrics.Registry):
+    """Test that samples must have the metric's labels."""
+    counter = metrics.Counter("errors_total", "Errors.", ("kind",), registry=registry)
+    with pytest.raises(ValueError, match="expects labels"):
+        counter.inc(route="/")
+
+
+def test_function_gauge(registry: metrics.Registry):
+    """Test a metric whose value is read from a function on render."""
+    values = [3]
+    metrics.Gauge("queue_size", "Queue size.", registry=registry, function=values.pop)
+    assert "queue_size 3\n" in registry.render()
+
+
+def test_histogram_render(registry: metrics.Registry):
+    """Test rendering cumulative histogram buckets."""
+    histogram = metrics.Histogram(
+        "latency_seconds", "Latency.", registry=registry, buckets=(0.1, 1.0)
+    )
+    histogram.observe(0.05)
+    histogram.observe(0.1)
+    histogram.observe(5)
+
+    rendered = registry.render()
+    assert 'latency_seconds_bucket{le="0.1"} 2\n' in rendered
+    assert 'latency_seconds_bucket{le="1"} 2\n' in rendered
+    assert 'latency_seconds_bucket{le="+Inf"} 3\n' in rendered
+    assert "latency_seconds_sum 5.15\n" in rendered
+    assert "latency_seconds_count 3\n" in rendered
+
+
+def test_duplicate_metric_name(registry: metrics.Registry):
+    """Test that metric names are unique within a registry."""
+    metrics.Counter("duplicate_total", "First.", registry=registry)
+    with pytest.raises(ValueError, match="already registered"):
+        metrics.Counter("duplicate_total", "Second.", registry=registry)
+
+
+def test_metric_without_collect(registry: metrics.Registry):
+    """Test that metrics must implement collect to be created."""
+
+    class Summary(metrics.Metric):
+        type_name = "summary"
+
+    with pytest.raises(TypeError, match="collect"):
+        Summary("summary_seconds", "Summary.", registry=registry)  # type: ignore[abstract]
+    assert not registry.render()
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client: TestClient):
+    """Test that requests and queries are exposed at /metrics."""
+    requests_before = metrics.http_requests_total.value(
+        method="GET", route="/v1/books/{book_id}", status="404"
+    )
+    queries_before = metrics.db_statement_duration_seconds.count(statement="SELECT")
+
+    response = await client.get("/v1/books/999999999")
+    assert response.status == http_statuses.HTTP_404_NOT_FOUND
+
+    assert (
+        metrics.http_requests_total.value(
+            method="GET", route="/v1/books/{book_id}", status="404"
+        )
+        == requests_before + 1
+    )
+    assert (
+        metrics.db_statement_duration_seconds.count(statement="SELECT") > queries_before
+    )
+
+    response = await client.get("/metrics")
+    assert response.status == http_statuses.HTTP_200_OK
+    assert response.content_type == "text/plain"
+    text = await response.text()
+    assert "# TYPE literaflow_http_request_duration_seconds histogram" in text
+    assert (
+        'literaflow_http_requests_total{method="GET",'
+        'route="/v1/books/{book_id}",status="404"}' in text
+    )
+    assert 'literaflow_db_statement_duration_seconds_count{statement="SELECT"}' in text
+    assert "literaflow_book_lookups_coalesced_total" in text
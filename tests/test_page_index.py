@@ -0,0 +1,233 @@
+import io
+import pathlib
+import zipfile
+
+import pandas as pd
+import pytest
+from aiohttp import FormData
+from aiohttp.test_utils import TestClient
+
+from benchmarks.file_server import build_epub, build_fb2, build_pdf
+from literaflow.utils import http_statuses, page_index
+from tests.test_books import (
+    get_fake_author_name,
+    get_fake_book_name,
+    get_fake_date_published,
+)
+
+BOOK_SIZE = 64 * 1024
+
+
+def write_book(tmp_path: pathlib.Path, name: str, data: bytes) -> str:
+    """Write a book file and return its path."""
+    book_path = tmp_path / name
+    book_path.write_bytes(data)
+    return str(book_path)
+
+
+def deflate_epub(data: bytes) -> bytes:
+    """Recompress an EPUB file's members with deflate."""
+    buffer = io.BytesIO()
+    with (
+        zipfile.ZipFile(io.BytesIO(data)) as source,
+        zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as target,
+    ):
+        for info in source.infolist():
+            target.writestr(info.filename, source.read(info))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("name", "data"),
+    [
+        ("book.fb2", build_fb2(BOOK_SIZE)),
+        ("book.epub", build_epub(BOOK_SIZE)),
+        ("deflated.epub", deflate_epub(build_epub(BOOK_SIZE))),
+    ],
+)
+async def test_pages_are_read_from_the_index(
+    tmp_path: pathlib.Path, name: str, data: bytes
+):
+    """Test that each chapter is a page read back from its indexed range."""
+    book_path = write_book(tmp_path, name, data)
+
+    first_page = await page_index.read_page(book_path, 1)
+    second_page = await page_index.read_page(book_path, 2)
+
+    assert pathlib.Path(page_index.get_index_path(book_path)).exists()
+    assert first_page.page_count == second_page.page_count > 1
+    assert first_page.title == "Chapter 1"
+    assert second_page.title == "Chapter 2"
+    assert second_page.text.startswith("Chapter 2\nChapter 2. It was a bright")
+    assert "<" not in second_page.text
+    assert await page_index.read_page(book_path, first_page.page_count + 1) is None
+
+
+async def test_fb2_in_a_legacy_encoding(tmp_path: pathlib.Path):
+    """Test that FB2 files are decoded with the encoding of their prolog."""
+    data = (
+        '<?xml version="1.0" encoding="windows-1251"?>'
+        "<FictionBook><body><section><title><p>Глава 1</p></title>"
+        "<p>Текст</p></section></body>"
+        '<body name="notes"><section><p>Примечание</p></section></body>'
+        "</FictionBook>"
+    ).encode("windows-1251")
+    book_path = write_book(tmp_path, "book.fb2", data)
+
+    page = await page_index.read_page(book_path, 1)
+
+    assert page.page_count == 1
+    assert page.title == "Глава 1"
+    assert page.text == "Глава 1\nТекст"  # noqa: RUF001
+
+
+async def test_pdf_pages_are_extracted(tmp_path: pathlib.Path):
+    """Test that PDF pages are served from the extracted text."""
+    pytest.importorskip("pypdf")
+    book_path = write_book(tmp_path, "book.pdf", build_pdf(BOOK_SIZE))
+
+    page = await page_index.read_page(book_path, 3)
+
+    assert pathlib.Path(page_index.get_text_path(book_path)).exists()
+    assert page.page_count == BOOK_SIZE // (4 * 1024)
+    assert page.text.startswith("Chapter 3.")
+
+
+async def test_index_is_rebuilt_when_the_book_changes(tmp_path: pathlib.Path):
+    """Test that an index older than its book is not used."""
+    book_path = write_book(tmp_path, "book.fb2", build_fb2(BOOK_SIZE))
+    page_count = (await page_index.read_page(book_path, 1)).page_count
+
+    pathlib.Path(book_path).write_bytes(build_fb2(BOOK_SIZE * 2))
+
+    assert (await page_index.read_page(book_path, 1)).page_count > page_count
+
+
+async def test_unreadable_book_raises(tmp_path: pathlib.Path):
+    """Test that a corrupt book raises PageIndexError."""
+    book_path = write_book(tmp_path, "book.epub", b"not a zip file")
+
+    with pytest.raises(page_index.PageIndexError):
+        await page_index.read_page(book_path, 1)
+
+
+async def test_fb2_in_an_unknown_encoding(tmp_path: pathlib.Path):
+    """Test that FB2 files declaring an unknown encoding are read as UTF-8."""
+    data = (
+        b'<?xml version="1.0" encoding="koi8-bogus"?>'
+        b"<FictionBook><body><section><p>Text</p></section></body></FictionBook>"
+    )
+    book_path = write_book(tmp_path, "book.fb2", data)
+
+    page = await page_index.read_page(book_path, 1)
+
+    assert page.text == "Text"
+
+
+async def test_corrupt_epub_member_raises(tmp_path: pathlib.Path):
+    """Test that a page that cannot be decompressed raises PageIndexError."""
+    data = deflate_epub(build_epub(BOOK_SIZE))
+    book_path = write_book(tmp_path, "book.epub", data)
+    index = await page_index.get_index(book_path)
+    page = index["pages"][0]
+    corrupt_data = bytearray(data)
+    corrupt_data[page["offset"] : page["offset"] + page["length"]] = (
+        b"\xff" * (page["length"])
+    )
+    pathlib.Path(book_path).write_bytes(corrupt_data)
+    pathlib.Path(page_index.get_index_path(book_path)).touch()
+
+    with pytest.raises(page_index.PageIndexError):
+        await page_index.read_page(book_path, 1)
+
+
+def test_failed_index_write_leaves_no_partial_file(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that the partial index is removed when it cannot be stored."""
+    book_path = write_book(tmp_path, "book.fb2", build_fb2(BOOK_SIZE))
+
+    def fail_replace(*_: object) -> None:
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(pathlib.Path, "replace", fail_replace)
+    with pytest.raises(OSError, match="No space"):
+        page_index.build_index(book_path)
+
+    assert list(tmp_path.iterdir()) == [pathlib.Path(book_path)]
+
+
+@pytest.mark.asyncio
+async def test_read_denied_book(client: TestClient, file_server_url: str):
+    """Test that a denied book can be read page by page but not downloaded."""
+    book_data = {
+        "name": get_fake_book_name(),
+        "author": get_fake_author_name(),
+        "date_published": get_fake_date_published(),
+        "url": f"{file_server_url}/books/denied.fb2?size={BOOK_SIZE}",
+    }
+    create_response = await client.post("/v1/books", json=book_data)
+    assert create_response.status == http_statuses.HTTP_201_CREATED
+    book_id = (await create_response.json())["id"]
+
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        pd.DataFrame({"name": [book_data["name"]]}).to_excel(
+            writer, sheet_name="name", index=False
+        )
+        pd.DataFrame({"author": []}).to_excel(writer, sheet_name="author", index=False)
+    form = FormData()
+    form.add_field("file", buffer.getvalue(), filename="denied_books.xlsx")
+    deny_response = await client.post("/v1/books/deny", data=form)
+    assert deny_response.status == http_statuses.HTTP_200_OK
+
+    download_response = await client.get(f"/v1/books/{book_id}/download")
+    assert download_response.status == http_statuses.HTTP_403_FORBIDDEN
+
+    read_response = await client.get(f"/v1/books/{book_id}/read", params={"page": 2})
+    assert read_response.status == http_statuses.HTTP_200_OK
+    page = await read_response.json()
+    assert page["book_id"] == book_id
+    assert page["page"] == 2  # noqa: PLR2004
+    assert page["page_count"] > 1
+    assert page["title"] == "Chapter 2"
+    assert page["text"].startswith("Chapter 2")
+
+    missing_page_response = await client.get(
+        f"/v1/books/{book_id}/read", params={"page": page["page_count"] + 1}
+    )
+    assert missing_page_response.status == http_statuses.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("page", ["0", "-1", "first"])
+async def test_read_book_invalid_page(client: TestClient, page: str):
+    """Test that invalid page numbers are rejected."""
+    response = await client.get("/v1/books/1/read", params={"page": page})
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    assert "errors" in await response.json()
+
+
+@pytest.mark.asyncio
+async def test_read_book_invalid_id(client: TestClient):
+    """Test that non-numeric book IDs are rejected."""
+    response = await client.get("/v1/books/first/read")
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+    assert (await response.json())["error"] == "Invalid book ID"
+
+
+@pytest.mark.asyncio
+async def test_read_book_without_file(client: TestClient):
+    """Test that a book without a file cannot be read online."""
+    create_response = await client.post(
+        "/v1/books",
+        json={
+            "name": get_fake_book_name(),
+            "author": get_fake_author_name(),
+            "date_published": get_fake_date_published(),
+        },
+    )
+    book_id = (await create_response.json())["id"]
+
+    response = await client.get(f"/v1/books/{book_id}/read")
+    assert response.status == http_statuses.HTTP_404_NOT_FOUND
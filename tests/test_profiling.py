@@ -0,0 +1,117 @@
+import time
+
+import pytest
+from aiohttp import hdrs
+from aiohttp.test_utils import TestClient
+from pydantic import SecretStr
+
+from literaflow.core import config, logger, profiling
+from literaflow.utils import http_statuses
+
+ADMIN_TOKEN = "test-admin-token"  # noqa: S105
+
+
+@pytest.fixture
+def warning_records() -> list:
+    """Capture the warning records."""
+    records = []
+    handler_id = logger.add(
+        lambda message: records.append(message.record), level="WARNING"
+    )
+    yield records
+    logger.remove(handler_id)
+
+
+def test_phases():
+    """Test measuring phases, with nested blocks of a phase measured once."""
+    token = profiling.start_request_profile()
+    with profiling.phase(profiling.PHASE_SERIALIZATION):
+        time.sleep(0.01)
+        with profiling.phase(profiling.PHASE_SERIALIZATION):
+            time.sleep(0.01)
+    profiling.record_phase(profiling.PHASE_DB, 0.5)
+    phases = profiling.finish_request_profile(token)
+
+    assert 0.02 <= phases[profiling.PHASE_SERIALIZATION] < 0.5  # noqa: PLR2004
+    assert phases[profiling.PHASE_DB] == 0.5  # noqa: PLR2004
+
+
+def test_phases_not_recorded_outside_profile():
+    """Test that phases are free when no request is being profiled."""
+    with profiling.phase(profiling.PHASE_DB):
+        pass
+    profiling.record_phase(profiling.PHASE_DB, 1.0)
+    token = profiling.start_request_profile()
+    assert profiling.finish_request_profile(token) == {}
+
+
+def test_describe_parameters():
+    """Test that parameter shapes do not contain values."""
+    assert profiling.describe_parameters(("secret", 42, [1, 2])) == [
+        "str",
+        "int",
+        ["int", "int"],
+    ]
+    assert profiling.describe_parameters({"ids": list(range(100))}) == {
+        "ids": "list[100]"
+    }
+
+
+@pytest.mark.asyncio
+async def test_slow_request_and_query_logs(
+    client: TestClient,
+    warning_records: list,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test that slow requests and queries are logged with their breakdown."""
+    monkeypatch.setattr(config.app_settings, "SLOW_REQUEST_THRESHOLD_MS", 1e-6)
+    monkeypatch.setattr(config.app_settings, "SLOW_QUERY_THRESHOLD_MS", 1e-6)
+
+    response = await client.get("/v1/books", params={"author": "Nobody"})
+    assert response.status == http_statuses.HTTP_200_OK
+
+    slow_queries = [
+        record["extra"] for record in warning_records if "sql" in record["extra"]
+    ]
+    assert any("FROM books" in query["sql"] for query in slow_queries)
+    assert all("Nobody" not in str(query["parameters_shape"]) for query in slow_queries)
+
+    slow_requests = [
+        record["extra"] for record in warning_records if "phases_ms" in record["extra"]
+    ]
+    assert len(slow_requests) == 1
+    assert slow_requests[0]["route"] == "/v1/books"
+    assert profiling.PHASE_DB in slow_requests[0]["phases_ms"]
+    assert profiling.PHASE_VALIDATION in slow_requests[0]["phases_ms"]
+    assert profiling.PHASE_SERIALIZATION in slow_requests[0]["phases_ms"]
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    """Test capturing a profile through the admin endpoint."""
+    response = await client.get("/admin/profile", params={"seconds": "0.1"})
+    assert response.status == http_statuses.HTTP_404_NOT_FOUND
+
+    monkeypatch.setattr(config.app_settings, "ADMIN_TOKEN", SecretStr(ADMIN_TOKEN))
+
+    response = await client.get(
+        "/admin/profile",
+        params={"seconds": "0.1"},
+        headers={hdrs.AUTHORIZATION: "Bearer wrong-token"},
+    )
+    assert response.status == http_statuses.HTTP_401_UNAUTHORIZED
+
+    headers = {hdrs.AUTHORIZATION: f"Bearer {ADMIN_TOKEN}"}
+    response = await client.get(
+        "/admin/profile", params={"seconds": "1000"}, headers=headers
+    )
+    assert response.status == http_statuses.HTTP_400_BAD_REQUEST
+
+    response = await client.get(
+        "/admin/profile", params={"seconds": "0.1"}, headers=headers
+    )
+    assert response.status == http_statuses.HTTP_200_OK
+    folded_stacks = await response.text()
+    stack, _, count = folded_stacks.splitlines()[0].rpartition(" ")
+    assert stack
+    assert int(count) > 0
@@ -0,0 +1,61 @@
+import datetime
+import json
+
+from literaflow.utils import serialization
+
+
+def test_dumps_matches_stdlib_json():
+    """Test that the configured backend produces equivalent JSON."""
+    data = {
+        "id": 1,
+        "name": "Война и мир",
+        "date_published": datetime.date(1869, 1, 1).isoformat(),
+        "is_denied": False,
+        "file_path": None,
+        "loc": ("body", "name"),
+    }
+    assert json.loads(serialization.dumps(data)) == json.loads(json.dumps(data))
+
+
+def test_encode_array():
+    """Test joining pre-encoded fragments into a JSON array."""
+    fragments = [serialization.dumps({"id": book_id}) for book_id in range(3)]
+    assert json.loads(serialization.encode_array(fragments)) == [
+        {"id": 0},
+        {"id": 1},
+        {"id": 2},
+    ]
+    assert serialization.encode_array([]) == b"[]"
+
+
+def test_fragment_cache_reuses_fragments():
+    """Test that a cached fragment is not re-encoded."""
+    cache = serialization.FragmentCache(maxsize=2)
+    builds = []
+
+    def build() -> dict:
+        builds.append(1)
+        return {"id": 1}
+
+    first = cache.get_or_encode(key=(1, "v1"), build=build)
+    second = cache.get_or_encode(key=(1, "v1"), build=build)
+    assert first == second == b'{"id":1}'
+    assert len(builds) == 1
+
+
+def test_fragment_cache_evicts_least_recently_used():
+    """Test that the cache keeps at most `maxsize` fragments."""
+    cache = serialization.FragmentCache(maxsize=2)
+    cache.get_or_encode(key=1, build=lambda: 1)
+    cache.get_or_encode(key=2, build=lambda: 2)
+    cache.get_or_encode(key=1, build=lambda: 1)
+    cache.get_or_encode(key=3, build=lambda: 3)
+    assert len(cache) == cache.maxsize
+    assert cache.get_or_encode(key=2, build=lambda: "rebuilt") == b'"rebuilt"'
+
+
+def test_fragment_cache_disabled():
+    """Test that a zero-sized cache only encodes."""
+    cache = serialization.FragmentCache(maxsize=0)
+    assert cache.get_or_encode(key=1, build=lambda: [1]) == b"[1]"
+    assert len(cache) == 0
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient
+
+from literaflow.services import book as book_services
+from literaflow.utils import http_statuses
+from literaflow.utils.single_flight import SingleFlight
+from tests.test_books import (
+    get_fake_author_name,
+    get_fake_book_name,
+    get_fake_date_published,
+)
+
+CONCURRENT_CALLS = 10
+
+
+async def test_concurrent_calls_are_coalesced():
+    """Test that concurrent identical calls share one execution."""
+    single_flight = SingleFlight()
+    executions = []
+
+    async def call() -> int:
+        executions.append(1)
+        await asyncio.sleep(0.01)
+        return 42
+
+    results = await asyncio.gather(
+        *(single_flight.do("key", call) for _ in range(CONCURRENT_CALLS))
+    )
+
+    assert results == [42] * CONCURRENT_CALLS
+    assert len(executions) == 1
+    assert single_flight.executed_calls == 1
+    assert single_flight.coalesced_calls == CONCURRENT_CALLS - 1
+    assert single_flight.in_flight_calls == 0
+
+
+async def test_sequential_calls_are_not_cached():
+    """Test that a completed call is executed again."""
+    single_flight = SingleFlight()
+
+    async def call() -> str:
+        await asyncio.sleep(0)
+        return "result"
+
+    assert await single_flight.do("key", call) == "result"
+    assert await single_flight.do("key", call) == "result"
+    assert single_flight.executed_calls == 2  # noqa: PLR2004
+    assert single_flight.coalesced_calls == 0
+
+
+async def test_different_keys_are_not_coalesced():
+    """Test that calls with different keys run separately."""
+    single_flight = SingleFlight()
+
+    async def call() -> None:
+        await asyncio.sleep(0.01)
+
+    await asyncio.gather(single_flight.do(1, call), single_flight.do(2, call))
+    assert single_flight.executed_calls == 2  # noqa: PLR2004
+
+
+async def test_exception_is_shared():
+    """Test that every coalesced caller gets the call's exception."""
+    single_flight = SingleFlight()
+
+    async def call() -> None:
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        *(single_flight.do("key", call) for _ in range(CONCURRENT_CALLS)),
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+async def test_cancelled_caller_does_not_cancel_the_call():
+    """Test that the call survives the cancellation of the caller that began it."""
+    single_flight = SingleFlight()
+
+    async def call() -> str:
+        await asyncio.sleep(0.02)
+        return "result"
+
+    first = asyncio.create_task(single_flight.do("key", call))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(single_flight.do("key", call))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "result"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+async def test_get_book_by_id_coalesced(client: TestClient):
+    """Test that concurrent lookups of the same book run one query."""
+    book_data = {
+        "name": get_fake_book_name(),
+        "author": get_fake_author_name(),
+        "date_published": get_fake_date_published(),
+    }
+    create_response = await client.post("/v1/books", json=book_data)
+    assert create_response.status == http_statuses.HTTP_201_CREATED
+    book_id = (await create_response.json())["id"]
+
+    executed_before = book_services.book_lookups.executed_calls
+    books = await asyncio.gather(
+        *(
+            book_services.BookService.get_book_by_id(book_id)
+            for _ in range(CONCURRENT_CALLS)
+        )
+    )
+
+    assert {book.id for book in books} == {book_id}
+    assert book_services.book_lookups.executed_calls == executed_before + 1
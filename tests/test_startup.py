@@ -0,0 +1,78 @@
+import os
+import subprocess  # noqa: S404
+import sys
+
+import pytest
+
+from benchmarks import startup
+
+# Regression threshold for the cumulative import time of the startup path.
+# It is generous on purpose: the goal is to catch heavy dependencies sneaking
+# back into the import graph, not to measure the machine running the tests.
+STARTUP_IMPORT_TIME_THRESHOLD_US = 2_000_000
+
+LAZY_DEPENDENCIES = ("pandas", "openpyxl")
+
+
+@pytest.fixture(scope="module")
+def startup_import_timings() -> list[startup.ImportTiming]:
+    """Measure the import times of the startup path in a fresh interpreter."""
+    return startup.measure_import_times(startup.STARTUP_MODULE)
+
+
+def test_heavy_dependencies_are_not_imported_at_startup(
+    startup_import_timings: list[startup.ImportTiming],
+):
+    """Test that the denied list dependencies are loaded only on first use."""
+    imported_lazy_dependencies = [
+        timing.module
+        for timing in startup_import_timings
+        if timing.module.split(".")[0] in LAZY_DEPENDENCIES
+    ]
+    assert imported_lazy_dependencies == []
+
+
+def test_startup_import_time_within_threshold(
+    startup_import_timings: list[startup.ImportTiming],
+):
+    """Test that the startup path imports within the regression threshold."""
+    total_us = startup.total_import_time_us(
+        startup_import_timings, startup.STARTUP_MODULE
+    )
+    assert total_us < STARTUP_IMPORT_TIME_THRESHOLD_US
+
+
+def test_startup_path_builds_nothing_at_import():
+    """Test that settings, the database engine and logging are set up on first use."""
+    code = (
+        f"import {startup.STARTUP_MODULE}\n"
+        "from literaflow.core import config, db\n"
+        "print(config.get_app_settings.cache_info().currsize,"
+        " config.get_postgresql_connection_settings.cache_info().currsize,"
+        " db.get_async_engine.cache_info().currsize)"
+    )
+    # Without the environment, building the database settings would fail
+    env = {"PATH": os.environ.get("PATH", "")}
+    completed = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    assert completed.stdout.split() == ["0", "0", "0"]
+
+
+def test_parse_importtime():
+    """Test parsing the `python -X importtime` output."""
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   _io\n"
+        "import time:      2013 |     395015 | literaflow.services.book\n"
+    )
+    assert startup.parse_importtime(output) == [
+        startup.ImportTiming(module="_io", self_us=120, cumulative_us=120),
+        startup.ImportTiming(
+            module="literaflow.services.book", self_us=2013, cumulative_us=395015
+        ),
+    ]
@@ -0,0 +1,241 @@
+import os
+import pathlib
+import time
+import uuid
+from collections.abc import Callable
+
+import pytest
+import sqlalchemy as sa
+from aiohttp.test_utils import TestClient
+
+from literaflow.core import config
+from literaflow.core.db import async_session_maker
+from literaflow.services import storage_scrub
+from literaflow.utils import http_statuses
+from tests.test_books import (
+    get_fake_author_name,
+    get_fake_book_name,
+    get_fake_date_published,
+)
+
+# Files of the tests are made older than the minimum age, other new files
+# in the books directory are left alone
+MIN_AGE_S = 600
+
+
+async def create_book(client: TestClient, file_server_url: str) -> dict:
+    """Create a book with a file."""
+    response = await client.post(
+        "/v1/books",
+        json={
+            "name": get_fake_book_name(),
+            "author": get_fake_author_name(),
+            "date_published": get_fake_date_published(),
+            "url": f"{file_server_url}/books/novel.fb2",
+        },
+    )
+    assert response.status == http_statuses.HTTP_201_CREATED
+    return await response.json()
+
+
+def write_old_file(path: pathlib.Path, data: bytes = b"data") -> pathlib.Path:
+    """Write a file last modified before the minimum age of the scrub."""
+    path.write_bytes(data)
+    modified_at = time.time() - 2 * MIN_AGE_S
+    os.utime(path, (modified_at, modified_at))
+    return path
+
+
+def age_file(path: pathlib.Path) -> pathlib.Path:
+    """Make a file older than the minimum age of the scrub."""
+    return write_old_file(path, path.read_bytes())
+
+
+async def scrub(**options: bool | float) -> storage_scrub.ScrubReport:
+    """Scrub the storage without pacing."""
+    report = await storage_scrub.run_storage_scrub(**{
+        "min_age": MIN_AGE_S,
+        "files_per_second": 0,
+        "read_bytes_per_second": 0,
+        **options,
+    })
+    assert report is not None
+    return report
+
+
+async def get_file_status(client: TestClient, book_id: int) -> str | None:
+    """Get the file status of a book."""
+    response = await client.get(f"/v1/books/{book_id}")
+    return (await response.json())["file_status"]
+
+
+async def test_orphan_files_are_deleted(client: TestClient, file_server_url: str):
+    """Test that old files no book refers to are deleted, with their sidecars."""
+    book = await create_book(client, file_server_url)
+    book_path = age_file(pathlib.Path(book["file_path"]))
+    books_dir = book_path.parent
+    sidecars = [
+        write_old_file(book_path.with_name(book_path.name + suffix))
+        for suffix in (".gz", ".pageindex", ".cover.jpg")
+    ]
+    orphan_path = write_old_file(books_dir / f"{uuid.uuid4()}.epub")
+    orphans = [
+        orphan_path,
+        write_old_file(orphan_path.with_name(orphan_path.name + ".br")),
+        write_old_file(
+            book_path.with_name(f"{book_path.name}.gz.{uuid.uuid4().hex}.part")
+        ),
+    ]
+    new_orphan_path = books_dir / f"{uuid.uuid4()}.epub"
+    new_orphan_path.write_bytes(b"data")
+
+    report = await scrub()
+
+    assert all(path.exists() for path in [book_path, *sidecars, new_orphan_path])
+    assert not any(path.exists() for path in orphans)
+    assert report.deleted_files >= len(orphans)
+    new_orphan_path.unlink()
+
+
+async def test_dry_run_keeps_orphan_files(client: TestClient, file_server_url: str):
+    """Test that a dry run only reports the orphan files."""
+    book = await create_book(client, file_server_url)
+    orphan_path = write_old_file(
+        pathlib.Path(book["file_path"]).with_name(f"{uuid.uuid4()}.fb2"), b"x" * 10
+    )
+
+    report = await scrub(delete_orphans=False)
+
+    assert orphan_path.exists()
+    assert report.deleted_files == 0
+    assert report.orphan_files >= 1
+    orphan_path.unlink()
+
+
+async def test_files_are_kept_when_the_books_directory_moves(
+    client: TestClient, file_server_url: str, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that books own their files by name, whatever directory they are in."""
+    book = await create_book(client, file_server_url)
+    books_dir = pathlib.Path(book["file_path"]).parent
+    moved_books_dir = books_dir.rename(books_dir.with_name("moved-books"))
+    monkeypatch.setattr(config.app_settings, "BOOKS_DIR", str(moved_books_dir))
+    moved_files = [age_file(path) for path in moved_books_dir.iterdir()]
+
+    report = await scrub()
+
+    assert all(path.exists() for path in moved_files)
+    assert report.orphan_files == 0
+
+
+async def test_too_many_orphans_are_only_reported(
+    client: TestClient, file_server_url: str
+):
+    """Test that a batch of mostly orphan files is not deleted."""
+    book = await create_book(client, file_server_url)
+    books_dir = pathlib.Path(book["file_path"]).parent
+    orphan_paths = [
+        write_old_file(books_dir / f"{uuid.uuid4()}.epub")
+        for _ in range(storage_scrub.MIN_GUARDED_ORPHANS)
+    ]
+
+    report = await scrub()
+
+    assert all(path.exists() for path in orphan_paths)
+    assert report.deletion_refused
+    assert report.deleted_files == 0
+    assert report.orphan_files == len(orphan_paths)
+
+    report = await scrub(max_orphan_ratio=1)
+
+    assert not any(path.exists() for path in orphan_paths)
+    assert not report.deletion_refused
+
+
+@pytest.mark.parametrize(
+    ("damage", "verify_checksums", "file_status"),
+    [
+        (pathlib.Path.unlink, False, storage_scrub.FILE_MISSING),
+        (
+            lambda path: path.write_bytes(path.read_bytes()[:10]),
+            False,
+            storage_scrub.FILE_TRUNCATED,
+        ),
+        (
+            lambda path: path.write_bytes(b"x" * path.stat().st_size),
+            True,
+            storage_scrub.FILE_CORRUPT,
+        ),
+    ],
+)
+async def test_damaged_files_are_flagged(
+    client: TestClient,
+    file_server_url: str,
+    damage: Callable[[pathlib.Path], object],
+    verify_checksums: bool,  # noqa: FBT001
+    file_status: str,
+):
+    """Test that books with missing, truncated or corrupt files are flagged."""
+    book = await create_book(client, file_server_url)
+    book_path = pathlib.Path(book["file_path"])
+    data = book_path.read_bytes()
+
+    damage(book_path)
+    report = await scrub(verify_checksums=verify_checksums)
+
+    assert await get_file_status(client, book["id"]) == file_status
+    assert report.flagged_books[file_status] >= 1
+
+    book_path.write_bytes(data)
+    await scrub(verify_checksums=verify_checksums)
+
+    assert await get_file_status(client, book["id"]) is None
+
+
+async def test_checksums_are_not_verified_by_default(
+    client: TestClient, file_server_url: str
+):
+    """Test that files of the right size are not read unless asked to."""
+    book = await create_book(client, file_server_url)
+    book_path = pathlib.Path(book["file_path"])
+    data = book_path.read_bytes()
+    book_path.write_bytes(b"x" * len(data))
+
+    await scrub()
+
+    assert await get_file_status(client, book["id"]) is None
+    book_path.write_bytes(data)
+
+
+async def test_concurrent_scrub_is_skipped():
+    """Test that a scrub does not start while another one holds the lock."""
+    lock_id = storage_scrub.SCRUB_LOCK_ID
+    async with async_session_maker() as session:
+        await session.execute(sa.select(sa.func.pg_advisory_lock(lock_id)))
+        try:
+            assert await storage_scrub.run_storage_scrub() is None
+        finally:
+            await session.execute(sa.select(sa.func.pg_advisory_unlock(lock_id)))
+
+
+async def test_duplicate_book_file_is_removed(client: TestClient, file_server_url: str):
+    """Test that the file of a book rejected as a duplicate is not left behind."""
+    book = await create_book(client, file_server_url)
+    books_dir = pathlib.Path(book["file_path"]).parent
+    # Sidecars of the first book may still be written in the background
+    book_names_before = {path.name.split(".")[0] for path in books_dir.iterdir()}
+
+    response = await client.post(
+        "/v1/books",
+        json={
+            "name": book["name"],
+            "author": book["author"],
+            "date_published": book["date_published"],
+            "url": f"{file_server_url}/books/novel.fb2",
+        },
+    )
+
+    assert response.status == http_statuses.HTTP_409_CONFLICT
+    assert {path.name.split(".")[0] for path in books_dir.iterdir()} == (
+        book_names_before
+    )